@@ -6,8 +6,6 @@ import RPi.GPIO as GPIO
 
 class Buttons(object):
 
-    action_in_progress = False
-
 
     def __init__(self, keys, button_handler):
         GPIO.setmode(GPIO.BCM)
@@ -22,26 +20,10 @@ class Buttons(object):
         GPIO.add_event_detect(keys[3], GPIO.FALLING, callback=lambda pin: self.button_pressed(4, button_handler), bouncetime=200)
 
 
-    def set_busy(self):
-        self.action_in_progress = True
-
-
-    def set_not_busy(self):
-        self.action_in_progress = False
-
-
-    def busy(self):
-        return self.action_in_progress
-
-
     def button_pressed(self, buttonNo, open_action):
-        if self.busy():
-            logging.info("Button #{} ignored".format(buttonNo))
-            return
+        # runs on RPi.GPIO thread - the handler only queues the action for the main loop
+        logging.info("Button #{} pressed".format(buttonNo))
         try:
-            self.set_busy()
-            logging.info("Button #{} pressed".format(buttonNo))
             open_action(buttonNo)
-        finally:
-            logging.info("Finishing button key press handling")
-
+        except Exception as e:
+            logging.exception(e)
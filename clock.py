@@ -0,0 +1,54 @@
+# https://github.com/pskowronek/epaper-clock-and-more, Apache 2 license
+
+import time as _time
+from datetime import datetime
+
+
+class SystemClock(object):
+    """The wall clock - what the app runs on unless a simulated clock has been installed."""
+
+
+    def time(self):
+        return _time.time()
+
+
+    def wait(self, condition, timeout):
+        condition.wait(timeout)
+
+
+class SimulatedClock(object):
+    """A clock that jumps ahead instead of waiting - lets days of operation run in minutes."""
+
+
+    def __init__(self, start):
+        self.now = start
+
+
+    def time(self):
+        return self.now
+
+
+    def wait(self, condition, timeout):
+        # nothing else happens in simulated time - the wait always lasts for the whole timeout
+        self.now += max(0, timeout)
+
+
+_clock = SystemClock()
+
+
+def install(clock):
+    global _clock
+    _clock = clock
+
+
+def time():
+    """Seconds since the epoch - use this instead of time.time() for anything that depends on the time of day or data age."""
+    return _clock.time()
+
+
+def now(tz = None):
+    return datetime.fromtimestamp(_clock.time(), tz)
+
+
+def wait(condition, timeout):
+    _clock.wait(condition, timeout)
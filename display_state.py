@@ -0,0 +1,85 @@
+# https://github.com/pskowronek/epaper-clock-and-more, Apache 2 license
+
+import hashlib
+import json
+import logging
+import os
+import struct
+from collections import namedtuple
+
+import clock
+
+
+# what the panel shows - survives restarts so an unchanged screen isn't refreshed again (a full refresh of 2.7" takes ~15s)
+DisplayState = namedtuple('DisplayState', ['device_type', 'mono', 'frame_hash', 'name', 'time_str', 'displayed_at', 'render_latency', 'display_latency', 'planes'])
+
+MAGIC = b'EPS1'
+HEADER = struct.Struct('<4sI')  # magic, length of JSON metadata - followed by the packed planes
+
+
+def pack_plane(plane):
+    """Bytes of a frame plane - a driver's frame buffer (list of ints) or an image in debug mode."""
+    if plane is None:
+        return b''
+    if isinstance(plane, (bytes, bytearray)):
+        return bytes(plane)
+    if isinstance(plane, list):
+        return bytes(bytearray(plane))
+    return plane.convert('1').tobytes()
+
+
+def frame_hash(planes):
+    digest = hashlib.sha1()
+    for plane in planes:
+        digest.update(struct.pack('<I', len(plane)))
+        digest.update(plane)
+    return digest.hexdigest()
+
+
+class DisplayStateStore(object):
+
+
+    def __init__(self, path):
+        self.path = os.path.expanduser(path)
+
+
+    def save(self, state):
+        directory = os.path.dirname(self.path)
+        tmp_path = self.path + ".tmp"
+        try:
+            if directory and not os.path.exists(directory):
+                os.makedirs(directory)
+            meta = state._asdict()
+            meta['planes'] = [len(plane) for plane in state.planes]
+            meta['name'] = str(state.name)
+            meta = json.dumps(meta, sort_keys=True).encode('utf-8')
+            with open(tmp_path, 'wb') as fp:
+                fp.write(HEADER.pack(MAGIC, len(meta)))
+                fp.write(meta)
+                for plane in state.planes:
+                    fp.write(plane)
+            os.rename(tmp_path, self.path)
+        except Exception as e:
+            logging.exception(e)
+
+
+    def load(self):
+        if not os.path.exists(self.path):
+            return None
+        try:
+            with open(self.path, 'rb') as fp:
+                magic, meta_len = HEADER.unpack(fp.read(HEADER.size))
+                if magic != MAGIC:
+                    logging.warn("Unknown display state file format: %s" % self.path)
+                    return None
+                meta = json.loads(fp.read(meta_len).decode('utf-8'))
+                meta['planes'] = [fp.read(size) for size in meta['planes']]
+            state = DisplayState(**meta)
+            if frame_hash(state.planes) != state.frame_hash:
+                logging.warn("Display state file %s is corrupted" % self.path)
+                return None
+            logging.info("Panel shows '{}' displayed {:.0f}s ago".format(state.name, clock.time() - state.displayed_at))
+            return state
+        except Exception as e:
+            logging.warn("Unable to load display state file %s: %s" % (self.path, e))
+            return None
@@ -7,8 +7,9 @@ from PIL import Image, ImageDraw, ImageFont
 import textwrap
 
 from resources import icons
+from timing import timed_method
+import clock
 
-from datetime import datetime
 
 
 class Drawing(object):
@@ -24,16 +25,55 @@ class Drawing(object):
     PM_SYMBOL = 'µg/m³'
 
 
-    def __init__(self, darksky_units, storm_distance_warn, aqi_warn_level, primary_time_warn_above, secondary_time_warn_above):
+    def __init__(self, darksky_units, storm_distance_warn, aqi_warn_level, primary_time_warn_above, secondary_time_warn_above, shared = None):
         self.distance_symbol = 'km' if darksky_units == 'si' else 'mi'
         self.storm_distance_warn = storm_distance_warn
         self.aqi_warn_level = aqi_warn_level
         self.primary_time_warn_above = primary_time_warn_above
         self.secondary_time_warn_above = secondary_time_warn_above
+        # fonts & images may be shared with the Drawing of another panel - canvases never are
+        self._fonts = shared._fonts if shared is not None else {}
+        self._images = shared._images if shared is not None else {}
+        self._canvases = {}
 
 
     def load_font(self, font_size):
-        return ImageFont.truetype('./resources/font/default', font_size)
+        # parsing the TTF file is slow on a Pi - keep one font object per size
+        font = self._fonts.get(font_size)
+        if font is None:
+            font = self._fonts[font_size] = ImageFont.truetype('./resources/font/default', font_size)
+        return font
+
+
+    def load_image(self, path, size=None, mode=None):
+        # icons & backgrounds are decoded (and resized / converted) once
+        key = (path, size, mode)
+        image = self._images.get(key)
+        if image is None:
+            image = Image.open(path)
+            if size is not None:
+                image = image.resize(size, Image.LANCZOS)
+            if mode is not None:
+                image = image.convert(mode)
+            image.load()
+            self._images[key] = image
+        return image
+
+
+    def canvases(self, screen, is_mono=False):
+        """Black & red canvases of a screen - allocated once, cleared in place on every draw.
+
+        Drawn frames get overwritten by the next draw of the same screen - copy images that must outlive that."""
+        buffers = self._canvases.get(screen)
+        if buffers is None:
+            black_buf = Image.new('1', (self.CANVAS_WIDTH, self.CANVAS_HEIGHT), 1)
+            red_buf = Image.new('1', (self.CANVAS_WIDTH, self.CANVAS_HEIGHT), 1)
+            buffers = self._canvases[screen] = (black_buf, red_buf)
+        else:
+            for buf in buffers:
+                buf.paste(1, (0, 0, self.CANVAS_WIDTH, self.CANVAS_HEIGHT))
+        # for mono display we simply use black buffer so all the painting will be done in black
+        return (buffers[0], buffers[0]) if is_mono else buffers
 
 
     def draw_text(self, x, y, text, font_size, draw, color=0):
@@ -62,10 +102,10 @@ class Drawing(object):
 
 
     def draw_weather_icon(self, buf, fn_icon, pos):
-        img_icon = Image.open("./resources/icons/" + fn_icon)
-        buf.paste(0, pos, img_icon.convert("1"))
+        buf.paste(0, pos, self.load_image("./resources/icons/" + fn_icon, mode="1"))
 
 
+    @timed_method('draw.weather')
     def draw_weather(self, buf, red_buf, weather, airly, prefer_airly_local_temp, start_pos=(0,200)):
 
         icon = icons.darksky.get(weather.icon, None)
@@ -110,6 +150,7 @@ class Drawing(object):
             self.draw_text(180, top_y, caption, 52, draw, 0)
 
 
+    @timed_method('draw.clock')
     def draw_clock(self, img_buf, formatted_time, use_hrs_mins_separator):
         start_pos = (0, 0)
         im_width = 100
@@ -155,6 +196,7 @@ class Drawing(object):
         draw.text((x, y), text, font=font, fill=255)
 
 
+    @timed_method('draw.airly')
     def draw_airly(self, black_buf, red_buf, airly):
         start_pos = (0, 130)
         buf = black_buf if airly.pm10 < self.aqi_warn_level else red_buf
@@ -165,13 +207,14 @@ class Drawing(object):
         self.draw_text_aqi(start_pos[0] + 5, start_pos[1] - 5, caption, 88, draw)
 
 
+    @timed_method('draw.eta')
     def draw_eta(self, idx, black_buf, red_buf, gmaps, warn_above_percent):
         start_pos = (50  + ((idx + 1) * self.CANVAS_WIDTH) / 3, 100)
         secs_in_traffic = 1.0 * gmaps.time_to_dest_in_traffic
         secs = 1.0 * gmaps.time_to_dest
         buf = black_buf if secs < 0 or secs * (100.0 + warn_above_percent) / 100.0 > secs_in_traffic else red_buf
 
-        back = Image.open("./resources/images/back_eta_{}.bmp".format(idx))
+        back = self.load_image("./resources/images/back_eta_{}.bmp".format(idx))
         buf.paste(back, (((idx + 1) * self.CANVAS_WIDTH) / 3 , 100))
 
         draw = ImageDraw.Draw(buf)
@@ -181,17 +224,24 @@ class Drawing(object):
         self.draw_text_eta(start_pos[0], start_pos[1], caption, 70, draw)
 
 
+    @timed_method('draw.shutdown')
     def draw_shutdown(self, is_mono):
-        black_buf = Image.new('1', (self.CANVAS_WIDTH, self.CANVAS_HEIGHT), 1)
-        red_buf = black_buf if (is_mono) else Image.new('1', (self.CANVAS_WIDTH, self.CANVAS_HEIGHT), 1)
-        shutdown_icon = Image.open("./resources/images/shutdown.bmp")
+        black_buf, red_buf = self.canvases('shutdown', is_mono)
+        shutdown_icon = self.load_image("./resources/images/shutdown.bmp")
         red_buf.paste(shutdown_icon, (0, 0))
         return black_buf, red_buf
 
 
-    def draw_airly_details(self, airly):
-        black_buf = Image.new('1', (self.CANVAS_WIDTH, self.CANVAS_HEIGHT), 1)
-        red_buf = Image.new('1', (self.CANVAS_WIDTH, self.CANVAS_HEIGHT), 1)
+    def format_trend(self, history, metric, hours, scale=1.0):
+        trend = history.trend(metric, hours * 3600) if history is not None else None
+        if trend is None:
+            return ""
+        return " ({:+0.1f}/{}h)".format(trend * scale, hours)
+
+
+    @timed_method('draw.airly_details')
+    def draw_airly_details(self, airly, history=None):
+        black_buf, red_buf = self.canvases('airly')
         draw = ImageDraw.Draw(black_buf)
         self.draw_text(10, 10, "Air Quality Luftdaten Project ", 25, draw)
 
@@ -199,15 +249,15 @@ class Drawing(object):
         # y = self.draw_text(10, y, "AQI: {:0.0f}, level: {}".format(airly.aqi, airly.level.replace('_', ' ').encode('utf-8')), 30, draw)
         # y = self.draw_multiline_text(10, y, "Advice: {}".format(airly.advice), 25, draw)
         y = self.draw_text(10, y, "Hummidity: {} %".format(airly.humidity), 30, draw)
-        y = self.draw_text(10, y, "Pressure:  {} hPa".format(airly.pressure), 30, draw)
+        y = self.draw_text(10, y, "Pressure:  {} hPa{}".format(airly.pressure, self.format_trend(history, 'luftdaten.pressure', 3)), 30, draw)
         y = self.draw_text(10, y, "Temperature: {} {}C".format(airly.temperature, self.TEMPERATURE_SYMBOL), 30, draw)
 
         return black_buf, red_buf
 
 
+    @timed_method('draw.weather_forecast')
     def draw_weather_forecast(self, weather):
-        black_buf = Image.new('1', (self.CANVAS_WIDTH, self.CANVAS_HEIGHT), 1)
-        red_buf = Image.new('1', (self.CANVAS_WIDTH, self.CANVAS_HEIGHT), 1)
+        black_buf, red_buf = self.canvases('forecast')
         draw = ImageDraw.Draw(black_buf)
 
         x = 10
@@ -222,9 +272,7 @@ class Drawing(object):
             y = 45
             icon = icons.darksky.get(day.icon, None)
             if icon is not None:
-                img_icon = Image.open("./resources/icons/" + icon)
-                img_icon = img_icon.resize((40, 40), Image.LANCZOS)
-                black_buf.paste(0, [x, 10], img_icon.convert("1"))
+                black_buf.paste(0, [x, 10], self.load_image("./resources/icons/" + icon, size=(40, 40), mode="1"))
             y = self.draw_text(x, y, "{:+3.0f}{}".format(day.temp_min, self.TEMPERATURE_SYMBOL), font_size, draw)
             y = self.draw_text(x, y, "{:+3.0f}{}".format(day.temp_max, self.TEMPERATURE_SYMBOL), font_size, draw)
             y = self.draw_text(x, y, "{:+4.0f}".format(day.beaufort), font_size, draw)
@@ -244,9 +292,9 @@ class Drawing(object):
             return address
 
 
+    @timed_method('draw.weather_details')
     def draw_weather_details(self, weather):
-        black_buf = Image.new('1', (self.CANVAS_WIDTH, self.CANVAS_HEIGHT), 1)
-        red_buf = Image.new('1', (self.CANVAS_WIDTH, self.CANVAS_HEIGHT), 1)
+        black_buf, red_buf = self.canvases('weather')
         draw = ImageDraw.Draw(black_buf)
         self.draw_text(10, 10, "Weather by DarkSky.net", 35, draw)
 
@@ -265,9 +313,9 @@ class Drawing(object):
         return black_buf, red_buf
 
 
+    @timed_method('draw.system_details')
     def draw_system_details(self, sys_info):
-        black_buf = Image.new('1', (self.CANVAS_WIDTH, self.CANVAS_HEIGHT), 1)
-        red_buf = Image.new('1', (self.CANVAS_WIDTH, self.CANVAS_HEIGHT), 1)
+        black_buf, red_buf = self.canvases('system')
         draw = ImageDraw.Draw(black_buf)
         self.draw_text(10, 10, "System info", 35, draw)
 
@@ -279,21 +327,20 @@ class Drawing(object):
         return black_buf, red_buf
 
     
+    @timed_method('draw.events')
     def draw_events(self, black_buf, red_buf, events):
         top_y = 5
         for event in events[:2]:
-            is_today = event.start.date() == datetime.today().date()
+            is_today = event.start.date() == clock.now().date()
             draw = ImageDraw.Draw(red_buf) if is_today else ImageDraw.Draw(black_buf)
             caption = '{}: {}'.format(event.start.strftime('%d %a'), event.summary)
             self.draw_text(5, top_y, caption, 52, draw)
             top_y += 50
 
 
+    @timed_method('draw.frame')
     def draw_frame(self, is_mono, events, use_hrs_mins_separator, weather, prefer_airly_local_temp, airly):
-        black_buf = Image.new('1', (self.CANVAS_WIDTH, self.CANVAS_HEIGHT), 1)
-
-        # for mono display we simply use black buffer so all the painting will be done in black
-        red_buf = black_buf if (is_mono) else Image.new('1', (self.CANVAS_WIDTH, self.CANVAS_HEIGHT), 1)
+        black_buf, red_buf = self.canvases('main', is_mono)
 
         self.draw_events(black_buf, red_buf, events)
 
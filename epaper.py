@@ -4,6 +4,8 @@
 import logging
 import json
 import os
+import time
+from collections import namedtuple
 from PIL import Image
 
 from drawing import Drawing
@@ -11,13 +13,35 @@ from providers.luftdaten import Luftdaten
 from providers.weather import Weather
 from providers.ical import ICal
 from providers.system_info import SystemInfo
+from providers.history import History
+from refresh_budget import RefreshBudget
+from display_state import DisplayState, DisplayStateStore, pack_plane, frame_hash
+from timing import timings, timed
+import clock
+
+
+# a screen ready to be sent to the device - packed frame buffers (or images in debug mode) and the drawn canvases
+Frame = namedtuple('Frame', ['black', 'red', 'name', 'time_str', 'images'])
+
+
+# resolution, whether it is black & white only and the driver's frame buffer bit of a black/red pixel
+PanelType = namedtuple('PanelType', ['width', 'height', 'mono', 'packed_ink_bit'])
+PANEL_TYPES = {
+    'waveshare-2.7': PanelType(width=176, height=264, mono=False, packed_ink_bit=1),
+    'waveshare-4.2': PanelType(width=400, height=300, mono=True, packed_ink_bit=0),
+}
+
+
+# flips every bit of packed frame buffer bytes
+INVERT = bytes(bytearray(255 - i for i in range(256)))
+
+
+def ewma(average, sample, alpha = 0.3):
+    return sample if average is None else alpha * sample + (1 - alpha) * average
 
 
 class EPaper(object):
 
-    # only update once an hour within these ranges
-    # eval - don't try this at home :) i.e. don't expose envs to alians
-    DEAD_TIMES = eval(os.environ.get("DEAD_TIMES", "[]"))
     # whether to display two vertical dots to separate hrs and mins
     CLOCK_HOURS_MINS_SEPARATOR = os.environ.get("CLOCK_HRS_MINS_SEPARATOR", "true") == "true"
     # whether to prefer AQI temperature instead of DarkSky's
@@ -25,151 +49,459 @@ class EPaper(object):
 
     DEVICE_TYPE = os.environ.get("EPAPER_TYPE", 'waveshare-2.7')
 
+    # screens draw_screen() knows - the main one, details shown on button press & the shutdown one
+    SCREENS = ('main', 'weather', 'airly', 'forecast', 'system', 'shutdown')
 
-    if DEVICE_TYPE == 'waveshare-2.7':          # TODO refactor to use enums
-        # Display resolution for 2.7"
-        EPD_WIDTH       = 176
-        EPD_HEIGHT      = 264
-        MONO_DISPLAY    = False
-    elif DEVICE_TYPE == 'waveshare-4.2':
-        # Display resolution for 4.2"
-        EPD_WIDTH       = 400
-        EPD_HEIGHT      = 300
-        MONO_DISPLAY    = True
-    else:
+
+    if DEVICE_TYPE not in PANEL_TYPES:
         raise Exception('Incorrect epaper screen type: ' + DEVICE_TYPE)
+    EPD_WIDTH, EPD_HEIGHT, MONO_DISPLAY, PACKED_INK_BIT = PANEL_TYPES[DEVICE_TYPE]
 
 
     MONO_DISPLAY = os.environ.get("EPAPER_MONO", "true" if MONO_DISPLAY else "false") == "true"  # one may override but must replace relevant library edpXinX.py, by default lib for 2.7 is tri-color, 4.2 is mono
     FAST_REFRESH = os.environ.get("EPAPER_FAST_REFRESH", "false") == "true"
 
-
-    drawing = Drawing(
-        os.environ.get("DARK_SKY_UNITS", "si"),
-        int(os.environ.get("WEATHER_STORM_DISTANCE_WARN", "10")),
-        int(os.environ.get("AQI_WARN_LEVEL", "75")),
-        int(os.environ.get("FIRST_TIME_WARN_ABOVE_PERCENT", "50")),
-        int(os.environ.get("SECONDARY_TIME_WARN_ABOVE_PERCENT", "50"))
-    )
-
-    airly = Luftdaten(
-        os.environ.get("LAT"),
-        os.environ.get("LON"),
-        int(os.environ.get("AIRLY_TTL", "20"))
-    )
-    weather = Weather(
-        os.environ.get("DARKSKY_KEY"),
-        os.environ.get("LAT"),
-        os.environ.get("LON"),
-        os.environ.get("DARKSKY_UNITS", "si"),
-        int(os.environ.get("DARKSKY_TTL", "15"))
-    )
-    system_info = SystemInfo()
-
-    events = ICal(os.environ.get("EVENTS_ICAL_URL"))
-
-
-    def __init__(self, debug_mode = False):
+    # how many full (i.e. ~15s tri-color) & fast (fast LUT) refreshes are allowed within an hour - 0 for no limit
+    FULL_REFRESH_BUDGET = int(os.environ.get("EPAPER_FULL_REFRESH_BUDGET", "20"))
+    FAST_REFRESH_BUDGET = int(os.environ.get("EPAPER_FAST_REFRESH_BUDGET", "60"))
+    # refreshes kept for the main screen - details screens are dropped when the budget goes below that
+    REFRESH_BUDGET_RESERVE = int(os.environ.get("EPAPER_REFRESH_BUDGET_RESERVE", "2"))
+    # a virtual panel instead of the real one - to judge refresh cost & fast LUT artifacts without hardware
+    SIMULATOR = os.environ.get("EPAPER_SIMULATOR", "false") == "true"
+    SIMULATOR_OUT = os.environ.get("EPAPER_SIMULATOR_OUT", "sim")
+    SIMULATOR_SPEED = float(os.environ.get("EPAPER_SIMULATOR_SPEED", "0"))
+
+    # LUT tables that differ between epd2in7b and epd2in7b_fast_lut
+    LUT_TABLES = ('lut_vcom_dc', 'lut_ww', 'lut_bw', 'lut_bb', 'lut_wb')
+
+    TIME_FORMAT = "%H%M"
+
+    # frames are rendered & packed for someone else (see render_server.py) - no panel is driven
+    HEADLESS = False
+
+    # one of several panels driven by the process (see panels.py), None - the only one, configured by the settings above
+    PANEL = None
+
+
+    @classmethod
+    def for_panel(cls, panel, **settings):
+        """EPaper of one of several panels - the settings above replaced with the ones of the panel (a PanelConfig) & given ones."""
+        if panel.device_type not in PANEL_TYPES:
+            raise Exception('Incorrect epaper screen type: ' + panel.device_type)
+        panel_type = PANEL_TYPES[panel.device_type]
+
+        def setting(value, default):
+            return default if value is None else value
+
+        settings.update({
+            'PANEL': panel,
+            'DEVICE_TYPE': panel.device_type,
+            'EPD_WIDTH': panel_type.width,
+            'EPD_HEIGHT': panel_type.height,
+            'PACKED_INK_BIT': panel_type.packed_ink_bit,
+            'MONO_DISPLAY': setting(panel.mono, panel_type.mono),
+            'FAST_REFRESH': setting(panel.fast_refresh, cls.FAST_REFRESH),
+            'CLOCK_HOURS_MINS_SEPARATOR': setting(panel.clock_separator, cls.CLOCK_HOURS_MINS_SEPARATOR),
+            'PREFER_AIRLY_LOCAL_TEMP': setting(panel.prefer_airly_local_temp, cls.PREFER_AIRLY_LOCAL_TEMP),
+        })
+        return type('EPaper_' + panel.name, (cls,), settings)
+
+
+    def __init__(self, debug_mode = False, shared = None):
+
+        # drawing & data providers are built per instance (not on import) so that importing this module stays cheap
+        with timed('startup.providers'):
+            # panels of one process share fonts & icons - canvases are their own
+            self.drawing = Drawing(
+                os.environ.get("DARK_SKY_UNITS", "si"),
+                int(os.environ.get("WEATHER_STORM_DISTANCE_WARN", "10")),
+                int(os.environ.get("AQI_WARN_LEVEL", "75")),
+                int(os.environ.get("FIRST_TIME_WARN_ABOVE_PERCENT", "50")),
+                int(os.environ.get("SECONDARY_TIME_WARN_ABOVE_PERCENT", "50")),
+                shared.drawing if shared is not None else None
+            )
+            if shared is not None:
+                # ...and data providers - so these fetch & cache once for all the panels
+                self.airly = shared.airly
+                self.weather = shared.weather
+                self.system_info = shared.system_info
+                self.history = shared.history
+                self.events = shared.events
+            else:
+                self.build_providers()
 
         self._debug_mode = debug_mode
-        if not debug_mode:
-            if self.DEVICE_TYPE == 'waveshare-2.7':
+        if not debug_mode and not self.HEADLESS:
+            if self.SIMULATOR:
+                from panel_sim import SimulatedEPD
+                self._simulator_out = os.path.join(self.SIMULATOR_OUT, self.PANEL.name) if self.SIMULATOR_OUT and self.PANEL else self.SIMULATOR_OUT
+                self._epd = SimulatedEPD(self.DEVICE_TYPE, self.MONO_DISPLAY, self.FAST_REFRESH, self._simulator_out, self.SIMULATOR_SPEED)
+                if self._simulator_out and not os.path.exists(self._simulator_out):
+                    os.makedirs(self._simulator_out)
+            elif self.DEVICE_TYPE == 'waveshare-2.7':
                 if self.FAST_REFRESH:
                     logging.info("Using experimental LUT tables!")
                     from epds import epd2in7b_fast_lut
-                    self._epd = epd2in7b_fast_lut.EPD()
+                    self._epd = epd2in7b_fast_lut.EPD(self.panel_interface())
                 else:
                     from epds import epd2in7b
-                    self._epd = epd2in7b.EPD()
+                    self._epd = epd2in7b.EPD(self.panel_interface())
             elif self.DEVICE_TYPE == 'waveshare-4.2':
                 from epds import epd4in2
-                self._epd = epd4in2.EPD()
+                self._epd = epd4in2.EPD(self.panel_interface())
 
-            self._epd.init()
+            # the SPI transfer is what display_frame spends on top of waiting for the panel to refresh - the waits
+            # are counted per panel too as panels of a group refresh in parallel
+            self._idle_waited = 0.0
+            self._epd.wait_until_idle = self.count_idle_wait(timings.wrap('epd.wait_until_idle', self._epd.wait_until_idle))
+        # the panel keeps its content without power - the driver is initialized just before the first refresh
+        self._epd_ready = False
 
         self._str_time = "XXXX"
+        self._displayed_hash = None
+        self._pack_buffers = {}
+        self._fast_lut = self.FAST_REFRESH
+        self._budgets = {
+            'full': RefreshBudget('full', self.FULL_REFRESH_BUDGET),
+            'fast': RefreshBudget('fast', self.FAST_REFRESH_BUDGET),
+        }
+        self.refreshes_deferred = 0
+        self.refreshes_fast_fallback = 0
+        self._listeners = []
+        self._sinks = []
+
+        self.last_render_time = None
+        self.last_display_time = None
+
+        # initial guesses of how long it takes to render a screen & refresh the panel - measured later on
+        self.render_latency = 0.0 if debug_mode else 3.0
+        if debug_mode:
+            self.display_latency = 0.0
+        elif self.DEVICE_TYPE == 'waveshare-2.7' and not self.FAST_REFRESH:
+            self.display_latency = 15.0
+        else:
+            self.display_latency = 5.0
+
+        # debug mode always renders every screen
+        state_file = os.environ.get("EPAPER_STATE_FILE", "~/.epaper-display/display.state")
+        if self.PANEL is not None:
+            state_file = "{0}-{2}{1}".format(*(os.path.splitext(state_file) + (self.PANEL.name,)))
+        self._state_store = None if debug_mode or self.HEADLESS else DisplayStateStore(state_file)
+        if self._state_store is not None:
+            self.restore_state(self._state_store.load())
+
+
+    def build_providers(self):
+        self.airly = Luftdaten(
+            os.environ.get("LAT"),
+            os.environ.get("LON"),
+            int(os.environ.get("AIRLY_TTL", "20")),
+            [s.strip() for s in os.environ.get("LUFTDATEN_SENSORS", "5708,5709").split(",") if s.strip()],
+            int(os.environ.get("LUFTDATEN_FETCH_TIMEOUT", "10")),
+            os.environ.get("LUFTDATEN_URL")
+        )
+        self.weather = Weather(
+            os.environ.get("DARKSKY_KEY"),
+            os.environ.get("LAT"),
+            os.environ.get("LON"),
+            os.environ.get("DARKSKY_UNITS", "si"),
+            int(os.environ.get("DARKSKY_TTL", "15")),
+            os.environ.get("DARKSKY_URL")
+        )
+        self.system_info = SystemInfo()
+
+        self.history = History(
+            os.environ.get("HISTORY_FILE", "~/.epaper-display/history.bin"),
+            int(os.environ.get("HISTORY_CAPACITY", "1008")),  # a week of readings taken every 10 minutes
+            int(os.environ.get("HISTORY_SAVE_MINUTES", "60")) * 60
+        )
+
+        self.events = ICal(
+            os.environ.get("EVENTS_ICAL_URL"),
+            int(os.environ.get("EVENTS_TTL", "30")),
+            int(os.environ.get("EVENTS_WINDOW_DAYS", "31"))
+        )
+
+
+    def providers(self):
+        """(name, provider) pairs of the data sources to watch - provider has get_cache_ts(), data_hash() and last_error."""
+        return [('weather', self.weather), ('luftdaten', self.airly), ('events', self.events)]
+
+
+    def panel_interface(self):
+        # None - the driver talks to the single panel wired as in Waveshare's HAT
+        if self.PANEL is None:
+            return None
+        from epds import epdif
+        return epdif.EpdIf(self.PANEL.rst_pin, self.PANEL.dc_pin, self.PANEL.cs_pin, self.PANEL.busy_pin, self.PANEL.spi_bus, self.PANEL.spi_device)
+
+
+    def count_idle_wait(self, wait_until_idle):
+        def counted():
+            started = time.time()
+            try:
+                return wait_until_idle()
+            finally:
+                self._idle_waited += time.time() - started
+        return counted
+
+
+    def restore_state(self, state):
+        if state is None or state.device_type != self.DEVICE_TYPE or state.mono != self.MONO_DISPLAY:
+            return
+        self._displayed_hash = state.frame_hash
+        if state.time_str is not None:
+            # the main screen of that minute is already there - no need to render nor refresh it again
+            self._str_time = state.time_str
+        self.render_latency = state.render_latency
+        self.display_latency = state.display_latency
 
 
-    def display(self, black_buf, red_buf, name):
-        if self._debug_mode:
-            debug_output = "test/epaper-" + ( name.strftime("%H-%M-%S") if type(name) is not str else name )
-            logging.info("Debug mode - saving screen output to: " + debug_output + "* bmps")
-            black_buf.save(debug_output + "_bw_frame.bmp")
-            if not self.MONO_DISPLAY:
-                red_buf.save(debug_output + "_red_frame.bmp")
-            return
+    def sleep_panel(self):
+        # the content stays on the panel - the driver is initialized again before the next refresh
+        if self._epd_ready:
+            logging.info("Putting the panel into deep sleep")
+            self._epd.sleep()
+            self._epd_ready = False
 
-        if not self.MONO_DISPLAY:
-            logging.info("Going to display a new tri-color image...")
-            self._epd.display_frame(
-                self._epd.get_frame_buffer(black_buf),
-                self._epd.get_frame_buffer(red_buf)
-            )
+
+    def set_fast_lut(self, fast):
+        # the 2.7" drivers differ only in LUT tables - these can be swapped at runtime
+        if fast == self._fast_lut or self._debug_mode:
+            return
+        self.init_panel()
+        if hasattr(self._epd, 'set_fast_lut'):
+            self._epd.set_fast_lut(fast)
+        elif fast:
+            from epds import epd2in7b_fast_lut
+            for table in self.LUT_TABLES:
+                setattr(self._epd, table, getattr(epd2in7b_fast_lut.EPD, table))
         else:
-            logging.info("Going to display a new mono-color image...")
-            self._epd.display_frame(
-                self._epd.get_frame_buffer(black_buf)
-            )
+            for table in self.LUT_TABLES:
+                self._epd.__dict__.pop(table, None)
+        self._epd.set_lut()
+        self._fast_lut = fast
 
 
-    def display_buffer(self, black_buf, red_buf, dt):
+    def refresh_kind(self, name):
+        """Which kind of refresh to spend on a frame: 'full', 'fast' or None when it's over the budget."""
+        kind = 'fast' if self.FAST_REFRESH else 'full'
+        if name == 'shutdown':
+            return kind
+        # details screens must leave some budget for the main screen
+        reserve = self.REFRESH_BUDGET_RESERVE if isinstance(name, str) else 0
+        if self._budgets[kind].available(reserve):
+            return kind
+        if kind == 'full' and self.DEVICE_TYPE == 'waveshare-2.7' and self._budgets['fast'].available(reserve):
+            return 'fast'
+        return None
 
-        if self.DEVICE_TYPE == 'waveshare-2.7' and not self._debug_mode:
-            black_buf = black_buf.transpose(Image.ROTATE_90)
-            black_buf = black_buf.resize((self.EPD_WIDTH, self.EPD_HEIGHT), Image.LANCZOS)
 
-            red_buf = red_buf.transpose(Image.ROTATE_90)
-            red_buf = red_buf.resize((self.EPD_WIDTH, self.EPD_HEIGHT), Image.LANCZOS)
+    def budget_available_at(self):
+        """When a main screen refresh fits into the budgets again (the kinds refresh_kind() may pick) - now if it does."""
+        kinds = ['fast' if self.FAST_REFRESH else 'full']
+        if kinds[0] == 'full' and self.DEVICE_TYPE == 'waveshare-2.7':
+            kinds.append('fast')
+        return min(self._budgets[kind].next_available() for kind in kinds)
 
-        self.display(black_buf, red_buf, dt)
 
+    def update_budget_metrics(self):
+        for kind, budget in self._budgets.items():
+            timings.gauge('refresh_budget_{}_used'.format(kind), budget.used())
+            timings.gauge('refresh_budget_{}_limit'.format(kind), budget.per_hour)
+        timings.gauge('refreshes_deferred_total', self.refreshes_deferred)
+        timings.gauge('refreshes_fast_fallback_total', self.refreshes_fast_fallback)
 
-    def display_shutdown(self):
-        black_frame, red_frame = self.drawing.draw_shutdown(self.MONO_DISPLAY)
-        self.display_buffer(black_frame, red_frame, 'shutdown')
 
+    def init_panel(self):
+        if not self._epd_ready and not self._debug_mode:
+            with timed('startup.epd_init'):
+                self._epd.init()
+            self._epd_ready = True
 
-    def display_airly_details(self):
-        black_frame, red_frame = self.drawing.draw_airly_details(self.airly.get())
-        self.display_buffer(black_frame, red_frame, 'airly')
 
+    def close(self):
+        if self.SIMULATOR and not self._debug_mode and not self.HEADLESS:
+            logging.info("Simulated panel: {}".format(self._epd.report()))
+            if self._simulator_out:
+                self._epd.save_animation(os.path.join(self._simulator_out, 'animation.gif'))
+        for sink in self._sinks:
+            sink.close()
+        if self.history is not None:
+            self.history.flush()
 
-    def display_weather_forecast(self):
-        black_frame, red_frame = self.drawing.draw_weather_forecast(self.weather.get())
-        self.display_buffer(black_frame, red_frame, 'forecast')
 
+    def add_listener(self, listener):
+        """Registers listener(frame) called after each frame has been displayed.
 
-    def display_weather_details(self):
-        black_frame, red_frame = self.drawing.draw_weather_details(self.weather.get())
-        self.display_buffer(black_frame, red_frame, 'weather')
+        Images & buffers of the frame are reused for the next frame of the same screen - copy what must be kept."""
+        self._listeners.append(listener)
 
 
-    def display_system_details(self):
-        black_frame, red_frame = self.drawing.draw_system_details(self.system_info.get())
-        self.display_buffer(black_frame, red_frame, 'system')
+    def open_frame_sink(self, spec):
+        """Sends every displayed frame to a file, FIFO or Unix socket as well, i.e. "unix:/run/epaper/frames.sock" - see frame_sink.py."""
+        if self._debug_mode:
+            logging.warn("Debug mode saves images, no packed frames - frame sink disabled")
+            return
+        from frame_sink import open_sink
+        kind, _, path = spec.partition(':')
+        if self.PANEL is not None:
+            path = "{0}-{2}{1}".format(*(os.path.splitext(path) + (self.PANEL.name,)))
+        sink = open_sink(kind, path, self.DEVICE_TYPE, self.EPD_WIDTH, self.EPD_HEIGHT)
+        self._sinks.append(sink)
+        self.add_listener(sink.frame_displayed)
 
 
-    def display_main_screen(self, dt, force = False):
-        time_format = "%H%M"
-        formatted = dt.strftime(time_format)
+    def open_frame_log(self, directory, days):
+        """Appends every displayed frame to a daily log kept for the given number of days - see frame_log.py."""
+        if self._debug_mode:
+            logging.warn("Debug mode saves images, no packed frames - frame log disabled")
+            return
+        from frame_log import FrameLog
+        prefix = "frames" if self.PANEL is None else "frames-" + self.PANEL.name
+        blank = 0 if self.PACKED_INK_BIT else 255  # a byte of white pixels
+        frame_log = FrameLog(directory, prefix, self.DEVICE_TYPE, self.EPD_WIDTH, self.EPD_HEIGHT, blank, self.providers(), days)
+        self.add_listener(frame_log.frame_displayed)
 
-        # set blank minutes if time's hour is within dead ranges
-        h = formatted[:2]
-        for dead_range in self.DEAD_TIMES:
-            if int(h) in dead_range:
-                formatted = "{}  ".format(h)
 
-        if force or formatted != self._str_time:
+    def prepare_buffer(self, black_buf, red_buf, name, time_str = None):
+        # everything up to the data transfer - so a frame can be prepared ahead of time
+        images = (black_buf, red_buf)
+        if self.DEVICE_TYPE == 'waveshare-2.7' and not self._debug_mode:
+            with timed('epaper.rotate_resize'):
+                black_buf = black_buf.transpose(Image.ROTATE_90)
+                black_buf = black_buf.resize((self.EPD_WIDTH, self.EPD_HEIGHT), Image.LANCZOS)
+
+                red_buf = red_buf.transpose(Image.ROTATE_90)
+                red_buf = red_buf.resize((self.EPD_WIDTH, self.EPD_HEIGHT), Image.LANCZOS)
+
+        if not self._debug_mode:
+            with timed('epd.get_frame_buffer'):
+                screen = name if isinstance(name, str) else 'main'
+                black_buf = self.pack(black_buf, screen, 'black')
+                red_buf = self.pack(red_buf, screen, 'red') if not self.MONO_DISPLAY else None
+
+        return Frame(black=black_buf, red=red_buf, name=name, time_str=time_str, images=images)
+
+
+    def pack(self, image, screen, plane):
+        """The driver's frame buffer (a bit per pixel, MSB first, row by row) packed by PIL instead of a pixel by pixel loop.
+
+        Packed into a buffer reused per screen & plane - the same layout as get_frame_buffer() of epds drivers returns."""
+        if image.mode != '1':
+            image = image.convert('1')
+        data = image.tobytes()  # PIL sets bits of white pixels
+        if self.PACKED_INK_BIT:
+            data = data.translate(INVERT)
+        key = (screen, plane)
+        buf = self._pack_buffers.get(key)
+        if buf is None or len(buf) != len(data):
+            buf = self._pack_buffers[key] = bytearray(data)
+        else:
+            buf[:] = data
+        return buf
+
+
+    def display(self, frame, cancelled = None):
+        # the last chance to drop a frame that is no longer wanted - the panel refresh itself can't be interrupted
+        if cancelled is not None and cancelled():
+            logging.info("Displaying of '{}' cancelled".format(frame.name))
+            return False
+
+        started = time.time()
+        name = frame.name
+        planes = [pack_plane(frame.black), pack_plane(frame.red)]
+        displayed_hash = frame_hash(planes)
+        if displayed_hash == self._displayed_hash and not self._debug_mode:
+            logging.info("Panel already shows '{}' - skipping the refresh".format(name))
+            if frame.time_str is not None:
+                self._str_time = frame.time_str
+            return True
+
+        kind = self.refresh_kind(name)
+        if kind is None:
+            # the main screen of a later tick will carry this change - details are simply dropped
+            logging.warn("Refresh budget exhausted - '{}' deferred".format(name))
+            self.refreshes_deferred += 1
+            self.update_budget_metrics()
+            return False
+        if kind != ('fast' if self.FAST_REFRESH else 'full'):
+            logging.info("Full refresh budget exhausted - falling back to fast LUT for '{}'".format(name))
+            self.refreshes_fast_fallback += 1
+        self._budgets[kind].spend()
+        self.update_budget_metrics()
 
-            weather_data = self.weather.get()
+        if self._debug_mode:
+            debug_output = "test/epaper-" + (self.PANEL.name + "-" if self.PANEL else "") + ( name.strftime("%H-%M-%S") if type(name) is not str else name )
+            logging.info("Debug mode - saving screen output to: " + debug_output + "* bmps")
+            frame.black.save(debug_output + "_bw_frame.bmp")
+            if not self.MONO_DISPLAY:
+                frame.red.save(debug_output + "_red_frame.bmp")
+        else:
+            self.set_fast_lut(kind == 'fast')
+            self.init_panel()
+            waited = self._idle_waited
+            with timed('epd.display_frame'):
+                if not self.MONO_DISPLAY:
+                    logging.info("Going to display a new tri-color image...")
+                    self._epd.display_frame(frame.black, frame.red)
+                else:
+                    logging.info("Going to display a new mono-color image...")
+                    self._epd.display_frame(frame.black)
+            waited = self._idle_waited - waited
+            timings.observe('epd.spi_transfer', time.time() - started - waited)
+
+        if frame.time_str is not None:
+            self._str_time = frame.time_str
+        self._displayed_hash = displayed_hash
+        self.last_display_time = time.time() - started
+        self.display_latency = ewma(self.display_latency, self.last_display_time)
+
+        if self._state_store is not None:
+            with timed('epaper.save_state'):
+                self._state_store.save(DisplayState(
+                    device_type=self.DEVICE_TYPE,
+                    mono=self.MONO_DISPLAY,
+                    frame_hash=displayed_hash,
+                    name=name if isinstance(name, str) else 'main',
+                    time_str=frame.time_str,
+                    displayed_at=clock.time(),
+                    render_latency=self.render_latency,
+                    display_latency=self.display_latency,
+                    planes=planes
+                ))
+
+        for listener in self._listeners:
+            try:
+                listener(frame)
+            except Exception as e:
+                logging.exception(e)
+        return True
+
+
+    def display_buffer(self, black_buf, red_buf, dt, cancelled = None):
+        if cancelled is not None and cancelled():
+            return False
+        return self.display(self.prepare_buffer(black_buf, red_buf, dt), cancelled)
+
+
+    def draw_screen(self, screen):
+        """Gets the data of a screen (one of SCREENS) and draws its black & red canvases."""
+        if screen == 'main':
+            with timed('provider.weather'):
+                weather_data = self.weather.get()
             logging.info("--- weather: " + json.dumps(weather_data))
+            self.history.record('weather', weather_data, self.weather.get_cache_ts(), self.weather.DEFAULT)
 
-            airly_data = self.airly.get()
+            with timed('provider.luftdaten'):
+                airly_data = self.airly.get()
             logging.info("--- airly: " + json.dumps(airly_data))
+            self.history.record('luftdaten', airly_data, self.airly.get_cache_ts(), self.airly.DEFAULT)
 
-            events_data = self.events.get()
+            with timed('provider.events'):
+                events_data = self.events.get()
 
-            black_frame, red_frame = self.drawing.draw_frame(
+            return self.drawing.draw_frame(
                 self.MONO_DISPLAY,
                 events_data,
                 self.CLOCK_HOURS_MINS_SEPARATOR,
@@ -177,7 +509,79 @@ class EPaper(object):
                 self.PREFER_AIRLY_LOCAL_TEMP,
                 airly_data
             )
-            self.display_buffer(black_frame, red_frame, dt)
+        elif screen == 'airly':
+            with timed('provider.luftdaten'):
+                airly_data = self.airly.get()
+            self.history.record('luftdaten', airly_data, self.airly.get_cache_ts(), self.airly.DEFAULT)
+            return self.drawing.draw_airly_details(airly_data, self.history)
+        elif screen == 'forecast':
+            with timed('provider.weather'):
+                weather_data = self.weather.get()
+            return self.drawing.draw_weather_forecast(weather_data)
+        elif screen == 'weather':
+            with timed('provider.weather'):
+                weather_data = self.weather.get()
+            return self.drawing.draw_weather_details(weather_data)
+        elif screen == 'system':
+            with timed('provider.system_info'):
+                system_data = self.system_info.get()
+            return self.drawing.draw_system_details(system_data)
+        elif screen == 'shutdown':
+            return self.drawing.draw_shutdown(self.MONO_DISPLAY)
+        raise ValueError('Unknown screen: ' + screen)
+
+
+    def display_screen(self, screen, cancelled = None):
+        black_frame, red_frame = self.draw_screen(screen)
+        return self.display_buffer(black_frame, red_frame, screen, cancelled)
+
+
+    def display_shutdown(self):
+        self.display_screen('shutdown')
+
+
+    def display_airly_details(self, cancelled = None):
+        return self.display_screen('airly', cancelled)
+
+
+    def display_weather_forecast(self, cancelled = None):
+        return self.display_screen('forecast', cancelled)
+
+
+    def display_weather_details(self, cancelled = None):
+        return self.display_screen('weather', cancelled)
+
+
+    def display_system_details(self, cancelled = None):
+        return self.display_screen('system', cancelled)
+
+
+    def prepare_main_screen(self, dt, force = False):
+        """Renders the main screen for the given time, returns None if the displayed one is still valid."""
+        if not force and not self.main_screen_due(dt):
+            return None
+        formatted = dt.strftime(self.TIME_FORMAT)
+
+        started = time.time()
+        black_frame, red_frame = self.draw_screen('main')
+        frame = self.prepare_buffer(black_frame, red_frame, dt, formatted)
+
+        self.last_render_time = time.time() - started
+        self.render_latency = ewma(self.render_latency, self.last_render_time)
+        return frame
+
+
+    def main_screen_due(self, dt):
+        """Whether the main screen of the given time differs from the displayed one - the clock shows hours & minutes."""
+        return dt.strftime(self.TIME_FORMAT) != self._str_time
+
+
+    def display_main_screen(self, dt, force = False):
+        frame = self.prepare_main_screen(dt, force)
+        if frame is not None:
+            self.display(frame)
 
-            self._str_time = formatted
 
+    def expected_latency(self):
+        """Seconds from starting to render a main screen till the panel finishes its refresh."""
+        return self.render_latency + self.display_latency
@@ -29,7 +29,7 @@
 # so the refresh is about 10 times faster.
 # https://github.com/pskowronek/epaper-clock-and-more
 
-import epdif
+from . import epdif
 from PIL import Image
 from PIL import ImageDraw
 import RPi.GPIO as GPIO
@@ -84,10 +84,12 @@ ROTATE_180                                  = 2
 ROTATE_270                                  = 3
 
 class EPD:
-    def __init__(self):
-        self.reset_pin = epdif.RST_PIN
-        self.dc_pin = epdif.DC_PIN
-        self.busy_pin = epdif.BUSY_PIN
+    def __init__(self, interface = None):
+        # GPIO & SPI of this very panel - the one wired as in Waveshare's HAT by default
+        self.interface = interface if interface is not None else epdif.default_interface()
+        self.reset_pin = self.interface.rst_pin
+        self.dc_pin = self.interface.dc_pin
+        self.busy_pin = self.interface.busy_pin
         self.width = EPD_WIDTH
         self.height = EPD_HEIGHT
         self.rotate = ROTATE_0
@@ -148,28 +150,26 @@ class EPD:
     ]
 
     def digital_write(self, pin, value):
-        epdif.epd_digital_write(pin, value)
+        self.interface.digital_write(pin, value)
 
     def digital_read(self, pin):
-        return epdif.epd_digital_read(pin)
+        return self.interface.digital_read(pin)
 
     def delay_ms(self, delaytime):
-        epdif.epd_delay_ms(delaytime)
+        self.interface.delay_ms(delaytime)
 
     def send_command(self, command):
-        self.digital_write(self.dc_pin, GPIO.LOW)
-        # the parameter type is list but not int
-        # so use [command] instead of command
-        epdif.spi_transfer([command])
+        self.interface.send(GPIO.LOW, [command])
 
     def send_data(self, data):
-        self.digital_write(self.dc_pin, GPIO.HIGH)
-        # the parameter type is list but not int
-        # so use [data] instead of data
-        epdif.spi_transfer([data])
+        self.interface.send(GPIO.HIGH, [data])
+
+    def send_data_bulk(self, data):
+        # a whole LUT or frame buffer in a few SPI transfers instead of one per byte
+        self.interface.send(GPIO.HIGH, data)
 
     def init(self):
-        if (epdif.epd_init() != 0):
+        if (self.interface.init() != 0):
             return -1
         self.reset()
 
@@ -243,24 +243,19 @@ class EPD:
 
     def set_lut(self):
         self.send_command(LUT_FOR_VCOM)               # vcom
-        for count in range(0, 44):
-            self.send_data(self.lut_vcom_dc[count])
+        self.send_data_bulk(self.lut_vcom_dc[0:44])
         
         self.send_command(LUT_WHITE_TO_WHITE)         # ww --
-        for count in range(0, 42):
-            self.send_data(self.lut_ww[count])
+        self.send_data_bulk(self.lut_ww[0:42])
         
         self.send_command(LUT_BLACK_TO_WHITE)         # bw r
-        for count in range(0, 42):
-            self.send_data(self.lut_bw[count])
+        self.send_data_bulk(self.lut_bw[0:42])
 
         self.send_command(LUT_WHITE_TO_BLACK)         # wb w
-        for count in range(0, 42):
-            self.send_data(self.lut_bb[count])
+        self.send_data_bulk(self.lut_bb[0:42])
 
         self.send_command(LUT_BLACK_TO_BLACK)         # bb b
-        for count in range(0, 42):
-            self.send_data(self.lut_wb[count])
+        self.send_data_bulk(self.lut_wb[0:42])
 
     def get_frame_buffer(self, image):
         buf = [0xFF] * (self.width * self.height / 8)
@@ -290,14 +285,12 @@ class EPD:
         if (frame_buffer_black != None):
             self.send_command(DATA_START_TRANSMISSION_1)           
             self.delay_ms(2)
-            for i in range(0, self.width * self.height / 8):
-                self.send_data(frame_buffer_black[i])  
+            self.send_data_bulk(frame_buffer_black[0:self.width * self.height // 8])
             self.delay_ms(2)                  
         if (frame_buffer_red != None):
             self.send_command(DATA_START_TRANSMISSION_2)
             self.delay_ms(2)
-            for i in range(0, self.width * self.height / 8):
-                self.send_data(frame_buffer_red[i])  
+            self.send_data_bulk(frame_buffer_red[0:self.width * self.height // 8])
             self.delay_ms(2)        
 
         self.send_command(DISPLAY_REFRESH) 
@@ -26,6 +26,7 @@
 
 import spidev
 import RPi.GPIO as GPIO
+import threading
 import time
 
 # Pin definition
@@ -34,30 +35,104 @@ DC_PIN          = 25
 CS_PIN          = 8
 BUSY_PIN        = 24
 
-# SPI device, bus = 0, device = 0
-SPI = spidev.SpiDev(0, 0)
+# chip selects the SPI controller drives itself - (bus, device) -> BCM pin
+HARDWARE_CE     = {(0, 0): 8, (0, 1): 7, (1, 0): 18, (1, 1): 17, (1, 2): 16}
+
+# spidev can't write more than that in a single transfer
+SPI_CHUNK       = 4096
+
+# panels on the same SPI bus take turns - one lock per bus, held only while transferring (not while a panel refreshes)
+_bus_locks = {}
+_bus_locks_lock = threading.Lock()
+
+def bus_lock(bus):
+    with _bus_locks_lock:
+        if bus not in _bus_locks:
+            _bus_locks[bus] = threading.RLock()
+        return _bus_locks[bus]
+
+
+class EpdIf(object):
+    """GPIO & SPI of a single panel - so several panels (each with its own pins & chip select) may be driven at once."""
+
+    def __init__(self, rst_pin = RST_PIN, dc_pin = DC_PIN, cs_pin = CS_PIN, busy_pin = BUSY_PIN, spi_bus = 0, spi_device = 0):
+        self.rst_pin = rst_pin
+        self.dc_pin = dc_pin
+        self.cs_pin = cs_pin
+        self.busy_pin = busy_pin
+        self.spi_bus = spi_bus
+        self.spi_device = spi_device
+        self.lock = bus_lock(spi_bus)
+        self.spi = None
+        # any other pin is driven here around each transfer - taking a CE pin over would leave it selected for good
+        self.software_cs = HARDWARE_CE.get((spi_bus, spi_device)) != cs_pin
+
+    def digital_write(self, pin, value):
+        GPIO.output(pin, value)
+
+    def digital_read(self, pin):
+        return GPIO.input(pin)
+
+    def delay_ms(self, delaytime):
+        time.sleep(delaytime / 1000.0)
+
+    def send(self, dc, data):
+        # DC lines may be shared by the panels too - it is set under the bus lock along with the transfer
+        with self.lock:
+            GPIO.output(self.dc_pin, dc)
+            if self.software_cs:
+                GPIO.output(self.cs_pin, GPIO.LOW)
+            try:
+                self.spi_transfer(data)
+            finally:
+                if self.software_cs:
+                    GPIO.output(self.cs_pin, GPIO.HIGH)
+
+    def spi_transfer(self, data):
+        # one ioctl per chunk instead of one per byte - a 2.7" frame is ~11kB
+        with self.lock:
+            for i in range(0, len(data), SPI_CHUNK):
+                self.spi.writebytes(list(data[i:i + SPI_CHUNK]))
+
+    def init(self):
+        GPIO.setmode(GPIO.BCM)
+        GPIO.setwarnings(False)
+        GPIO.setup(self.rst_pin, GPIO.OUT)
+        GPIO.setup(self.dc_pin, GPIO.OUT)
+        if self.software_cs:
+            GPIO.setup(self.cs_pin, GPIO.OUT, initial=GPIO.HIGH)
+        GPIO.setup(self.busy_pin, GPIO.IN)
+        if self.spi is None:
+            self.spi = spidev.SpiDev(self.spi_bus, self.spi_device)
+            if self.software_cs:
+                self.spi.no_cs = True  # the CE of spi_device stays free for whatever is wired to it
+        self.spi.max_speed_hz = 2000000
+        self.spi.mode = 0b00
+        return 0
+
+
+# the single panel wired as in Waveshare's HAT - what the functions below talk to
+_default = None
+
+def default_interface():
+    global _default
+    if _default is None:
+        _default = EpdIf()
+    return _default
 
 def epd_digital_write(pin, value):
-    GPIO.output(pin, value)
+    default_interface().digital_write(pin, value)
 
 def epd_digital_read(pin):
-    return GPIO.input(BUSY_PIN)
+    return default_interface().digital_read(pin)
 
 def epd_delay_ms(delaytime):
-    time.sleep(delaytime / 1000.0)
+    default_interface().delay_ms(delaytime)
 
 def spi_transfer(data):
-    SPI.writebytes(data)
+    default_interface().spi_transfer(data)
 
 def epd_init():
-    GPIO.setmode(GPIO.BCM)
-    GPIO.setwarnings(False)
-    GPIO.setup(RST_PIN, GPIO.OUT)
-    GPIO.setup(DC_PIN, GPIO.OUT)
-    GPIO.setup(CS_PIN, GPIO.OUT)
-    GPIO.setup(BUSY_PIN, GPIO.IN)
-    SPI.max_speed_hz = 2000000
-    SPI.mode = 0b00
-    return 0;
+    return default_interface().init()
 
 ### END OF FILE ###
@@ -0,0 +1,331 @@
+# https://github.com/pskowronek/epaper-clock-and-more, Apache 2 license
+
+"""History of the frames displayed on the panel (see EPAPER_FRAME_LOG in run-EDIT-ME.sh) - to tell what it showed & when.
+
+A file per day: a header, then a record per displayed frame - when it was displayed, its hash, name & time, hashes of
+the data it was drawn from (the ones changed since the previous record) and the packed planes XORed with the previous
+frame, run-length encoded - a ticking clock changes a few dozen bytes. The first frame of a file and every
+KEYFRAME_INTERVAL-th one are XORed with a blank frame instead, so rebuilding any frame takes at most that many records.
+To list the frames of a day, check all of them or rebuild one (as PNGs of its planes):
+    python frame_log.py ~/.epaper-display/frames/frames-2026-10-19.log
+    python frame_log.py ~/.epaper-display/frames/frames-2026-10-19.log --verify
+    python frame_log.py ~/.epaper-display/frames/frames-2026-10-19.log --at 14:05 --png /tmp/frame
+"""
+
+import argparse
+import binascii
+import json
+import logging
+import os
+import re
+import struct
+import time
+from collections import namedtuple
+from datetime import datetime
+
+from display_state import pack_plane, frame_hash
+from timing import timed
+import clock
+
+
+MAGIC = b'EPL1'
+# magic, panel type (NUL padded), width, height, black & red plane lengths, byte of a blank (white) plane
+FILE_HEADER = struct.Struct('<4s16sHHIIB')
+# kind, displayed at (epoch seconds), metadata (JSON) length, frame hash, delta length - followed by metadata & delta
+RECORD = struct.Struct('<BdH20sI')
+
+KEYFRAME = 0
+DELTA = 1
+# frames between keyframes - about an hour of main screens
+KEYFRAME_INTERVAL = 60
+
+# nonzero XOR bytes - one or two zero bytes within a run cost less than starting a new one
+RUNS = re.compile(b'[^\\x00]+(?:\\x00{1,2}[^\\x00]+)*')
+FILE_NAME = r'-(\d{4}-\d{2}-\d{2})\.log(\.\d+)?$'  # moved aside ones too
+
+LogHeader = namedtuple('LogHeader', ['device_type', 'width', 'height', 'black_length', 'red_length', 'blank'])
+LogRecord = namedtuple('LogRecord', ['kind', 'displayed_at', 'meta', 'frame_hash', 'delta'])
+
+
+def put_varint(out, value):
+    while value >= 0x80:
+        out.append(value & 0x7f | 0x80)
+        value >>= 7
+    out.append(value)
+
+
+def get_varint(data, pos):
+    value = shift = 0
+    while True:
+        byte = data[pos]
+        pos += 1
+        value |= (byte & 0x7f) << shift
+        if byte < 0x80:
+            return value, pos
+        shift += 7
+
+
+def encode_delta(previous, current):
+    """XOR of two frames as (zero bytes skipped, length, XORed bytes) runs - lengths as varints."""
+    xor = bytes(bytearray(a ^ b for a, b in zip(bytearray(previous), bytearray(current))))
+    out = bytearray()
+    pos = 0
+    for run in RUNS.finditer(xor):
+        put_varint(out, run.start() - pos)
+        put_varint(out, run.end() - run.start())
+        out += run.group()
+        pos = run.end()
+    return bytes(out)
+
+
+def apply_delta(frame, delta):
+    # frame - a bytearray XORed in place
+    delta = bytearray(delta)
+    pos = offset = 0
+    while pos < len(delta):
+        skip, pos = get_varint(delta, pos)
+        length, pos = get_varint(delta, pos)
+        offset += skip
+        for i in range(length):
+            frame[offset + i] ^= delta[pos + i]
+        offset += length
+        pos += length
+
+
+def blank_frame(header):
+    return bytearray([header.blank]) * (header.black_length + header.red_length)
+
+
+def read_log(path):
+    """(LogHeader, LogRecords, length of the valid part) of a log file - a record torn by a power cut ends it."""
+    with open(path, 'rb') as fp:
+        data = fp.read()
+    if len(data) < FILE_HEADER.size:
+        raise ValueError("Not a frame log: " + path)
+    magic, device_type, width, height, black_length, red_length, blank = FILE_HEADER.unpack_from(data)
+    if magic != MAGIC:
+        raise ValueError("Not a frame log: " + path)
+    header = LogHeader(device_type.rstrip(b'\0').decode('ascii'), width, height, black_length, red_length, blank)
+
+    records = []
+    pos = FILE_HEADER.size
+    while pos + RECORD.size <= len(data):
+        kind, displayed_at, meta_length, hash_raw, delta_length = RECORD.unpack_from(data, pos)
+        meta_start = pos + RECORD.size
+        end = meta_start + meta_length + delta_length
+        if end > len(data) or kind not in (KEYFRAME, DELTA):
+            break
+        meta = json.loads(data[meta_start:meta_start + meta_length].decode('utf-8'))
+        delta = data[meta_start + meta_length:end]
+        records.append(LogRecord(kind, displayed_at, meta, binascii.hexlify(hash_raw).decode('ascii'), delta))
+        pos = end
+    return header, records, pos
+
+
+def rebuild(header, records, index):
+    """Packed planes (black followed by red) of a record's frame - from the keyframe before it."""
+    start = index
+    while records[start].kind != KEYFRAME:
+        start -= 1
+        if start < 0:
+            raise ValueError("No keyframe before record {}".format(index))
+    frame = blank_frame(header)
+    for record in records[start:index + 1]:
+        apply_delta(frame, record.delta)
+    return bytes(frame)
+
+
+def inputs_at(records, index):
+    # keyframes carry all the data hashes, deltas the changed ones
+    inputs = {}
+    for record in records[:index + 1]:
+        if record.kind == KEYFRAME:
+            inputs = {}
+        inputs.update(record.meta.get('inputs', {}))
+    return inputs
+
+
+class FrameLog(object):
+    """Appends displayed frames to the log file of the day - files older than the given number of days are deleted."""
+
+
+    def __init__(self, directory, prefix, device_type, width, height, blank, providers, days):
+        self.directory = os.path.expanduser(directory)
+        self.prefix = prefix
+        self.device_type = device_type
+        self.width = width
+        self.height = height
+        self.blank = blank
+        self.providers = providers
+        self.days = days
+        if not os.path.exists(self.directory):
+            os.makedirs(self.directory)
+        self._path = None
+        self._header = None
+        self._previous = None
+        self._since_keyframe = 0
+        self._inputs = {}
+
+
+    def path(self, ts):
+        return os.path.join(self.directory, "{}-{}.log".format(self.prefix, time.strftime("%Y-%m-%d", time.localtime(ts))))
+
+
+    def frame_displayed(self, frame):
+        with timed('frame_log.append'):
+            self.append(frame, clock.time())
+
+
+    def append(self, frame, displayed_at):
+        planes = [pack_plane(frame.black), pack_plane(frame.red)]
+        current = b''.join(planes)
+        path = self.path(displayed_at)
+        if path != self._path:
+            self.open(path, planes)
+
+        if self._previous is None or self._since_keyframe >= KEYFRAME_INTERVAL - 1 or len(self._previous) != len(current):
+            kind = KEYFRAME
+            delta = encode_delta(blank_frame(self._header), current)
+            self._since_keyframe = 0
+        else:
+            kind = DELTA
+            delta = encode_delta(self._previous, current)
+            self._since_keyframe += 1
+
+        inputs = dict((name, provider.data_hash()) for name, provider in self.providers)
+        meta = {'name': frame.name if isinstance(frame.name, str) else 'main'}
+        if frame.time_str is not None:
+            meta['time'] = frame.time_str
+        changed = dict((name, value) for name, value in inputs.items() if kind == KEYFRAME or self._inputs.get(name) != value)
+        if changed:
+            meta['inputs'] = changed
+        meta = json.dumps(meta, sort_keys=True, separators=(',', ':')).encode('utf-8')
+
+        with open(path, 'ab') as fp:
+            fp.write(RECORD.pack(kind, displayed_at, len(meta), binascii.unhexlify(frame_hash(planes)), len(delta)))
+            fp.write(meta)
+            fp.write(delta)
+        self._previous = current
+        self._inputs = inputs
+
+
+    def open(self, path, planes):
+        # the first frame of a day or since the start - a torn record at the end of an existing file is cut off
+        header = LogHeader(self.device_type, self.width, self.height, len(planes[0]), len(planes[1]), self.blank)
+        if os.path.exists(path):
+            try:
+                existing, _, valid_length = read_log(path)
+            except ValueError:
+                existing = None
+            if existing != header:
+                logging.warn("Frame log %s is of another panel - moved aside" % path)
+                os.rename(path, "{}.{}".format(path, int(time.time())))
+            elif valid_length < os.path.getsize(path):
+                logging.warn("Frame log %s ends with a torn record - cut off" % path)
+                with open(path, 'r+b') as fp:
+                    fp.truncate(valid_length)
+        if not os.path.exists(path):
+            with open(path, 'wb') as fp:
+                fp.write(FILE_HEADER.pack(MAGIC, header.device_type.encode('ascii'), header.width, header.height,
+                                          header.black_length, header.red_length, header.blank))
+        self._path = path
+        self._header = header
+        self._previous = None
+        self.prune()
+
+
+    def prune(self):
+        # by the wall clock - a simulated one must never get real logs deleted
+        oldest = time.strftime("%Y-%m-%d", time.localtime(time.time() - self.days * 24 * 3600))
+        pattern = re.compile(re.escape(self.prefix) + FILE_NAME)
+        for name in os.listdir(self.directory):
+            match = pattern.match(name)
+            if match and match.group(1) < oldest:
+                logging.info("Deleting old frame log: " + name)
+                os.remove(os.path.join(self.directory, name))
+
+
+def parse_at(value, records):
+    # HH:MM[:SS] of the day of the log or epoch seconds
+    if ':' not in value:
+        return float(value)
+    day = datetime.fromtimestamp(records[0].displayed_at)
+    parts = [int(p) for p in value.split(':')] + [0]
+    return time.mktime(day.replace(hour=parts[0], minute=parts[1], second=parts[2], microsecond=0).timetuple())
+
+
+def describe(record):
+    kind = 'key' if record.kind == KEYFRAME else 'delta'
+    return "{} {:5} {:8} {:4} {:6}B {} {}".format(
+        datetime.fromtimestamp(record.displayed_at).strftime("%H:%M:%S"), kind, record.meta['name'], record.meta.get('time', ''),
+        len(record.delta), record.frame_hash[:12], json.dumps(record.meta.get('inputs', {}), sort_keys=True))
+
+
+def save_png(header, frame, prefix):
+    from PIL import Image
+    from epaper import INVERT
+    planes = [('black', frame[:header.black_length]), ('red', frame[header.black_length:])]
+    for name, plane in planes:
+        if not plane:
+            continue
+        if header.blank == 0:
+            plane = plane.translate(INVERT)  # ink packed as set bits - PIL sets bits of white pixels
+        image = Image.frombytes('1', (header.width, header.height), plane)
+        if header.height > header.width:
+            image = image.transpose(Image.ROTATE_270)  # 2.7" is drawn in landscape & rotated for the driver
+        image.save("{}-{}.png".format(prefix, name))
+        print("Saved {}-{}.png".format(prefix, name))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Lists, checks & rebuilds frames of a frame log (EPAPER_FRAME_LOG)")
+    parser.add_argument('path')
+    parser.add_argument('--at', help="rebuild the frame shown at HH:MM[:SS] of the day or at epoch seconds")
+    parser.add_argument('--png', help="save planes of the rebuilt frame as <PNG>-black.png & <PNG>-red.png")
+    parser.add_argument('--verify', action='store_true', help="rebuild all the frames & check their hashes")
+    args = parser.parse_args()
+
+    header, records, valid_length = read_log(args.path)
+    print("{} {}x{}, {} frames, {} bytes".format(header.device_type, header.width, header.height, len(records), valid_length))
+    if not records:
+        return 0
+
+    if args.verify:
+        started = time.time()
+        frame = None
+        failed = 0
+        for record in records:
+            if record.kind == KEYFRAME:
+                frame = blank_frame(header)
+            apply_delta(frame, record.delta)
+            planes = [bytes(frame[:header.black_length]), bytes(frame[header.black_length:])]
+            if frame_hash(planes) != record.frame_hash:
+                print("Hash mismatch: " + describe(record))
+                failed += 1
+        print("{} frames rebuilt in {:.2f}s, {} mismatched".format(len(records), time.time() - started, failed))
+        return 1 if failed else 0
+
+    if args.at is None:
+        for record in records:
+            print(describe(record))
+        return 0
+
+    at = parse_at(args.at, records)
+    shown = [i for i, record in enumerate(records) if record.displayed_at <= at]
+    if not shown:
+        print("No frame displayed yet at {}".format(datetime.fromtimestamp(at)))
+        return 1
+    index = shown[-1]
+    started = time.time()
+    frame = rebuild(header, records, index)
+    planes = [frame[:header.black_length], frame[header.black_length:]]
+    print(describe(records[index]))
+    print("Rebuilt in {:.3f}s, hash {}".format(time.time() - started, 'OK' if frame_hash(planes) == records[index].frame_hash else 'MISMATCH'))
+    print("Drawn from: " + json.dumps(inputs_at(records, index), sort_keys=True))
+    if args.png:
+        save_png(header, frame, args.png)
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -0,0 +1,297 @@
+# https://github.com/pskowronek/epaper-clock-and-more, Apache 2 license
+
+"""Frames displayed on the panel for other processes (see EPAPER_FRAME_SINK in run-EDIT-ME.sh) - the packed planes exactly
+as sent to the driver, nothing to render nor pack again. Each frame is a header followed by the black plane and the red one
+(empty for mono panels):
+
+    magic 'EPF1', panel type (16 bytes, NUL padded), width & height (uint16), black & red plane lengths (uint32),
+    frame hash (40 hex digits, the one of the display state file), displayed at (double, epoch seconds) - little endian
+
+A plane holds a bit per pixel, MSB first, row by row in the panel's native orientation (2.7" is 176x264 portrait) - ink
+is 1 on 2.7" and 0 on 4.2". To watch the frames of a sink:
+    python frame_sink.py unix:/run/epaper/frames.sock
+"""
+
+import errno
+import fcntl
+import logging
+import os
+import socket
+import stat
+import struct
+import sys
+import threading
+from collections import namedtuple
+
+from display_state import pack_plane, frame_hash
+import clock
+
+
+MAGIC = b'EPF1'
+HEADER = struct.Struct('<4s16sHHII40sd')
+
+# seconds between attempts to hand a frame over to a reader that isn't there yet
+RETRY_INTERVAL = 1.0
+# seconds a socket reader may take to receive a frame before it gets disconnected
+SEND_TIMEOUT = 2.0
+
+SinkFrame = namedtuple('SinkFrame', ['device_type', 'width', 'height', 'frame_hash', 'displayed_at', 'black', 'red'])
+
+
+def frame_message(device_type, width, height, planes, displayed_at):
+    return HEADER.pack(MAGIC, device_type.encode('ascii'), width, height, len(planes[0]), len(planes[1]),
+                       frame_hash(planes).encode('ascii'), displayed_at) + b''.join(planes)
+
+
+def read_exactly(fp, size):
+    data = b''
+    while len(data) < size:
+        chunk = fp.read(size - len(data))
+        if not chunk:
+            return None
+        data += chunk
+    return data
+
+
+def read_frame(fp):
+    """The next SinkFrame of a stream (a file object of a sink), None at the end of it."""
+    header = read_exactly(fp, HEADER.size)
+    if header is None:
+        return None
+    magic, device_type, width, height, black_length, red_length, hash_hex, displayed_at = HEADER.unpack(header)
+    if magic != MAGIC:
+        raise ValueError("Not a frame sink stream")
+    black = read_exactly(fp, black_length)
+    red = read_exactly(fp, red_length) if red_length else b''
+    if black is None or red is None:
+        return None
+    return SinkFrame(device_type.rstrip(b'\0').decode('ascii'), width, height, hash_hex.decode('ascii'), displayed_at, black, red)
+
+
+class FrameSink(object):
+    """Hands displayed frames over to a writer thread - a slow or missing reader never holds the panel refresh up.
+
+    Only the latest frame is kept, the ones a reader couldn't take in time are dropped."""
+
+
+    def __init__(self, path, device_type, width, height):
+        self.path = os.path.expanduser(path)
+        self.device_type = device_type
+        self.width = width
+        self.height = height
+        directory = os.path.dirname(self.path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory)
+        self._cond = threading.Condition()
+        self._message = None
+        self._closed = False
+        self.open()
+        self._thread = threading.Thread(target=self.run, name="frame-sink")
+        self._thread.daemon = True
+        self._thread.start()
+
+
+    def frame_displayed(self, frame):
+        # packed into bytes here - the buffers of the frame get reused by the next one
+        planes = [pack_plane(frame.black), pack_plane(frame.red)]
+        message = frame_message(self.device_type, self.width, self.height, planes, clock.time())
+        with self._cond:
+            self._message = message
+            self._cond.notify()
+
+
+    def latest(self):
+        with self._cond:
+            return self._message
+
+
+    def run(self):
+        delivered = None
+        while True:
+            with self._cond:
+                while not self._closed and self._message is delivered:
+                    self._cond.wait()
+                if self._message is delivered:
+                    return
+                # the last frame (i.e. the shutdown screen) is still written once when closing
+                message = self._message
+                closing = self._closed
+            try:
+                if self.write(message):
+                    delivered = message
+                elif not closing:
+                    # nobody reads yet - tried again until someone does or a newer frame comes
+                    with self._cond:
+                        if not self._closed and self._message is message:
+                            self._cond.wait(RETRY_INTERVAL)
+            except Exception as e:
+                logging.warn("Unable to write a frame to %s: %s" % (self.path, e))
+                delivered = message
+            if closing:
+                return
+
+
+    def open(self):
+        pass
+
+
+    def write(self, message):
+        """Writes a frame, False if it is to be written again later."""
+        pass
+
+
+    def release(self):
+        pass
+
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self._cond.notify()
+        self._thread.join(RETRY_INTERVAL)
+        self.release()
+
+
+class FileSink(FrameSink):
+    """The latest frame in a file - replaced atomically, readers never see half of it."""
+
+
+    def write(self, message):
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, 'wb') as fp:
+            fp.write(message)
+        os.rename(tmp_path, self.path)
+        return True
+
+
+class FifoSink(FrameSink):
+    """Frames written to a named pipe - created if missing. A reader opening it gets the latest frame and the later ones."""
+
+
+    def open(self):
+        if not os.path.exists(self.path):
+            os.mkfifo(self.path)
+        elif not stat.S_ISFIFO(os.stat(self.path).st_mode):
+            raise Exception("Not a FIFO: " + self.path)
+        self._fd = None
+
+
+    def write(self, message):
+        if self._fd is None:
+            try:
+                fd = os.open(self.path, os.O_WRONLY | os.O_NONBLOCK)
+            except OSError as e:
+                if e.errno == errno.ENXIO:  # no reader
+                    return False
+                raise
+            # blocking from now on - frames are written whole, the writer thread waits for the reader
+            fcntl.fcntl(fd, fcntl.F_SETFL, fcntl.fcntl(fd, fcntl.F_GETFL) & ~os.O_NONBLOCK)
+            self._fd = fd
+        try:
+            view = memoryview(message)
+            while len(view):
+                view = view[os.write(self._fd, view):]
+        except OSError as e:
+            if e.errno != errno.EPIPE:
+                raise
+            # the reader has gone - the next one gets the frame again
+            self.release()
+            return False
+        return True
+
+
+    def release(self):
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+
+
+class SocketSink(FrameSink):
+    """Frames sent to every reader connected to a Unix socket - a reader gets the latest frame as soon as it connects."""
+
+
+    def open(self):
+        if os.path.exists(self.path):
+            os.unlink(self.path)  # left by a previous run
+        self._clients = []
+        self._clients_lock = threading.Lock()
+        self._server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self._server.bind(self.path)
+        self._server.listen(4)
+        accepting = threading.Thread(target=self.accept, name="frame-sink-accept")
+        accepting.daemon = True
+        accepting.start()
+
+
+    def accept(self):
+        while True:
+            try:
+                client, _ = self._server.accept()
+            except Exception:
+                return  # closed
+            client.settimeout(SEND_TIMEOUT)
+            with self._clients_lock:
+                message = self.latest()
+                if message is None or self.send(client, message):
+                    self._clients.append(client)
+
+
+    def send(self, client, message):
+        try:
+            client.sendall(message)
+            return True
+        except Exception as e:
+            logging.info("Frame sink reader disconnected: {}".format(e))
+            client.close()
+            return False
+
+
+    def write(self, message):
+        with self._clients_lock:
+            self._clients = [c for c in self._clients if self.send(c, message)]
+        return True
+
+
+    def release(self):
+        self._server.close()
+        with self._clients_lock:
+            for client in self._clients:
+                client.close()
+            self._clients = []
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+
+
+SINKS = {'file': FileSink, 'fifo': FifoSink, 'unix': SocketSink}
+
+
+def open_sink(kind, path, device_type, width, height):
+    if kind not in SINKS or not path:
+        raise ValueError("Incorrect frame sink (expected file:, fifo: or unix: followed by a path): {}:{}".format(kind, path))
+    return SINKS[kind](path, device_type, width, height)
+
+
+def main(spec):
+    kind, _, path = spec.partition(':')
+    if kind == 'unix':
+        client = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        client.connect(os.path.expanduser(path))
+        fp = client.makefile('rb')
+    else:
+        fp = open(os.path.expanduser(path), 'rb')
+    while True:
+        frame = read_frame(fp)
+        if frame is None:
+            return 0
+        print("{} {}x{} {} black: {}B red: {}B displayed at: {:.0f}".format(
+            frame.device_type, frame.width, frame.height, frame.frame_hash, len(frame.black), len(frame.red), frame.displayed_at))
+        sys.stdout.flush()
+        if kind == 'file':
+            return 0
+
+
+if __name__ == '__main__':
+    if len(sys.argv) != 2:
+        sys.stderr.write("Usage: python frame_sink.py file:<path>|fifo:<path>|unix:<path>\n")
+        raise SystemExit(2)
+    raise SystemExit(main(sys.argv[1]))
@@ -0,0 +1,199 @@
+# https://github.com/pskowronek/epaper-clock-and-more, Apache 2 license
+
+"""Renders every screen for every panel type from recorded provider fixtures (see EPAPER_HTTP_MODE=record) as PNGs.
+
+Screens are rendered in parallel processes and only these whose inputs (fixtures, settings, code or resources)
+have changed since the last run are rendered again. Run it with the same settings (i.e. source run-EDIT-ME.sh)
+as the fixtures have been recorded with - API keys & coordinates are a part of recorded requests:
+    python gallery.py --fixtures fixtures --out www/screenshots/rendered
+"""
+
+import argparse
+import hashlib
+import json
+import logging
+import multiprocessing
+import os
+import re
+import shutil
+import tempfile
+import time
+
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+PANELS = ('waveshare-2.7', 'waveshare-4.2')
+# what the panels look like - 2.7" shows the canvas scaled down, 4.2" as is
+PANEL_SIZES = {'waveshare-2.7': (264, 176), 'waveshare-4.2': (400, 300)}
+SKIPPED_DIRS = ('.git', 'www', 'venv', 'test', 'sim', '__pycache__')
+
+
+def file_digest(digest, path):
+    with open(path, 'rb') as fp:
+        digest.update(fp.read())
+
+
+def tree_hash(top, accept):
+    digest = hashlib.sha1()
+    for directory, dirs, files in os.walk(top):
+        dirs[:] = sorted(d for d in dirs if d not in SKIPPED_DIRS)
+        for name in sorted(files):
+            path = os.path.join(directory, name)
+            if accept(path):
+                digest.update(os.path.relpath(path, top).encode('utf-8'))
+                file_digest(digest, path)
+    return digest.hexdigest()
+
+
+def settings():
+    """Env variables documented in run-EDIT-ME.sh - these change what gets rendered."""
+    with open(os.path.join(ROOT, 'run-EDIT-ME.sh')) as fp:
+        names = set(re.findall(r'export (\w+)=', fp.read()))
+    return dict((k, v) for k, v in os.environ.items() if k in names)
+
+
+def input_hashes(fixtures):
+    code = tree_hash(ROOT, lambda p: p.endswith('.py') or os.sep + 'resources' + os.sep in p)
+    data = tree_hash(fixtures, lambda p: p.endswith('.json')) if os.path.isdir(fixtures) else 'no fixtures'
+    config = hashlib.sha1(json.dumps(settings(), sort_keys=True).encode('utf-8')).hexdigest()
+    return code, data, config
+
+
+def fixtures_time(fixtures):
+    # screens are rendered as of the time of the recording - i.e. "today" of the calendar
+    times = [os.path.getmtime(os.path.join(fixtures, f)) for f in os.listdir(fixtures) if f.endswith('.json')] if os.path.isdir(fixtures) else []
+    if times:
+        return max(times)
+    # no fixtures - today's midnight keeps the outputs stable for the whole day
+    return time.mktime(time.localtime()[:3] + (0, 0, 0, 0, 0, -1))
+
+
+class FixedSystemInfo(object):
+    """The system details screen shows the rendering machine otherwise - not reproducible."""
+
+
+    last_error = None
+
+
+    def get(self):
+        from providers.system_info import SystemTuple
+        return SystemTuple(uptime="12 days", cpu_usage="3.0 %", mem_usage="41.2 %", free_disk="5120 MB")
+
+
+    def get_cache_ts(self):
+        return None
+
+
+def compose(black, red, size, mono):
+    from PIL import Image
+    image = Image.new('RGB', black.size, (255, 255, 255))
+    image.paste((0, 0, 0), mask=black.convert('L').point(lambda v: 255 - v))
+    if not mono and red is not black:
+        image.paste((200, 0, 0), mask=red.convert('L').point(lambda v: 255 - v))
+    return image.resize(size, Image.LANCZOS)
+
+
+def render(job):
+    """Runs in a fresh worker process - the panel type is read from env when epaper gets imported."""
+    os.chdir(ROOT)
+    work_dir = tempfile.mkdtemp(prefix='epaper-gallery-')
+    try:
+        os.environ.update({
+            'EPAPER_TYPE': job['panel'],
+            'EPAPER_HTTP_MODE': 'replay',
+            'EPAPER_HTTP_FIXTURES': job['fixtures'],
+            'EPAPER_HTTP_REPLAY_LATENCY': '0',
+            'EPAPER_CACHE_DB': os.path.join(work_dir, 'cache.db'),
+            'HISTORY_FILE': os.path.join(work_dir, 'history.bin'),
+        })
+        import clock
+        clock.install(clock.SimulatedClock(job['time']))
+        from epaper import EPaper
+
+        started = time.time()
+        epaper = EPaper(debug_mode=True)
+        epaper.system_info = FixedSystemInfo()
+        black, red = epaper.draw_screen(job['screen'])
+        compose(black, red, PANEL_SIZES[job['panel']], epaper.MONO_DISPLAY).save(job['path'])
+        return job['key'], time.time() - started, None
+    except Exception as e:
+        logging.exception(e)
+        return job['key'], 0, str(e)
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+def write_index(out_dir, index):
+    with open(os.path.join(out_dir, 'index.json'), 'w') as fp:
+        json.dump(index, fp, indent=1, sort_keys=True)
+    rows = []
+    for panel in PANELS:
+        cells = "".join('<td><img src="{}" alt="{}"><br>{}</td>'.format(index[k]['png'], k, index[k]['screen'])
+                        for k in sorted(index) if index[k]['panel'] == panel)
+        rows.append('<tr><th>{}</th>{}</tr>'.format(panel, cells))
+    with open(os.path.join(out_dir, 'index.html'), 'w') as fp:
+        fp.write('<html><head><title>epaper-clock-and-more screens</title></head>\n<body style="background:#ddd"><table>\n{}\n</table></body></html>\n'.format("\n".join(rows)))
+
+
+def main():
+    from epaper import EPaper  # just the list of screens - panel type doesn't matter here
+
+    parser = argparse.ArgumentParser(description="Renders all screens for all panel types from recorded provider fixtures")
+    parser.add_argument('--fixtures', default=os.environ.get("EPAPER_HTTP_FIXTURES", "fixtures"))
+    parser.add_argument('--out', default=os.path.join('www', 'screenshots', 'rendered'))
+    parser.add_argument('--panels', default=",".join(PANELS))
+    parser.add_argument('--screens', default=",".join(EPaper.SCREENS))
+    parser.add_argument('--jobs', type=int, default=multiprocessing.cpu_count())
+    parser.add_argument('--force', action='store_true', help="render everything, even if nothing has changed")
+    args = parser.parse_args()
+
+    fixtures = os.path.abspath(args.fixtures)
+    out_dir = os.path.abspath(args.out)
+    if not os.path.exists(out_dir):
+        os.makedirs(out_dir)
+    index_path = os.path.join(out_dir, 'index.json')
+    index = {}
+    if os.path.exists(index_path):
+        with open(index_path) as fp:
+            index = json.load(fp)
+
+    started = time.time()
+    hashes = input_hashes(fixtures)
+    render_time = fixtures_time(fixtures)
+    jobs = []
+    for panel in args.panels.split(','):
+        for screen in args.screens.split(','):
+            key = "{}-{}".format(panel, screen)
+            digest = hashlib.sha1("|".join(hashes + (key, str(render_time))).encode('utf-8')).hexdigest()
+            png = key + ".png"
+            entry = {'panel': panel, 'screen': screen, 'png': png, 'hash': digest}
+            if not args.force and index.get(key) == entry and os.path.exists(os.path.join(out_dir, png)):
+                continue
+            index[key] = entry
+            jobs.append({'key': key, 'panel': panel, 'screen': screen, 'fixtures': fixtures, 'time': render_time, 'path': os.path.join(out_dir, png)})
+
+    logging.info("{} screens to render, {} up to date".format(len(jobs), len(index) - len(jobs)))
+    failed = 0
+    if jobs:
+        # a fresh (spawned, not forked) process per screen - EPaper & transport read their settings once, on import
+        context = multiprocessing.get_context('spawn') if hasattr(multiprocessing, 'get_context') else multiprocessing
+        pool = context.Pool(min(args.jobs, len(jobs)), maxtasksperchild=1)
+        try:
+            for key, seconds, error in pool.imap_unordered(render, jobs):
+                if error is not None:
+                    failed += 1
+                    del index[key]
+                    logging.warn("{} failed: {}".format(key, error))
+                else:
+                    logging.info("{} rendered in {:.2f}s".format(key, seconds))
+        finally:
+            pool.close()
+            pool.join()
+
+    write_index(out_dir, index)
+    logging.info("Gallery of {} screens in {} done in {:.1f}s".format(len(index), out_dir, time.time() - started))
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO, format='%(message)s')
+    raise SystemExit(main())
@@ -0,0 +1,125 @@
+# https://github.com/pskowronek/epaper-clock-and-more, Apache 2 license
+
+import logging
+import os
+import threading
+
+import clock
+
+
+class HealthMonitor(object):
+    """Pings systemd watchdog only while the main loop makes progress and publishes pipeline health as STATUS."""
+
+
+    def __init__(self, notifier, providers, stall_timeout):
+        self.notifier = notifier
+        self.providers = providers  # (name, provider) pairs - provider has get_cache_ts() and last_error
+        self.stall_timeout = stall_timeout
+        self.watchdog_interval = self.get_watchdog_interval()
+
+        self._lock = threading.Lock()
+        self._stage = 'starting'
+        self._busy_since = clock.time()
+        self._idle_until = None
+        self._last_refresh = None
+        self._last_refresh_ts = None
+        self._refreshes = 0
+        self._stopping = threading.Event()
+
+
+    def get_watchdog_interval(self):
+        # WATCHDOG_USEC is set by systemd when WatchdogSec= is configured - ping twice per period
+        usec = os.environ.get("WATCHDOG_USEC")
+        pid = os.environ.get("WATCHDOG_PID")
+        if not usec or (pid and int(pid) != os.getpid()):
+            return None
+        return int(usec) / 1e6 / 2
+
+
+    def start(self):
+        if self.watchdog_interval is None:
+            logging.info("No systemd watchdog configured")
+            return
+        logging.info("Pinging systemd watchdog every {:.0f}s".format(self.watchdog_interval))
+        thread = threading.Thread(target=self.run, name="health-monitor")
+        thread.daemon = True
+        thread.start()
+
+
+    def stop(self):
+        self._stopping.set()
+        self.notifier.notify("STOPPING=1")
+
+
+    def busy(self, stage):
+        """The main loop started to work on something."""
+        with self._lock:
+            self._stage = stage
+            self._busy_since = clock.time()
+            self._idle_until = None
+
+
+    def idle(self, until):
+        """The main loop goes to sleep and is expected back by the given time."""
+        with self._lock:
+            self._stage = 'idle'
+            self._idle_until = until
+
+
+    def refreshed(self, render_time, display_time):
+        with self._lock:
+            self._last_refresh = (render_time, display_time)
+            self._last_refresh_ts = clock.time()
+            self._refreshes += 1
+        self.notifier.notify("STATUS=" + self.status())
+
+
+    def healthy(self):
+        now = clock.time()
+        with self._lock:
+            if self._idle_until is not None:
+                return now < self._idle_until + self.stall_timeout
+            return now - self._busy_since < self.stall_timeout
+
+
+    def status(self):
+        parts = []
+        with self._lock:
+            if self._last_refresh is not None:
+                parts.append("refresh #{} {:.0f}s ago: render {:.1f}s + panel {:.1f}s".format(
+                    self._refreshes,
+                    clock.time() - self._last_refresh_ts,
+                    self._last_refresh[0],
+                    self._last_refresh[1]
+                ))
+            else:
+                parts.append("no refresh yet")
+            if self._stage != 'idle':
+                parts.append("{} for {:.0f}s".format(self._stage, clock.time() - self._busy_since))
+
+        now = clock.time()
+        ages = []
+        errors = []
+        for name, provider in self.providers:
+            try:
+                ts = provider.get_cache_ts()
+                ages.append("{} {}".format(name, "{:.0f}m".format((now - ts) / 60) if ts is not None else "n/a"))
+                if provider.last_error is not None:
+                    errors.append("{}: {}".format(name, provider.last_error))
+            except Exception as e:
+                errors.append("{}: {}".format(name, e))
+        if ages:
+            parts.append("data age: " + ", ".join(ages))
+        if errors:
+            parts.append("errors: " + ", ".join(errors))
+        return "; ".join(parts)
+
+
+    def run(self):
+        while not self._stopping.wait(self.watchdog_interval):
+            if self.healthy():
+                self.notifier.notify("WATCHDOG=1")
+            else:
+                # no ping - systemd restarts the service once WatchdogSec elapses
+                logging.warn("Main loop seems to be stuck - not pinging the watchdog")
+            self.notifier.notify("STATUS=" + self.status())
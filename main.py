@@ -36,31 +36,97 @@ import atexit
 import sdnotify
 
 import time
-from pytz import timezone
 from datetime import datetime
-from tzlocal import get_localzone
+from dateutil import tz
 
-from epaper import EPaper
+from scheduler import Scheduler, ACTION, SHUTDOWN
+from health import HealthMonitor
+from quiet_hours import QuietHours, parse_quiet_hours, parse_dead_times
+from timing import timings, timed, MemoryTracker
+import clock
+
+# the earliest moment measured - used to report how long it took to get the first frame onto the panel
+STARTED = time.time()
 
 
 DEBUG_MODE = os.environ.get("EPAPER_DEBUG_MODE", "false") == "true"
+# every how many minutes the main screen is refreshed (aligned to the clock, i.e. at every minute for 1, at :00, :05, :10... for 5)
+REFRESH_MINUTES = int(os.environ.get("EPAPER_REFRESH_MINUTES", "1"))
+# for how long (in seconds) details are displayed after a button press
+DETAILS_DISPLAY_TIME = 5
+# seconds of slack added to the measured render & refresh latency when starting to render ahead of time
+RENDER_MARGIN = 1
+# the watchdog isn't pinged when the main loop is busy with one thing (or overslept) for longer than that (in seconds)
+STALL_TIMEOUT = int(os.environ.get("EPAPER_STALL_TIMEOUT", "180"))
+# nothing is fetched nor displayed within these windows, i.e. "23:00-06:30,13:00-14:00" (legacy DEAD_TIMES hour ranges still understood)
+QUIET_HOURS = QuietHours(
+    parse_quiet_hours(os.environ["QUIET_HOURS"]) if "QUIET_HOURS" in os.environ else parse_dead_times(os.environ.get("DEAD_TIMES", "[]"))
+)
+# whether to display the shutdown icon when going down - without it a restarted app resumes without refreshing the panel
+SHUTDOWN_ICON = os.environ.get("EPAPER_SHUTDOWN_ICON", "true") == "true"
+# several panels driven at once, i.e. "kitchen:waveshare-2.7;hallway:waveshare-4.2:cs=7,spi=0.1" - see panels.py
+PANELS = os.environ.get("EPAPER_PANELS", "")
+RENDER_SERVER = os.environ.get("EPAPER_RENDER_SERVER")
+# displayed frames for other processes, i.e. "unix:/run/epaper/frames.sock" - see frame_sink.py
+FRAME_SINK = os.environ.get("EPAPER_FRAME_SINK")
+# daily logs of displayed frames (see frame_log.py) kept for that many days - empty to disable
+FRAME_LOG = os.environ.get("EPAPER_FRAME_LOG", "~/.epaper-display/frames")
+FRAME_LOG_DAYS = int(os.environ.get("EPAPER_FRAME_LOG_DAYS", "14"))
+
+# days to run on a simulated clock (see soak.py) - with EPAPER_SIMULATOR & EPAPER_HTTP_MODE=replay for realistic numbers
+SOAK_DAYS = float(os.environ.get("EPAPER_SOAK_DAYS", "0"))
+
+# traces Python heap per refresh with tracemalloc (slows everything down) - peak & steady state are logged and exported
+TRACE_MEMORY = os.environ.get("EPAPER_TRACEMALLOC", "false") == "true"
+
 shutting_down = False
-details_to_display = None
 epaper = None
+buttons = None
+scheduler = Scheduler()
 
 
 def main():
     global epaper
-    global shutting_down
-    global details_to_display
+    global buttons
+
+    soak = None
+    if SOAK_DAYS > 0:
+        from soak import SoakMonitor
+        soak = SoakMonitor(SOAK_DAYS)
+        soak.install()  # before EPaper is built - it points the cache, history & state files elsewhere
 
-    epaper = EPaper(debug_mode=DEBUG_MODE)
+    memory = None
+    if TRACE_MEMORY:
+        memory = MemoryTracker(timings)
+        memory.start()
+
+    # PIL, drawing & providers are imported here and not on top - so the startup phases can be measured
+    with timed('startup.imports'):
+        from epaper import EPaper
+        if PANELS:
+            from panels import PanelGroup, parse_panels
+        elif RENDER_SERVER:
+            from render_client import RemoteEPaper
+    with timed('startup.epaper'):
+        if PANELS:
+            epaper = PanelGroup(parse_panels(PANELS), debug_mode=DEBUG_MODE)
+        elif RENDER_SERVER:
+            epaper = RemoteEPaper(debug_mode=DEBUG_MODE)
+        else:
+            epaper = EPaper(debug_mode=DEBUG_MODE)
+    timings.labels['panel'] = epaper.DEVICE_TYPE
+    if memory is not None:
+        epaper.add_listener(memory.frame_displayed)
+    if FRAME_SINK:
+        epaper.open_frame_sink(FRAME_SINK)
+    # a soak's fast-forwarded clock would write logs of days to come
+    if FRAME_LOG and not DEBUG_MODE and soak is None:
+        epaper.open_frame_log(FRAME_LOG, FRAME_LOG_DAYS)
 
     atexit.register(shutdown_hook)
     signal.signal(signal.SIGTERM, signal_hook)
 
-    buttons = None
-    if not DEBUG_MODE and (os.environ.get("EPAPER_BUTTONS_ENABLED", "true") == "true"):
+    if not DEBUG_MODE and soak is None and (os.environ.get("EPAPER_BUTTONS_ENABLED", "true") == "true"):
         from buttons import Buttons
         buttons = Buttons(
             [
@@ -72,61 +138,135 @@ def main():
             lambda key: action_button(key, epaper)
         )
 
+    providers = epaper.providers()
+
     notifier = sdnotify.SystemdNotifier()
+    health = HealthMonitor(notifier, providers, STALL_TIMEOUT)
+    health.start()
+
+    if os.environ.get("EPAPER_HTTP_PORT"):
+        from status_server import StatusServer
+        StatusServer(
+            epaper,
+            providers,
+            scheduler,
+            os.environ.get("EPAPER_HTTP_BIND", "127.0.0.1"),
+            int(os.environ.get("EPAPER_HTTP_PORT"))
+        ).start()
     notifier.notify("READY=1")
 
+    health.busy('first refresh')
+    with timed('startup.first_frame'):
+        refresh_main_screen(epaper)
+    logging.info("First frame displayed {:.1f}s after start".format(time.time() - STARTED))
+    health.refreshed(epaper.last_render_time or 0, epaper.last_display_time or 0)
+    timings.export()
+
+    next_tick = schedule_tick(clock.time(), epaper)
+    pending_frame = None
+    details_until = None
     while True:
-        if shutting_down:
-            logging.info("App is shutting down.....")
-            break
+        if soak is not None:
+            soak.sample()
+            if soak.finished():
+                logging.warn(soak.report())
+                break
+            button = soak.button_due()
+            if button is not None:
+                action_button(button, epaper)
+
+        # the next frame is rendered ahead of time and sent so the panel finishes refreshing right at the tick
+        if details_until is not None:
+            deadline = details_until
+        elif pending_frame is not None:
+            deadline = next_tick - epaper.display_latency
+        else:
+            deadline = next_tick - epaper.expected_latency() - RENDER_MARGIN
 
-        notifier.notify("WATCHDOG=1")
+        # sleep until the deadline, a button press or a shutdown - whatever comes first
+        health.idle(deadline)
+        event = scheduler.wait(deadline)
+        health.busy(event.kind)
 
-        if details_to_display is not None:
+        if event.kind == SHUTDOWN:
+            logging.info("App is shutting down...")
+            health.stop()
+            break
+
+        if event.kind == ACTION:
             logging.info("Going to refresh the main screen with details view...")
-            details_to_display()
-            details_to_display = None
-            buttons.set_not_busy()
-            for i in range(10):
-                time.sleep(0.5)
-                if details_to_display is not None:
-                    logging.info("Got button pressed while in details!")
-                    break
-            if details_to_display is not None:
-                continue
+            # a newer button press cancels this one if its screen hasn't been sent to the panel yet
+            if event.action(lambda: scheduler.superseded(event.seq)):
+                scheduler.record_latency(event)
+            pending_frame = None
+            details_until = clock.time() + DETAILS_DISPLAY_TIME
+            continue
+
+        if details_until is not None:
             logging.info("Ok, enough - going back to standard view")
             refresh_main_screen(epaper, force = True)
-        else:
+            health.refreshed(epaper.last_render_time, epaper.last_display_time)
+            details_until = None
+            next_tick = schedule_tick(clock.time(), epaper)
+        elif pending_frame is not None:
             logging.info("Going to refresh the main screen...")
-            refresh_main_screen(epaper)
+            displayed = epaper.display(pending_frame)
+            earliest = max(clock.time(), next_tick)
+            if displayed:
+                health.refreshed(epaper.last_render_time, epaper.last_display_time)
+                logging.info("Main screen refreshed {:+.1f}s off the tick".format(clock.time() - next_tick))
+            else:
+                # over the refresh budget the frame is dropped - ticks that would be dropped too are skipped,
+                # the first one the budget allows coalesces the changes
+                earliest = max(earliest, epaper.budget_available_at() + epaper.display_latency)
+                logging.info("Next refresh within the budget at {}".format(local_time(earliest).strftime("%H:%M:%S")))
+            timings.export()
+            pending_frame = None
+            next_tick = schedule_tick(earliest, epaper)
+        else:
+            pending_frame = epaper.prepare_main_screen(local_time(next_tick))
+            if pending_frame is None:
+                next_tick = schedule_tick(max(clock.time(), next_tick), epaper)
 
-        for i in range(300 if buttons is not None else 1):  # lower the CPU usage when no buttons handled
-            if shutting_down:
-                logging.info("App is shutting down...")
-                break
-            if details_to_display is not None:
-                logging.info("Got button pressed!")
-                break
-            time.sleep(1 if buttons is not None else 300)
+
+def next_boundary(ts, minutes):
+    step = 60 * minutes
+    return (int(ts) // step + 1) * step
+
+
+def schedule_tick(ts, epaper):
+    """The next tick to refresh the main screen at - the first one after quiet hours if these are about to start."""
+    tick = next_boundary(ts, REFRESH_MINUTES)
+    # windows may adjoin one another - but never loop forever if they cover the whole day
+    for _ in QUIET_HOURS.windows:
+        quiet_end = QUIET_HOURS.end_of(local_time(tick))
+        if quiet_end is None:
+            break
+        tick = next_boundary(time.mktime(quiet_end.timetuple()) - 1, REFRESH_MINUTES)
+    if tick - ts > 60 * REFRESH_MINUTES:
+        # the data is fetched again only when rendering ahead of the tick, so nothing wakes up till then
+        logging.info("Quiet hours - next refresh at {}".format(local_time(tick).strftime("%Y-%m-%d %H:%M")))
+        epaper.sleep_panel()
+    return tick
+
+
+def local_time(ts):
+    return datetime.fromtimestamp(ts, tz.tzlocal())
 
 
 def action_button(key, epaper):
-    global details_to_display
     if key == 1:
-        details_to_display = lambda: epaper.display_weather_details()
+        scheduler.post_input(key, epaper.display_weather_details)
     elif key == 2:
-        details_to_display = lambda: epaper.display_airly_details()
+        scheduler.post_input(key, epaper.display_airly_details)
     elif key == 3:
-        details_to_display = lambda: epaper.display_weather_forecast()
+        scheduler.post_input(key, epaper.display_weather_forecast)
     elif key == 4:
-        details_to_display = lambda: epaper.display_system_details()
-    else:
-        details_to_display = None
+        scheduler.post_input(key, epaper.display_system_details)
 
 
 def refresh_main_screen(epaper, force = False):
-    utc_dt = datetime.now(timezone('UTC'))  # time readings should be done in epaper itself (probably using acquire.py w/o caching)
-    epaper.display_main_screen(utc_dt.astimezone(get_localzone()), force)
+    epaper.display_main_screen(local_time(clock.time()), force)
     if DEBUG_MODE:
         epaper.display_weather_details()
         epaper.display_airly_details()
@@ -147,11 +287,14 @@ def shutdown_hook():
     if shutting_down:
         return False
     shutting_down = True
+    scheduler.shutdown()
     logging.info("You are now leaving the Python sector - the app is being shutdown.")
-    if epaper is not None:
+    if epaper is not None and SHUTDOWN_ICON:
         logging.info("...but, let's try to display shutdown icon")
         epaper.display_shutdown()
         logging.info("...finally going down")
+    if epaper is not None:
+        epaper.close()
     return True
 
 
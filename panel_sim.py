@@ -0,0 +1,247 @@
+# https://github.com/pskowronek/epaper-clock-and-more, Apache 2 license
+
+"""A virtual e-paper panel - takes the same packed planes as epds drivers, models refresh durations & ghosting
+and writes what the panel would look like as PNG snapshots and an animated GIF.
+
+Also a command line tool comparing refresh strategies over a sequence of frames, i.e. debug mode output:
+    python panel_sim.py --type waveshare-2.7 --out sim test/*_bw_frame.bmp
+"""
+
+import argparse
+import glob
+import logging
+import os
+import time
+from collections import deque
+
+from PIL import Image, ImageChops
+
+from timing import timings
+
+
+# seconds a refresh of each kind takes - partial is None where the panel doesn't support it
+PROFILES = {
+    'waveshare-2.7': {'full': 15.0, 'fast': 1.5, 'partial': None, 'width': 176, 'height': 264, 'ink_bit': 1},
+    'waveshare-4.2': {'full': 4.0, 'fast': 1.0, 'partial': 0.6, 'width': 400, 'height': 300, 'ink_bit': 0},
+}
+
+# ghosting model: (how much of the ghost survives a refresh, how much a changed pixel adds to it)
+GHOSTING = {
+    'full': (0.05, 0.0),
+    'fast': (0.9, 0.3),
+    'partial': (0.95, 0.2),
+}
+# only the most recent refreshes make it to the animation - a long run must not keep every snapshot in memory
+ANIMATION_FRAMES = 500
+# how visible (0-255) a fully accumulated ghost is in snapshots
+GHOST_OPACITY = 128
+
+WHITE = (255, 255, 255)
+BLACK = (0, 0, 0)
+RED = (200, 0, 0)
+
+
+def unpack_plane(buf, width, height, ink_bit):
+    """Packed plane (a list of ints as returned by get_frame_buffer) to an 'L' image where 0 is ink."""
+    image = Image.frombytes('1', (width, height), bytes(bytearray(buf))).convert('L')
+    return ImageChops.invert(image) if ink_bit else image
+
+
+class SimulatedEPD(object):
+    """Drop-in replacement of epds.epd2in7b.EPD / epds.epd4in2.EPD."""
+
+
+    def __init__(self, device_type, mono, fast_lut = False, out_dir = None, speed = 0.0):
+        profile = PROFILES[device_type]
+        self.device_type = device_type
+        self.width = profile['width']
+        self.height = profile['height']
+        self.profile = profile
+        self.mono = mono
+        self.fast_lut = fast_lut
+        self.out_dir = out_dir
+        self.speed = speed  # 1.0 - refreshes take as long as on the real panel, 0 - no waiting at all
+
+        self.refreshes = 0
+        self.busy_seconds = 0.0
+        self.counts = {'full': 0, 'fast': 0, 'partial': 0}
+        self._pending = 0.0
+        self._black = Image.new('L', (self.width, self.height), 255)
+        self._red = Image.new('L', (self.width, self.height), 255)
+        self._ghost = Image.new('L', (self.width, self.height), 0)
+        self._previous = self.composite()
+        self._frames = deque(maxlen=ANIMATION_FRAMES)  # (snapshot, refresh duration)
+
+
+    def init(self):
+        return 0
+
+
+    def sleep(self):
+        pass
+
+
+    def set_lut(self):
+        pass
+
+
+    def set_fast_lut(self, fast):
+        self.fast_lut = fast
+
+
+    def get_frame_buffer(self, image):
+        image = image.convert('1')
+        if image.size != (self.width, self.height):
+            raise ValueError('Image must be same dimensions as display ({0}x{1}).'.format(self.width, self.height))
+        if self.profile['ink_bit']:
+            image = ImageChops.invert(image.convert('L')).convert('1')
+        return list(bytearray(image.tobytes()))
+
+
+    def display_frame(self, frame_buffer_black, frame_buffer_red = None, mode = None):
+        if mode is None:
+            mode = 'fast' if self.fast_lut else 'full'
+        if self.profile.get(mode) is None:
+            mode = 'full'
+        black = unpack_plane(frame_buffer_black, self.width, self.height, self.profile['ink_bit'])
+        red = unpack_plane(frame_buffer_red, self.width, self.height, self.profile['ink_bit']) if frame_buffer_red is not None else self._red
+
+        changed = ImageChops.lighter(ImageChops.difference(self._black, black), ImageChops.difference(self._red, red))
+        survives, adds = GHOSTING[mode]
+        self._ghost = ImageChops.add(self._ghost.point(lambda v: int(v * survives)), changed.point(lambda v: int(v * adds)))
+        self._previous = self.composite()
+        self._black = black
+        self._red = red
+
+        duration = self.profile[mode]
+        self.refreshes += 1
+        self.counts[mode] += 1
+        self.busy_seconds += duration
+        self._pending = duration
+        timings.observe('sim.refresh_' + mode, duration)
+
+        if self.out_dir:
+            snapshot = self.snapshot()
+            self._frames.append((snapshot, duration))
+            snapshot.save(os.path.join(self.out_dir, 'sim-{:04d}-{}.png'.format(self.refreshes, mode)))
+        self.wait_until_idle()
+
+
+    def wait_until_idle(self):
+        if self._pending and self.speed > 0:
+            time.sleep(self._pending * self.speed)
+        self._pending = 0.0
+
+
+    def composite(self):
+        image = Image.new('RGB', (self.width, self.height), WHITE)
+        image.paste(BLACK, mask=ImageChops.invert(self._black))
+        if not self.mono:
+            image.paste(RED, mask=ImageChops.invert(self._red))
+        return image
+
+
+    def snapshot(self):
+        """What the panel looks like now - the current content with ghosts of the previous one shining through."""
+        return Image.composite(self._previous, self.composite(), self._ghost.point(lambda v: v * GHOST_OPACITY // 255))
+
+
+    def ghosting(self):
+        """Mean & max ghost level (0-1) over the panel."""
+        histogram = self._ghost.histogram()
+        pixels = float(self.width * self.height)
+        mean = sum(level * count for level, count in enumerate(histogram)) / pixels / 255
+        top = max(level for level, count in enumerate(histogram) if count) / 255.0
+        return mean, top
+
+
+    def save_animation(self, path, time_scale = 0.1):
+        """Animated GIF of the recent refreshes (only saved with out_dir), each frame shown for its (scaled) refresh duration."""
+        if not self._frames:
+            return
+        frames = [f for f, _ in self._frames]
+        frames[0].save(
+            path,
+            save_all=True,
+            append_images=frames[1:],
+            duration=[max(20, int(d * 1000 * time_scale)) for _, d in self._frames],
+            loop=0
+        )
+
+
+    def report(self):
+        mean, top = self.ghosting()
+        return {
+            'refreshes': self.refreshes,
+            'counts': dict(self.counts),
+            'busy_seconds': self.busy_seconds,
+            'ghosting_mean': mean,
+            'ghosting_max': top,
+        }
+
+
+def strategy_mode(strategy, i):
+    # 'full', 'fast' or 'fast:N' - fast refreshes with a full one every N-th to clear ghosting
+    if strategy.startswith('fast:'):
+        return 'full' if i % int(strategy[len('fast:'):]) == 0 else 'fast'
+    return strategy
+
+
+def fit(image, width, height):
+    # landscape canvases are rotated onto portrait panels - the same way EPaper.prepare_buffer does it
+    if (image.size[0] > image.size[1]) != (width > height):
+        image = image.transpose(Image.ROTATE_90)
+    return image.resize((width, height), Image.LANCZOS)
+
+
+def simulate(device_type, mono, strategy, images, out_dir = None):
+    epd = SimulatedEPD(device_type, mono, out_dir=out_dir)
+    for i, (black, red) in enumerate(images):
+        epd.display_frame(
+            epd.get_frame_buffer(fit(black, epd.width, epd.height)),
+            epd.get_frame_buffer(fit(red, epd.width, epd.height)) if red is not None and not mono else None,
+            strategy_mode(strategy, i)
+        )
+    return epd
+
+
+def load_frames(paths):
+    images = []
+    for path in sorted(paths):
+        red_path = path.replace('_bw_frame', '_red_frame')
+        red = Image.open(red_path) if red_path != path and os.path.exists(red_path) else None
+        images.append((Image.open(path), red))
+    return images
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compares refresh strategies on a simulated e-paper panel")
+    parser.add_argument('frames', nargs='+', help="black frames (i.e. test/*_bw_frame.bmp), matching _red_frame files are used too")
+    parser.add_argument('--type', default=os.environ.get("EPAPER_TYPE", 'waveshare-2.7'), choices=sorted(PROFILES))
+    parser.add_argument('--mono', action='store_true')
+    parser.add_argument('--strategies', default='full,fast,fast:5', help="comma separated: full, fast, partial, fast:N")
+    parser.add_argument('--out', help="directory for PNG snapshots & animations of every strategy")
+    args = parser.parse_args()
+
+    paths = []
+    for pattern in args.frames:
+        paths.extend(glob.glob(pattern))
+    images = load_frames([p for p in paths if '_red_frame' not in p])
+
+    for strategy in args.strategies.split(','):
+        out_dir = None
+        if args.out:
+            out_dir = os.path.join(args.out, strategy.replace(':', '-'))
+            if not os.path.exists(out_dir):
+                os.makedirs(out_dir)
+        epd = simulate(args.type, args.mono, strategy, images, out_dir)
+        if out_dir:
+            epd.save_animation(os.path.join(out_dir, 'animation.gif'))
+        report = epd.report()
+        print("{:10} refreshes: {:3}  busy: {:7.1f}s  ghosting mean: {:.3f} max: {:.3f}".format(
+            strategy, report['refreshes'], report['busy_seconds'], report['ghosting_mean'], report['ghosting_max']))
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO)
+    main()
@@ -0,0 +1,201 @@
+# https://github.com/pskowronek/epaper-clock-and-more, Apache 2 license
+
+import logging
+import threading
+import time
+from collections import namedtuple
+
+from epaper import EPaper, ewma
+
+
+# a panel of several driven by one process - None of the optional settings means the global one (see run-EDIT-ME.sh)
+PanelConfig = namedtuple('PanelConfig', ['name', 'device_type', 'rst_pin', 'dc_pin', 'cs_pin', 'busy_pin', 'spi_bus', 'spi_device',
+                                         'mono', 'fast_refresh', 'clock_separator', 'prefer_airly_local_temp'])
+
+# pins of Waveshare's HAT on SPI0 CE0 - the options of a panel default to these
+DEFAULT_OPTIONS = {'rst': 17, 'dc': 25, 'cs': 8, 'busy': 24, 'spi': '0.0'}
+FLAGS = {'mono': 'mono', 'fast': 'fast_refresh', 'separator': 'clock_separator', 'local_temp': 'prefer_airly_local_temp'}
+
+
+def parse_flag(name, value):
+    if value not in ('true', 'false'):
+        raise ValueError("Incorrect panel option (expected true or false): {}={}".format(name, value))
+    return value == 'true'
+
+
+def parse_panels(spec):
+    """Parses "kitchen:waveshare-2.7:dc=25,cs=8;hallway:waveshare-4.2:rst=5,dc=6,cs=7,busy=12,spi=0.1,mono=true" into PanelConfigs.
+
+    Options: rst, dc, cs, busy - BCM pins, spi - bus.device, mono, fast, separator, local_temp - true or false."""
+    panels = []
+    for part in spec.split(';'):
+        if not part.strip():
+            continue
+        fields = [f.strip() for f in part.split(':')]
+        if len(fields) not in (2, 3) or not fields[0] or not fields[1]:
+            raise ValueError("Incorrect panel (expected name:type[:options]): " + part.strip())
+        options = dict(DEFAULT_OPTIONS)
+        flags = dict((f, None) for f in FLAGS.values())
+        for option in (fields[2].split(',') if len(fields) == 3 else []):
+            name, _, value = [o.strip() for o in option.partition('=')]
+            if name in FLAGS:
+                flags[FLAGS[name]] = parse_flag(name, value)
+            elif name in DEFAULT_OPTIONS:
+                options[name] = value
+            elif name:
+                raise ValueError("Unknown panel option: " + name)
+        try:
+            spi_bus, spi_device = [int(v) for v in str(options['spi']).split('.')]
+            pins = [int(options[o]) for o in ('rst', 'dc', 'cs', 'busy')]
+        except ValueError:
+            raise ValueError("Incorrect pins or SPI device (expected i.e. spi=0.1) of panel: " + fields[0])
+        panels.append(PanelConfig(fields[0], fields[1], *(pins + [spi_bus, spi_device]), **flags))
+    names = [p.name for p in panels]
+    if len(set(names)) != len(names):
+        raise ValueError("Panel names must be unique: " + ", ".join(names))
+    if not panels:
+        raise ValueError("No panels defined: " + spec)
+    return panels
+
+
+class PanelGroup(object):
+    """Drives several panels from one process the way main.py drives a single EPaper - and looks just like one to it.
+
+    Data providers, fonts & icons are shared, panels of the same type & layout get the same rendered frame. Frames are
+    sent to the panels in parallel - transfers on a shared SPI bus take turns (see epdif), the refreshes overlap."""
+
+
+    def __init__(self, panels, debug_mode = False):
+        self.panels = []
+        for panel in panels:
+            self.panels.append(EPaper.for_panel(panel)(debug_mode, self.panels[0] if self.panels else None))
+        first = self.panels[0]
+        self.DEVICE_TYPE = ",".join("{}={}".format(p.PANEL.name, p.DEVICE_TYPE) for p in self.panels)
+        self.weather = first.weather
+        self.airly = first.airly
+        self.events = first.events
+        self.system_info = first.system_info
+        self.history = first.history
+
+        self.last_render_time = None
+        self.last_display_time = None
+        self.render_latency = sum(p.render_latency for p in self.panels)
+        self.display_latency = max(p.display_latency for p in self.panels)
+
+
+    def providers(self):
+        return self.panels[0].providers()
+
+
+    def layout(self, epaper):
+        # panels rendering the same main screen - i.e. two 2.7" ones with the same settings
+        return (epaper.DEVICE_TYPE, epaper.MONO_DISPLAY, epaper.CLOCK_HOURS_MINS_SEPARATOR, epaper.PREFER_AIRLY_LOCAL_TEMP)
+
+
+    def add_listener(self, listener):
+        for epaper in self.panels:
+            epaper.add_listener(listener)
+
+
+    def open_frame_sink(self, spec):
+        # a sink per panel - the path gets the panel name appended
+        for epaper in self.panels:
+            epaper.open_frame_sink(spec)
+
+
+    def open_frame_log(self, directory, days):
+        for epaper in self.panels:
+            epaper.open_frame_log(directory, days)
+
+
+    def sleep_panel(self):
+        for epaper in self.panels:
+            epaper.sleep_panel()
+
+
+    def close(self):
+        for epaper in self.panels:
+            epaper.close()
+
+
+    def prepare_main_screen(self, dt, force = False):
+        """Frames of the panels to refresh as (epaper, frame) pairs, None if all of them show the right ones already."""
+        started = time.time()
+        layouts = {}
+        for epaper in self.panels:
+            if force or epaper.main_screen_due(dt):
+                layouts.setdefault(self.layout(epaper), []).append(epaper)
+        if not layouts:
+            return None
+
+        frames = []
+        for panels in layouts.values():
+            frame = panels[0].prepare_main_screen(dt, force=True)
+            frames.extend((epaper, frame) for epaper in panels)
+
+        self.last_render_time = time.time() - started
+        self.render_latency = ewma(self.render_latency, self.last_render_time)
+        return frames
+
+
+    def display(self, frames, cancelled = None):
+        started = time.time()
+        results = {}
+
+        def display(epaper, frame):
+            try:
+                results[epaper.PANEL.name] = epaper.display(frame, cancelled)
+            except Exception as e:
+                logging.exception(e)
+                results[epaper.PANEL.name] = False
+
+        threads = [threading.Thread(target=display, args=pair, name="panel-" + pair[0].PANEL.name) for pair in frames[1:]]
+        for thread in threads:
+            thread.start()
+        display(*frames[0])
+        for thread in threads:
+            thread.join()
+
+        self.last_display_time = time.time() - started
+        self.display_latency = ewma(self.display_latency, self.last_display_time)
+        return any(results.values())
+
+
+    def display_main_screen(self, dt, force = False):
+        frames = self.prepare_main_screen(dt, force)
+        if frames is not None:
+            self.display(frames)
+
+
+    def budget_available_at(self):
+        # a frame is deferred only when no panel could take it
+        return min(epaper.budget_available_at() for epaper in self.panels)
+
+
+    def expected_latency(self):
+        return self.render_latency + self.display_latency
+
+
+    def display_shutdown(self):
+        frames = []
+        for epaper in self.panels:
+            black_frame, red_frame = epaper.draw_screen('shutdown')
+            frames.append((epaper, epaper.prepare_buffer(black_frame, red_frame, 'shutdown')))
+        self.display(frames)
+
+
+    def display_airly_details(self, cancelled = None):
+        # details screens are shown on the first panel only - the buttons are on its HAT
+        return self.panels[0].display_airly_details(cancelled)
+
+
+    def display_weather_forecast(self, cancelled = None):
+        return self.panels[0].display_weather_forecast(cancelled)
+
+
+    def display_weather_details(self, cancelled = None):
+        return self.panels[0].display_weather_details(cancelled)
+
+
+    def display_system_details(self, cancelled = None):
+        return self.panels[0].display_system_details(cancelled)
@@ -3,46 +3,87 @@
 
 import logging
 
+import hashlib
 import json
-import os
-import time
+
+from .cache_store import get_store
+import clock
+from timing import timed
 
 
 class Acquire(object):
 
 
-    def cache_name(self):
-        pass
+    # description of the last failed renewal of the cache, None once renewed successfully
+    last_error = None
 
 
-    def cache_path(self):
-        pth_cache = os.path.expanduser("~/.epaper-display/cache/")
-        if not os.path.exists(pth_cache):
-            os.makedirs(pth_cache)
-        return os.path.join(pth_cache, self.cache_name())
+    def cache_name(self):
+        pass
 
 
     def ttl(self):
         return 10  # default 10 minutes
 
 
+    def cache_entry(self):
+        return get_store().get(self.cache_name())
+
+
+    def decode_cached(self, entry):
+        # parse the cached data only once per cache renewal
+        cached = getattr(self, '_decoded_cache', None)
+        if cached is None or cached[0] != entry.ts:
+            cached = (entry.ts, json.loads(entry.data))
+            self._decoded_cache = cached
+        return cached[1]
+
+
     def load_cached(self):
-        fn_cache = self.cache_path()
-        if os.path.exists(fn_cache):
-            logging.info("load cache file: %s" % fn_cache)
-            with open(fn_cache) as fp:
-                return json.load(fp)
+        entry = self.cache_entry()
+        if entry is not None:
+            logging.info("load cache entry: %s" % entry.name)
+            return self.decode_cached(entry)
 
         return None
 
 
     def get_cache_ts(self):
-        fn_cache = self.cache_path()
-        if os.path.exists(fn_cache):
-            return os.path.getmtime(fn_cache)
+        entry = self.cache_entry()
+        if entry is not None:
+            return entry.ts
         return None
 
 
+    def data_hash(self):
+        # short hash of the cached data the screens are drawn from - computed once per cache renewal
+        entry = self.cache_entry()
+        if entry is None:
+            return None
+        cached = getattr(self, '_data_hash', None)
+        if cached is None or cached[0] != entry.ts:
+            cached = (entry.ts, hashlib.sha1(entry.data.encode('utf-8')).hexdigest()[:16])
+            self._data_hash = cached
+        return cached[1]
+
+
+    def cache_expired(self, entry = None):
+        ts_cache = entry.ts if entry is not None else self.get_cache_ts()
+        return ts_cache is None or (clock.time() - ts_cache) > 60 * self.ttl()
+
+
+    def conditional_headers(self):
+        # validators of the cached response so the server may answer with 304 Not Modified
+        headers = {}
+        entry = self.cache_entry()
+        if entry is not None:
+            if entry.etag:
+                headers["If-None-Match"] = entry.etag
+            if entry.last_modified:
+                headers["If-Modified-Since"] = entry.last_modified
+        return headers
+
+
     def acquire(self):
         pass
 
@@ -59,37 +100,61 @@ class Acquire(object):
         return result
 
 
+    def parse_response(self, response):
+        # returns acquired data and its serialized form to be cached
+        return response.json(), response.text
+
+
     def load_and_cache(self):
         acquired_data = None
-        acquired_response = self.acquire()
-        if acquired_response is not None:
-            if not self.error_found(acquired_response):
-                acquired_data = acquired_response.json()
+        with timed('fetch.' + self.cache_name()):
+            acquired_response = self.acquire()
+        if acquired_response is None:
+            self.last_error = "no response"
+            return None
+        # a streamed response holds its pooled connection until closed - whatever the status
+        try:
+            if acquired_response.status_code == 304:
+                logging.info("Cached %s not modified" % self.cache_name())
+                get_store().touch(self.cache_name())
+                acquired_data = self.load_cached()
+                self.last_error = None
+            elif self.error_found(acquired_response):
+                self.last_error = "HTTP %d" % acquired_response.status_code
+            else:
+                try:
+                    acquired_data, text = self.parse_response(acquired_response)
+                except Exception:
+                    # i.e. a body cut short - not to be reported as the previous error
+                    self.last_error = "invalid response"
+                    raise
                 # write just acquired data to cache
-                fn_cache = self.cache_path()
-                with open(fn_cache,'wb') as fp:
-                    fp.write( acquired_response.text.encode('utf-8'))
+                get_store().put(
+                    self.cache_name(),
+                    text,
+                    etag=acquired_response.headers.get('ETag'),
+                    last_modified=acquired_response.headers.get('Last-Modified')
+                )
+                self.last_error = None
+        finally:
+            acquired_response.close()
         return acquired_data
 
 
     def load(self):
-        # start from cached data 
-        acquired_data = self.load_cached()
+        # start from cached data
+        entry = self.cache_entry()
 
         # no data has been cached yet
-        if acquired_data is None:
+        if entry is None:
             logging.info("No cache found - acquiring data...")
             acquired_data = self.load_and_cache()
+        # refresh every TTL in minutes
+        elif self.cache_expired(entry):
+            logging.info("Cache too old, renewing...")
+            acquired_data = self.load_and_cache()
         else:
-            # get last modified time for cache...
-            ts_cache = self.get_cache_ts()
-
-            # refresh every TTL in minutes
-            if ts_cache is not None:
-                now = time.time()
-                if (now - ts_cache) > 60 * self.ttl():
-                    logging.info("Cache too old, renewing...")
-                    acquired_data = self.load_and_cache()
+            acquired_data = self.decode_cached(entry)
 
         return acquired_data
 
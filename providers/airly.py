@@ -2,9 +2,9 @@
 # Modifications: https://github.com/pskowronek/epaper-clock-and-more, Apache 2 license
 
 from acquire import Acquire
+import transport
 
 import logging
-import requests
 from collections import namedtuple
 
 
@@ -17,11 +17,15 @@ class Airly(Acquire):
     DEFAULT = AirlyTuple(pm25=-1, pm10=-1, pressure=-1, hummidity=-1, temperature=None, aqi=-1, level='n/a', advice='n/a')
 
 
-    def __init__(self, key, lat, lon, cache_ttl):
+    BASE_URL = "https://airapi.airly.eu"
+
+
+    def __init__(self, key, lat, lon, cache_ttl, base_url = None):
         self.key = key
         self.lat = lat
         self.lon = lon
         self.cache_ttl = cache_ttl
+        self.base_url = (base_url or self.BASE_URL).rstrip('/')
 
 
     def cache_name(self):
@@ -36,8 +40,9 @@ class Airly(Acquire):
         logging.info("Getting a Airly.eu status from the internet...")
 
         try:
-            r = requests.get(
-                "https://airapi.airly.eu/v2/measurements/point?indexType=AIRLY_CAQI&lat={}&lng={}".format(
+            r = transport.get(
+                "{}/v2/measurements/point?indexType=AIRLY_CAQI&lat={}&lng={}".format(
+                    self.base_url,
                     self.lat,
                     self.lon
                 ),
@@ -0,0 +1,81 @@
+# https://github.com/pskowronek/epaper-clock-and-more, Apache 2 license
+
+import logging
+import os
+import sqlite3
+import threading
+from collections import namedtuple
+
+import clock
+
+
+CacheEntry = namedtuple('CacheEntry', ['name', 'ts', 'etag', 'last_modified', 'data'])
+
+
+class CacheStore(object):
+    """All providers' cached responses in one SQLite file - each write is a single atomic transaction."""
+
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        # WAL keeps the previous entry intact if the power goes down in the middle of a write
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS entries ("
+            " name TEXT PRIMARY KEY,"
+            " ts REAL NOT NULL,"
+            " etag TEXT,"
+            " last_modified TEXT,"
+            " data TEXT NOT NULL)"
+        )
+
+
+    def get(self, name):
+        with self._lock:
+            row = self._db.execute(
+                "SELECT name, ts, etag, last_modified, data FROM entries WHERE name = ?", (name,)
+            ).fetchone()
+        return CacheEntry(*row) if row is not None else None
+
+
+    def put(self, name, data, etag = None, last_modified = None, ts = None):
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO entries (name, ts, etag, last_modified, data) VALUES (?, ?, ?, ?, ?)",
+                (name, ts if ts is not None else clock.time(), etag, last_modified, data)
+            )
+
+
+    def touch(self, name, ts = None):
+        with self._lock:
+            self._db.execute("UPDATE entries SET ts = ? WHERE name = ?", (ts if ts is not None else clock.time(), name))
+
+
+    def names(self):
+        with self._lock:
+            return [row[0] for row in self._db.execute("SELECT name FROM entries ORDER BY name")]
+
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_store():
+    global _store
+    with _store_lock:
+        if _store is None:
+            path = os.path.expanduser(os.environ.get("EPAPER_CACHE_DB", "~/.epaper-display/cache.db"))
+            directory = os.path.dirname(path)
+            if directory and not os.path.exists(directory):
+                os.makedirs(directory)
+            logging.info("Opening cache store: %s" % path)
+            _store = CacheStore(path)
+        return _store
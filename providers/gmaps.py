@@ -2,9 +2,9 @@
 # Modifications: https://github.com/pskowronek/epaper-clock-and-more, Apache 2 license
 
 from .acquire import Acquire
+from . import transport
 
 import logging
-import requests
 from collections import namedtuple
 
 
@@ -17,7 +17,10 @@ class GMaps(Acquire):
     DEFAULT = GMapsTuple(time_to_dest=-1, time_to_dest_in_traffic=-1, distance=-1, origin_address='n/a', destination_address='n/a')    
 
 
-    def __init__(self, key, home_lat, home_lon, dest_lat, dest_lon, units, name, cache_ttl):
+    BASE_URL = "https://maps.googleapis.com"
+
+
+    def __init__(self, key, home_lat, home_lon, dest_lat, dest_lon, units, name, cache_ttl, base_url = None):
         self.key = key
         self.home_lat = home_lat
         self.home_lon = home_lon
@@ -26,6 +29,7 @@ class GMaps(Acquire):
         self.units = units
         self.name = name
         self.cache_ttl = cache_ttl
+        self.base_url = (base_url or self.BASE_URL).rstrip('/')
 
 
     def cache_name(self):
@@ -57,8 +61,9 @@ class GMaps(Acquire):
         logging.info("Getting time to get to dest: {} from the internet...".format(self.name))
 
         try:
-            r = requests.get(
-                "https://maps.googleapis.com/maps/api/distancematrix/json?units={}&departure_time=now&origins={},{}&destinations={},{}&key={}".format(
+            r = transport.get(
+                "{}/maps/api/distancematrix/json?units={}&departure_time=now&origins={},{}&destinations={},{}&key={}".format(
+                    self.base_url,
                     self.units,
                     self.home_lat,
                     self.home_lon,
@@ -0,0 +1,209 @@
+# https://github.com/pskowronek/epaper-clock-and-more, Apache 2 license
+
+import logging
+import os
+import struct
+import threading
+import time
+from array import array
+from collections import namedtuple
+
+import clock
+
+
+Stats = namedtuple('Stats', ['min', 'max', 'mean', 'count', 'first', 'last'])
+
+# readings of each provider tuple that are worth keeping a history of
+METRICS = {
+    'luftdaten': ['pm25', 'pm10', 'humidity', 'pressure', 'temperature'],
+    'weather': ['temp', 'apparent_temp', 'wind_speed', 'wind_gust'],
+}
+# readings that can't go below zero - a negative one is the provider's "not measured" (i.e. a sensor without a pressure gauge)
+NON_NEGATIVE = set(['pm25', 'pm10', 'humidity', 'pressure', 'wind_speed', 'wind_gust'])
+
+MAGIC = b'EPH1'
+HEADER = struct.Struct('<4sI')       # magic, number of metrics
+METRIC_HEADER = struct.Struct('<HII')  # name length, capacity, count
+
+
+def to_bytes(arr):
+    return arr.tobytes() if hasattr(arr, 'tobytes') else arr.tostring()
+
+
+class RingBuffer(object):
+    """Fixed size (timestamp, value) series, oldest entries are overwritten."""
+
+
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.ts = array('d', [0.0]) * capacity
+        self.values = array('d', [0.0]) * capacity
+        self.start = 0
+        self.count = 0
+
+
+    def _at(self, i):
+        return (self.start + i) % self.capacity
+
+
+    def last_ts(self):
+        return self.ts[self._at(self.count - 1)] if self.count else None
+
+
+    def append(self, ts, value):
+        # readings are appended in time order, the same reading is never stored twice
+        if self.count and ts <= self.last_ts():
+            return False
+        if self.count < self.capacity:
+            idx = self._at(self.count)
+            self.count += 1
+        else:
+            idx = self.start
+            self.start = self._at(1)
+        self.ts[idx] = ts
+        self.values[idx] = value
+        return True
+
+
+    def _bisect(self, ts):
+        # first logical index with timestamp >= ts
+        lo, hi = 0, self.count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self.ts[self._at(mid)] < ts:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+
+    def stats(self, since, until = None):
+        lo = self._bisect(since)
+        hi = self.count if until is None else self._bisect(until)
+        if lo >= hi:
+            return None
+        lowest = highest = first = self.values[self._at(lo)]
+        total = 0.0
+        for i in range(lo, hi):
+            value = self.values[self._at(i)]
+            total += value
+            if value < lowest:
+                lowest = value
+            elif value > highest:
+                highest = value
+        return Stats(min=lowest, max=highest, mean=total / (hi - lo), count=hi - lo, first=first, last=value)
+
+
+    def ordered(self):
+        ts = array('d', (self.ts[self._at(i)] for i in range(self.count)))
+        values = array('d', (self.values[self._at(i)] for i in range(self.count)))
+        return ts, values
+
+
+class History(object):
+    """Ring buffer per metric, persisted as a compact binary file."""
+
+
+    def __init__(self, path, capacity, save_interval = 3600):
+        self.path = os.path.expanduser(path)
+        self.capacity = capacity
+        # seconds between writes of the file - readings come every few minutes, the SD card shouldn't get each of them
+        self.save_interval = save_interval
+        self.buffers = {}
+        self._lock = threading.Lock()
+        self._dirty = False
+        self._saved_at = 0
+        self.load()
+
+
+    def buffer(self, metric):
+        buf = self.buffers.get(metric)
+        if buf is None:
+            buf = self.buffers[metric] = RingBuffer(self.capacity)
+        return buf
+
+
+    def record(self, source, reading, ts, default = None):
+        """Appends the reading of a provider tuple (luftdaten, weather) taken at ts (provider's cache timestamp).
+
+        default - the provider's DEFAULT tuple it returns when it has no data, such a reading is skipped."""
+        if reading is None or reading is default or ts is None:
+            return
+        with self._lock:
+            for field in METRICS[source]:
+                value = getattr(reading, field, None)
+                if value is None or (field in NON_NEGATIVE and value < 0):
+                    continue
+                if self.buffer("{}.{}".format(source, field)).append(ts, float(value)):
+                    self._dirty = True
+        if self._dirty and time.time() - self._saved_at >= self.save_interval:
+            self.save()
+
+
+    def flush(self):
+        # readings not saved yet - on shutdown
+        if self._dirty:
+            self.save()
+
+
+    def stats(self, metric, seconds, now = None):
+        """min/max/mean of the given metric (e.g. 'luftdaten.pressure') over the last seconds."""
+        with self._lock:
+            buf = self.buffers.get(metric)
+            if buf is None:
+                return None
+            return buf.stats((now if now is not None else clock.time()) - seconds)
+
+
+    def trend(self, metric, seconds, now = None):
+        stats = self.stats(metric, seconds, now)
+        if stats is None or stats.count < 2:
+            return None
+        return stats.last - stats.first
+
+
+    def save(self):
+        with self._lock:
+            directory = os.path.dirname(self.path)
+            if directory and not os.path.exists(directory):
+                os.makedirs(directory)
+            tmp_path = self.path + ".tmp"
+            try:
+                with open(tmp_path, 'wb') as fp:
+                    fp.write(HEADER.pack(MAGIC, len(self.buffers)))
+                    for metric in sorted(self.buffers):
+                        ts, values = self.buffers[metric].ordered()
+                        name = metric.encode('utf-8')
+                        fp.write(METRIC_HEADER.pack(len(name), self.capacity, len(ts)))
+                        fp.write(name)
+                        fp.write(to_bytes(ts))
+                        fp.write(to_bytes(values))
+                os.rename(tmp_path, self.path)
+                self._dirty = False
+                self._saved_at = time.time()
+            except Exception as e:
+                logging.exception(e)
+
+
+    def load(self):
+        if not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, 'rb') as fp:
+                magic, metrics = HEADER.unpack(fp.read(HEADER.size))
+                if magic != MAGIC:
+                    logging.warn("Unknown history file format: %s" % self.path)
+                    return
+                for _ in range(metrics):
+                    name_len, _capacity, count = METRIC_HEADER.unpack(fp.read(METRIC_HEADER.size))
+                    name = fp.read(name_len).decode('utf-8')
+                    ts = array('d')
+                    ts.fromfile(fp, count)
+                    values = array('d')
+                    values.fromfile(fp, count)
+                    buf = self.buffer(name)
+                    # the newest readings survive if the capacity has been lowered
+                    for i in range(max(0, count - self.capacity), count):
+                        buf.append(ts[i], values[i])
+        except Exception as e:
+            logging.warn("Unable to load history file %s: %s" % (self.path, e))
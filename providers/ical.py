@@ -1,29 +1,102 @@
-from datetime import datetime
-from dateutil.relativedelta import relativedelta
-from icalevents.icalevents import events
+# https://github.com/pskowronek/epaper-clock-and-more, Apache 2 license
+
+from .acquire import Acquire
+from . import transport
+
+import json
+import logging
 from collections import namedtuple
+from datetime import timedelta
+from dateutil import tz
+from dateutil.parser import parse
+
+import clock
 
 
-EventData = namedtuple('EventData', ['start', 'summary'])
+EventData = namedtuple('EventData', ['start', 'summary', 'end'])
 
 
-def get_event(event):
-    return EventData(summary=event.summary, start=event.start)
+class ICal(Acquire):
 
 
-class ICal:
-    def __init__(self, url):
-        self.url = url
+    def __init__(self, url, cache_ttl, window_days = 31):
+        self.url = url.replace('webcal://', 'https://', 1) if url else url
+        self.cache_ttl = cache_ttl
+        self.window_days = window_days
+        self.calendar = None  # the ICS parser is needed only when the cache gets renewed
         self.events = None
+        self.events_ts = None
+
+
+    def cache_name(self):
+        return "ical.json"
+
+
+    def ttl(self):
+        return self.cache_ttl
+
+
+    def window(self):
+        window_start = clock.now(tz.tzlocal()).replace(hour=0, minute=0, second=0, microsecond=0)
+        return window_start, window_start + timedelta(days=self.window_days)
+
+
+    def acquire(self):
+        logging.info("Getting calendar events from the internet...")
+
+        try:
+            r = transport.get(self.url, stream=True, timeout=30)
+            return r
+        except Exception as e:
+            logging.exception(e)
+
+        return None
+
+
+    def parse_response(self, response):
+        if self.calendar is None:
+            from .ics import IcsCalendar
+            self.calendar = IcsCalendar()
+        try:
+            if 'charset' not in response.headers.get('content-type', ''):
+                response.encoding = 'utf-8'
+            window_start, window_end = self.window()
+            # the feed is parsed while being downloaded, only events within the window are kept
+            store = self.calendar.parse(response.iter_lines(decode_unicode=True), window_start, window_end)
+        finally:
+            response.close()
+
+        # already expanded events are cached as compact [start, summary, end] rows - no ICS parsing on restart
+        acquired_data = [[e.start.isoformat(), e.summary, e.end.isoformat()] for e in store.between(window_start, window_end)]
+        return acquired_data, json.dumps(acquired_data, separators=(',', ':'))
+
+
+    def to_event(self, row):
+        start = parse(row[0])
+        # caches written before the end was kept hold [start, summary] pairs
+        end = parse(row[2]) if len(row) > 2 else start
+        return EventData(start=start, summary=row[1], end=end)
 
 
     def get(self):
-        if self.events is None or self.should_update():
-            end = datetime.today() + relativedelta(months=1)
-            self.events = [get_event(e) for e in events(self.url, end=end)]
-            self.events.sort()
-        return self.events
+        if not self.url:
+            return []
+
+        try:
+            events_data = self.load()
+            if events_data is None:
+                return []
+
+            # convert the cached rows only when the cache has been renewed
+            ts_cache = self.get_cache_ts()
+            if self.events is None or ts_cache != self.events_ts:
+                self.events = [self.to_event(row) for row in events_data]
+                self.events_ts = ts_cache
 
+            # events over before today are not displayed, the ones still in progress are (all-day events last till midnight)
+            today = clock.now(tz.tzlocal()).replace(hour=0, minute=0, second=0, microsecond=0)
+            return [e for e in self.events if e.start >= today or e.end > today]
 
-    def should_update(self):
-        return True
+        except Exception as e:
+            logging.exception(e)
+            return []
@@ -0,0 +1,254 @@
+# https://github.com/pskowronek/epaper-clock-and-more, Apache 2 license
+
+# A small streaming iCalendar (RFC 5545) parser that keeps only the events that may
+# fall inside the display window - memory & CPU scale with the window, not with the calendar
+
+import bisect
+import logging
+from collections import namedtuple
+from datetime import datetime, timedelta
+from dateutil import tz
+from dateutil.rrule import rrulestr
+
+from .ical import EventData
+
+
+# parsed VEVENT - only the properties needed to place it in the window
+Component = namedtuple('Component', ['uid', 'summary', 'start', 'end', 'rrule', 'exdates', 'recurrence_id'])
+
+
+def unfold(lines):
+    """Joins folded content lines (continuation lines start with a space or a tab)."""
+    current = None
+    for line in lines:
+        if not line:
+            continue
+        if line[0] in (' ', '\t'):
+            if current is not None:
+                current += line[1:].rstrip('\r\n')
+            continue
+        if current is not None:
+            yield current
+        current = line.rstrip('\r\n')
+    if current is not None:
+        yield current
+
+
+def parse_property(line):
+    """Splits a content line into (NAME, {PARAM: value}, value)."""
+    quoted = False
+    for i, c in enumerate(line):
+        if c == '"':
+            quoted = not quoted
+        elif c == ':' and not quoted:
+            break
+    else:
+        return line.upper(), {}, ''
+
+    head, value = line[:i], line[i + 1:]
+    parts = head.split(';')
+    params = {}
+    for part in parts[1:]:
+        if '=' in part:
+            key, val = part.split('=', 1)
+            params[key.upper()] = val.strip('"')
+    return parts[0].upper(), params, value
+
+
+def unescape(text):
+    return text.replace('\\N', ' ').replace('\\n', ' ').replace('\\,', ',').replace('\\;', ';').replace('\\\\', '\\')
+
+
+def parse_datetime(value, params):
+    """Parses DATE / DATE-TIME values into timezone aware datetimes (all-day & floating ones are local)."""
+    value = value.strip()
+    if params.get('VALUE') == 'DATE' or len(value) == 8:
+        day = datetime.strptime(value[:8], '%Y%m%d')
+        return day.replace(tzinfo=tz.tzlocal())
+
+    dt = datetime.strptime(value[:15], '%Y%m%dT%H%M%S')
+    if value.endswith('Z'):
+        zone = tz.tzutc()
+    else:
+        zone = tz.gettz(params['TZID']) if 'TZID' in params else None
+        if zone is None:
+            zone = tz.tzlocal()  # floating time or unknown TZID
+    return dt.replace(tzinfo=zone)
+
+
+def parse_duration(value):
+    """Parses the subset of RFC 5545 durations used by calendars (e.g. PT1H30M, P1D, P2W)."""
+    sign = -1 if value.startswith('-') else 1
+    value = value.lstrip('+-').lstrip('P')
+    seconds = 0
+    number = ''
+    in_time = False
+    for c in value:
+        if c.isdigit():
+            number += c
+            continue
+        if c == 'T':
+            in_time = True
+            continue
+        n = int(number or 0)
+        number = ''
+        if c == 'W':
+            seconds += n * 7 * 86400
+        elif c == 'D':
+            seconds += n * 86400
+        elif c == 'H':
+            seconds += n * 3600
+        elif c == 'M' and in_time:
+            seconds += n * 60
+        elif c == 'S':
+            seconds += n
+    return timedelta(seconds=sign * seconds)
+
+
+class EventStore(object):
+    """Events kept sorted by start time."""
+
+
+    def __init__(self):
+        self.events = []
+
+
+    def add(self, event):
+        bisect.insort(self.events, event)
+
+
+    def between(self, start, end):
+        # events starting before the window are in only while still in progress
+        hi = bisect.bisect_left(self.events, EventData(start=end, summary='', end=end))
+        lo = bisect.bisect_left(self.events, EventData(start=start, summary='', end=start))
+        return [e for e in self.events[:lo] if e.end > start] + self.events[lo:hi]
+
+
+    def __len__(self):
+        return len(self.events)
+
+
+class IcsCalendar(object):
+
+
+    def __init__(self):
+        # (series key, window) -> expanded start times, kept between refreshes of the same feed
+        self.expansions = {}
+
+
+    def components(self, lines):
+        """Yields VEVENTs while streaming the feed; nested components (VALARM etc.) are skipped."""
+        props = None
+        depth = 0
+        for line in unfold(lines):
+            name, params, value = parse_property(line)
+            if name == 'BEGIN':
+                value = value.upper()
+                if props is None and value == 'VEVENT':
+                    props = {}
+                    depth = 0
+                elif props is not None:
+                    depth += 1
+                continue
+            if name == 'END':
+                if props is not None:
+                    if depth > 0:
+                        depth -= 1
+                    elif value.upper() == 'VEVENT':
+                        component = self.to_component(props)
+                        if component is not None:
+                            yield component
+                        props = None
+                continue
+            if props is None or depth > 0:
+                continue
+            if name == 'EXDATE':
+                props.setdefault(name, []).extend((v, params) for v in value.split(','))
+            elif name in ('UID', 'SUMMARY', 'DTSTART', 'DTEND', 'DURATION', 'RRULE', 'RECURRENCE-ID', 'STATUS'):
+                props[name] = (value, params)
+
+
+    def to_component(self, props):
+        try:
+            if 'DTSTART' not in props or props.get('STATUS', ('', {}))[0].upper() == 'CANCELLED':
+                return None
+            start = parse_datetime(*props['DTSTART'])
+            if 'DTEND' in props:
+                end = parse_datetime(*props['DTEND'])
+            elif 'DURATION' in props:
+                end = start + parse_duration(props['DURATION'][0])
+            else:
+                end = start
+            return Component(
+                uid=props.get('UID', ('', {}))[0],
+                summary=unescape(props.get('SUMMARY', ('', {}))[0]),
+                start=start,
+                end=end,
+                rrule=props['RRULE'][0] if 'RRULE' in props else None,
+                exdates=tuple(sorted(parse_datetime(v, p) for v, p in props.get('EXDATE', []))),
+                recurrence_id=parse_datetime(*props['RECURRENCE-ID']) if 'RECURRENCE-ID' in props else None
+            )
+        except Exception as e:
+            logging.warn("Skipping unparsable calendar event: {}".format(e))
+            return None
+
+
+    def expand(self, series, window_start, window_end):
+        duration = series.end - series.start
+        key = (series.uid, series.start, series.rrule, series.exdates, window_start, window_end)
+        starts = self.expansions.get(key)
+        if starts is None:
+            # include occurrences that started before the window but are still in progress
+            lookup_start = window_start - duration
+            try:
+                rule = rrulestr(series.rrule, dtstart=series.start)
+                starts = rule.between(lookup_start, window_end, inc=True)
+            except ValueError:
+                # floating UNTIL with an aware DTSTART - expand on the local wall clock
+                zone = series.start.tzinfo
+                rule = rrulestr(series.rrule, dtstart=series.start.replace(tzinfo=None), ignoretz=True)
+                starts = [s.replace(tzinfo=zone) for s in rule.between(
+                    lookup_start.astimezone(zone).replace(tzinfo=None),
+                    window_end.astimezone(zone).replace(tzinfo=None),
+                    inc=True
+                )]
+            excluded = set(series.exdates)
+            starts = [s for s in starts if s not in excluded]
+            self.expansions[key] = starts
+        return starts, key
+
+
+    def parse(self, lines, window_start, window_end):
+        """Builds the index of events overlapping [window_start, window_end) out of streamed lines."""
+        local = tz.tzlocal()
+        store = EventStore()
+        series = []
+        overrides = {}
+        for component in self.components(lines):
+            if component.rrule is not None and component.recurrence_id is None:
+                if component.start < window_end:
+                    series.append(component)
+                continue
+            if component.recurrence_id is not None:
+                # a moved / modified occurrence replaces the generated one
+                overrides[(component.uid, component.recurrence_id)] = component
+            if component.end >= window_start and component.start < window_end:
+                store.add(EventData(start=component.start.astimezone(local), summary=component.summary, end=component.end.astimezone(local)))
+
+        used = set()
+        for component in series:
+            duration = component.end - component.start
+            starts, key = self.expand(component, window_start, window_end)
+            used.add(key)
+            for start in starts:
+                if (component.uid, start) in overrides:
+                    continue
+                store.add(EventData(start=start.astimezone(local), summary=component.summary, end=(start + duration).astimezone(local)))
+
+        # forget expansions of series that are no longer in the feed or in the window
+        for key in list(self.expansions):
+            if key not in used:
+                del self.expansions[key]
+
+        logging.info("Calendar parsed: {} events in window, {} recurring series".format(len(store), len(series)))
+        return store
@@ -2,32 +2,34 @@
 # Modifications: https://github.com/pskowronek/epaper-clock-and-more, Apache 2 license
 
 from .acquire import Acquire
+from . import transport
 
 import logging
-import requests
+import threading
+import time
 from collections import namedtuple, defaultdict
 
+import clock
+
 
 LuftdatenData = namedtuple('LuftdatenData', ['pm25', 'pm10', 'humidity', 'pressure', 'temperature', 'aqi', 'level', 'advice'])
 
 
-class Luftdaten(Acquire):
+class LuftdatenSensor(Acquire):
 
 
-    DEFAULT = LuftdatenData(pm25=-1, pm10=-1, pressure=-1, humidity=-1, temperature=None, aqi=-1, level='n/a', advice='n/a')
+    BASE_URL = "http://api.luftdaten.info"
 
 
-    def __init__(self, lat, lon, cache_ttl):
-        self.lat = lat
-        self.lon = lon
+    def __init__(self, sensor, cache_ttl, fetch_timeout, base_url = None):
+        self.sensor = sensor
         self.cache_ttl = cache_ttl
-        self.sensor = '5708'
-        self.sensor2 = '5709'
-        self.r2 = None
+        self.fetch_timeout = fetch_timeout
+        self.base_url = (base_url or self.BASE_URL).rstrip('/')
 
 
     def cache_name(self):
-        return "luftdaten.json"
+        return "luftdaten-{}.json".format(self.sensor)
 
 
     def ttl(self):
@@ -35,22 +37,18 @@ class Luftdaten(Acquire):
 
 
     def acquire(self):
-        logging.info("Getting a Luftdaten.info status from the internet...")
+        logging.info("Getting a Luftdaten.info sensor {} status from the internet...".format(self.sensor))
 
         try:
-            self.r2 = requests.get(
-                    "http://api.luftdaten.info/v1/sensor/{0}/".format(self.sensor2),
-                    headers = {
-                        "Accept-Language" : "en",
-                        "Accept" : "application/json"
-                        }
-            )
-            r = requests.get(
-                    "http://api.luftdaten.info/v1/sensor/{0}/".format(self.sensor),
-                    headers = {
-                        "Accept-Language" : "en",
-                        "Accept" : "application/json"
-                        }
+            headers = {
+                "Accept-Language" : "en",
+                "Accept" : "application/json"
+            }
+            headers.update(self.conditional_headers())
+            r = transport.get(
+                "{0}/v1/sensor/{1}/".format(self.base_url, self.sensor),
+                headers = headers,
+                timeout = self.fetch_timeout
             )
             return r
         except Exception as e:
@@ -58,30 +56,116 @@ class Luftdaten(Acquire):
 
         return None
 
-    def update_data(self, data, result):
+
+class Luftdaten(object):
+
+
+    DEFAULT = LuftdatenData(pm25=-1, pm10=-1, pressure=-1, humidity=-1, temperature=None, aqi=-1, level='n/a', advice='n/a')
+
+
+    def __init__(self, lat, lon, cache_ttl, sensors, fetch_timeout = 10, base_url = None):
+        self.lat = lat
+        self.lon = lon
+        self.cache_ttl = cache_ttl
+        self.fetch_timeout = fetch_timeout
+        self.sensors = [LuftdatenSensor(s, cache_ttl, fetch_timeout, base_url) for s in sensors]
+        self._fetching = {}  # sensor id -> thread still renewing its cache
+        self._fetched = {}   # sensor id -> data acquired by the last finished fetch
+
+
+    def fetch(self, sensor):
+        try:
+            self._fetched[sensor.sensor] = sensor.load_and_cache()
+        except Exception as e:
+            logging.exception(e)
+
+
+    def load_all(self):
+        # sensors with a fresh cache are served directly, the others are renewed concurrently
+        readings = {}
+        waiting = []
+        for sensor in self.sensors:
+            if not sensor.cache_expired():
+                readings[sensor.sensor] = sensor.load_cached()
+                continue
+
+            thread = self._fetching.get(sensor.sensor)
+            if thread is None or not thread.is_alive():
+                thread = threading.Thread(target=self.fetch, args=(sensor,), name="luftdaten-{}".format(sensor.sensor))
+                thread.daemon = True
+                self._fetching[sensor.sensor] = thread
+                thread.start()
+            waiting.append((sensor, thread))
+
+        # a slow sensor must not hold up the others - it gets its stale cache until it catches up
+        deadline = time.time() + self.fetch_timeout
+        for sensor, thread in waiting:
+            thread.join(max(0, deadline - time.time()))
+            data = None
+            if not thread.is_alive():
+                del self._fetching[sensor.sensor]
+                data = self._fetched.pop(sensor.sensor, None)
+            else:
+                logging.warn("Luftdaten sensor {} is too slow - using cached data".format(sensor.sensor))
+            readings[sensor.sensor] = data if data is not None else sensor.load_cached()
+
+        return readings
+
+
+    def get_cache_ts(self):
+        # timestamp of the newest sensor reading
+        timestamps = [ts for ts in (sensor.get_cache_ts() for sensor in self.sensors) if ts is not None]
+        return max(timestamps) if timestamps else None
+
+
+    def data_hash(self):
+        hashes = [sensor.data_hash() or '' for sensor in self.sensors]
+        return ",".join(hashes) if any(hashes) else None
+
+
+    @property
+    def last_error(self):
+        errors = ["sensor {}: {}".format(s.sensor, s.last_error) for s in self.sensors if s.last_error is not None]
+        return ", ".join(errors) if errors else None
+
+
+    def update_data(self, data, weight, sums, weights):
+        if not data:
+            return
         for row in data:
             for r in row['sensordatavalues']:
-                result[r['value_type']] += float(r['value']) / len(data)
-                
+                sums[r['value_type']] += weight * float(r['value']) / len(data)
+                weights[r['value_type']] += weight / len(data)
+
 
     def get(self):
         try:
-            data = self.load()
-            if data is None:
+            readings = self.load_all()
+
+            # weighted mean of each measured value, fresher sensors weigh more (1 when just fetched, 1/2 at TTL)
+            now = clock.time()
+            sums = defaultdict(float)
+            weights = defaultdict(float)
+            for sensor in self.sensors:
+                data = readings.get(sensor.sensor)
+                ts_cache = sensor.get_cache_ts()
+                if data is None or ts_cache is None:
+                    continue
+                age = max(0, now - ts_cache)
+                weight = 1.0 / (1.0 + age / (60.0 * max(1, self.cache_ttl)))
+                self.update_data(data, weight, sums, weights)
+
+            if not weights:
                 return self.DEFAULT
 
-            d = defaultdict(float)
-            self.update_data(data, d)
-            if self.r2 != None:
-                self.update_data(self.r2.json(), d)
-
+            d = dict((k, sums[k] / weights[k]) for k in sums)
 
             return LuftdatenData(
                 pm25=d.get('P2', -1),
                 pm10=d.get('P1', -1),
                 pressure=d.get('pressure', -1),
                 humidity=d.get('humidity', -1),
-                temperature=d.get('temperature', -1),
+                temperature=d.get('temperature'),  # None as in DEFAULT - -1 is a real temperature
                 aqi=-1,
                 level=-1,
                 advice=-1,
@@ -91,4 +175,3 @@ class Luftdaten(Acquire):
             logging.exception(e)
             return self.DEFAULT
 
-
@@ -2,9 +2,6 @@
 
 from .acquire import Acquire
 
-import psutil
-from uptime import uptime
-
 import logging
 from collections import namedtuple
 
@@ -32,6 +29,10 @@ class SystemInfo(Acquire):
 
     def get(self):
         try:
+            # imported on the first use only - system details are displayed on demand
+            import psutil
+            from uptime import uptime
+
             return SystemTuple(
                 uptime="{:0.0f} days".format(uptime() / (3600 * 24)),
                 cpu_usage="{} %".format(psutil.cpu_percent()),
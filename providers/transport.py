@@ -0,0 +1,187 @@
+# https://github.com/pskowronek/epaper-clock-and-more, Apache 2 license
+
+import base64
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+
+try:
+    from urllib.parse import urlencode, urlsplit
+except ImportError:  # python 2
+    from urllib import urlencode
+    from urlparse import urlsplit
+
+
+# live - just ask upstream servers, record - ask them and save the exchanges as fixtures, replay - serve the fixtures back
+MODE = os.environ.get("EPAPER_HTTP_MODE", "live")
+FIXTURES_DIR = os.path.expanduser(os.environ.get("EPAPER_HTTP_FIXTURES", "fixtures"))
+# replayed responses take the recorded time multiplied by that, 0 - no delay at all
+REPLAY_LATENCY = float(os.environ.get("EPAPER_HTTP_REPLAY_LATENCY", "1.0"))
+
+CONDITIONAL_HEADERS = ('If-None-Match', 'If-Modified-Since')
+# response headers never written to the fixtures - cookies & credentials
+PRIVATE_HEADERS = ('set-cookie', 'set-cookie2', 'authorization', 'proxy-authorization', 'www-authenticate', 'proxy-authenticate')
+
+_lock = threading.Lock()
+_replayed = {}  # fixture key -> how many of its exchanges have been replayed so far
+_recorded = {}  # fixture key -> how many exchanges its fixture file holds (once written by this process)
+
+# fixtures are JSON with an exchange per line - a new one overwrites just this closing of the list
+FIXTURE_END = "\n]}\n"
+
+
+class Headers(dict):
+    """Response headers looked up case-insensitively - like the requests' ones."""
+
+
+    def __init__(self, headers):
+        super(Headers, self).__init__((k.lower(), v) for k, v in headers.items())
+
+
+    def get(self, key, default = None):
+        return super(Headers, self).get(key.lower(), default)
+
+
+    def __getitem__(self, key):
+        return super(Headers, self).__getitem__(key.lower())
+
+
+    def __contains__(self, key):
+        return super(Headers, self).__contains__(key.lower())
+
+
+class RecordedResponse(object):
+    """Just enough of requests.Response for the providers - status, headers, text, json() and iter_lines()."""
+
+
+    def __init__(self, status_code, headers, content, elapsed):
+        self.status_code = status_code
+        self.headers = Headers(headers)
+        self.content = content
+        self.elapsed = elapsed
+        self.encoding = 'utf-8'
+
+
+    @property
+    def text(self):
+        return self.content.decode(self.encoding or 'utf-8', 'replace')
+
+
+    def json(self):
+        return json.loads(self.text)
+
+
+    def iter_lines(self, decode_unicode = False):
+        for line in self.content.splitlines():
+            yield line.decode(self.encoding or 'utf-8', 'replace') if decode_unicode else line
+
+
+    def close(self):
+        pass
+
+
+def request_key(url, params):
+    full_url = url + ('?' + urlencode(sorted(params.items())) if params else '')
+    # API keys are part of some URLs - only the host & a hash of the URL make it to the fixtures
+    return "{}-{}".format(urlsplit(url).hostname, hashlib.sha1(full_url.encode('utf-8')).hexdigest()[:16])
+
+
+def fixture_path(key):
+    return os.path.join(FIXTURES_DIR, key + ".json")
+
+
+def load_fixture(key):
+    path = fixture_path(key)
+    if not os.path.exists(path):
+        return []
+    with open(path) as fp:
+        return json.load(fp)['exchanges']
+
+
+def write_fixture(key, host, exchanges):
+    tmp_path = fixture_path(key) + ".tmp"
+    with open(tmp_path, 'w') as fp:
+        fp.write('{{"url": {}, "exchanges": ['.format(json.dumps(host)))
+        fp.write(",".join("\n" + json.dumps(exchange, sort_keys=True) for exchange in exchanges))
+        fp.write(FIXTURE_END)
+    os.rename(tmp_path, fixture_path(key))
+
+
+def append_fixture(key, exchange):
+    with open(fixture_path(key), 'r+b') as fp:
+        fp.seek(-len(FIXTURE_END), os.SEEK_END)
+        fp.write((",\n" + json.dumps(exchange, sort_keys=True) + FIXTURE_END).encode('utf-8'))
+
+
+def record(key, url, response, content, elapsed):
+    try:
+        body = {'body': content.decode('utf-8')}
+    except UnicodeDecodeError:
+        body = {'body_b64': base64.b64encode(content).decode('ascii')}
+    headers = dict((k, v) for k, v in response.headers.items() if k.lower() not in PRIVATE_HEADERS)
+    exchange = dict(body, status=response.status_code, headers=headers, elapsed=elapsed)
+    with _lock:
+        if not os.path.exists(FIXTURES_DIR):
+            os.makedirs(FIXTURES_DIR)
+        count = _recorded.get(key)
+        if count is None:
+            # the first exchange of a key rewrites its fixture (of an earlier session) once, later ones are appended
+            exchanges = load_fixture(key) + [exchange]
+            # just the host - paths & query strings may hold API keys or the home location
+            write_fixture(key, urlsplit(url).hostname, exchanges)
+            count = len(exchanges)
+        else:
+            append_fixture(key, exchange)
+            count += 1
+        _recorded[key] = count
+    logging.info("Recorded {} exchange #{} ({:.2f}s)".format(key, count, elapsed))
+
+
+def replay(key, headers):
+    with _lock:
+        exchanges = load_fixture(key)
+        if not exchanges:
+            raise LookupError("No recorded exchange for {} in {}".format(key, FIXTURES_DIR))
+        # exchanges are served in the recorded order, the last one over and over again once these run out
+        i = _replayed.get(key, 0)
+        _replayed[key] = i + 1
+    exchange = exchanges[min(i, len(exchanges) - 1)]
+
+    if REPLAY_LATENCY > 0:
+        time.sleep(exchange['elapsed'] * REPLAY_LATENCY)
+
+    recorded_headers = Headers(exchange['headers'])
+    headers = headers or {}
+    # fixtures are recorded unconditionally - validators of the cached copy get 304 just like from a live server
+    if (headers.get('If-None-Match') and headers.get('If-None-Match') == recorded_headers.get('ETag')) or \
+            (headers.get('If-Modified-Since') and headers.get('If-Modified-Since') == recorded_headers.get('Last-Modified')):
+        return RecordedResponse(304, exchange['headers'], b'', exchange['elapsed'])
+
+    if 'body_b64' in exchange:
+        content = base64.b64decode(exchange['body_b64'])
+    else:
+        content = exchange['body'].encode('utf-8')
+    return RecordedResponse(exchange['status'], exchange['headers'], content, exchange['elapsed'])
+
+
+def get(url, params = None, headers = None, **kwargs):
+    """requests.get() of the providers - goes to the network, records or replays depending on EPAPER_HTTP_MODE."""
+    key = request_key(url, params)
+    if MODE == 'replay':
+        return replay(key, headers)
+
+    import requests  # imported on the first fetch only - it takes a while on a Pi Zero
+
+    if MODE != 'record':
+        return requests.get(url, params=params, headers=headers, **kwargs)
+
+    headers = dict((k, v) for k, v in (headers or {}).items() if k not in CONDITIONAL_HEADERS)
+    started = time.time()
+    response = requests.get(url, params=params, headers=headers, **kwargs)
+    content = response.content  # reads a streamed body as well
+    elapsed = time.time() - started
+    record(key, url, response, content, elapsed)
+    return RecordedResponse(response.status_code, dict(response.headers), content, elapsed)
@@ -2,9 +2,9 @@
 # Modifications: https://github.com/pskowronek/epaper-clock-and-more, Apache 2 license
 
 from .acquire import Acquire
+from . import transport
 
 import logging
-import requests
 import bisect
 from collections import namedtuple
 
@@ -41,12 +41,16 @@ class Weather(Acquire):
                            wind_speed=-1, wind_gust=-1, apparent_temp=-1, beaufort=-1, forecast=[])
 
 
-    def __init__(self, key, lat, lon, units, cache_ttl):
+    BASE_URL = "https://api.darksky.net"
+
+
+    def __init__(self, key, lat, lon, units, cache_ttl, base_url = None):
         self.key = key
         self.lat = lat
         self.lon = lon
         self.units = units
         self.cache_ttl = cache_ttl
+        self.base_url = (base_url or self.BASE_URL).rstrip('/')
 
 
     def cache_name(self):
@@ -61,15 +65,18 @@ class Weather(Acquire):
         logging.info("Getting a fresh forecast from the internet...")
 
         try:
-            r = requests.get(
-                "https://api.darksky.net/forecast/{}/{},{}".format(
+            r = transport.get(
+                "{}/forecast/{}/{},{}".format(
+                    self.base_url,
                     self.key,
                     self.lat,
                     self.lon
                 ),
                 params = {
                     "units" : self.units,
-                }
+                },
+                headers = self.conditional_headers(),
+                timeout = 30
             )
             return r
 
@@ -0,0 +1,76 @@
+# https://github.com/pskowronek/epaper-clock-and-more, Apache 2 license
+
+import re
+from datetime import datetime, timedelta
+
+
+WINDOW_RE = re.compile(r'^\s*(\d{1,2}):(\d{2})\s*-\s*(\d{1,2}):(\d{2})\s*$')
+# legacy DEAD_TIMES syntax, i.e. "[range(1,5),range(10,15)]" - parsed, never evaluated
+RANGE_RE = re.compile(r'range\(\s*(\d{1,2})\s*,\s*(\d{1,2})\s*\)')
+
+
+def window(start, end, text):
+    """A (start, end) window in minutes of a day - rejected when it's empty or spans the whole day."""
+    if start == end:
+        # i.e. 22:00-22:00, 00:00-24:00 or range(0,24) - the panel would never be refreshed
+        raise ValueError("Quiet hours window must not be empty nor last the whole day: " + text)
+    return start, end
+
+
+def parse_quiet_hours(spec):
+    """Parses "23:00-06:30,13:00-14:00" into a list of (start, end) minutes of a day - end may be lower (past midnight)."""
+    windows = []
+    for part in spec.split(','):
+        if not part.strip():
+            continue
+        match = WINDOW_RE.match(part)
+        if match is None:
+            raise ValueError("Incorrect quiet hours window (expected HH:MM-HH:MM): " + part.strip())
+        start_h, start_m, end_h, end_m = [int(g) for g in match.groups()]
+        if start_h > 23 or end_h > 24 or start_m > 59 or end_m > 59 or (end_h == 24 and end_m != 0):
+            raise ValueError("Incorrect quiet hours window: " + part.strip())
+        windows.append(window(start_h * 60 + start_m, (end_h * 60 + end_m) % (24 * 60), part.strip()))
+    return windows
+
+
+def parse_dead_times(spec):
+    """Converts legacy DEAD_TIMES hour ranges into quiet hours windows."""
+    windows = []
+    for match in RANGE_RE.finditer(spec):
+        # hours past 23 were never matched by the legacy range - range(22,30) is 22:00-24:00
+        start_h, end_h = [min(int(g), 24) for g in match.groups()]
+        if start_h < end_h:
+            windows.append(window(start_h * 60, (end_h * 60) % (24 * 60), match.group(0)))
+    if not windows and spec.strip() not in ('', '[]'):
+        raise ValueError("Incorrect DEAD_TIMES (expected i.e. [range(1,5),range(10,15)]): " + spec)
+    return windows
+
+
+class QuietHours(object):
+    """Windows of a day when nothing is fetched nor displayed - the panel sleeps and wakes up at the end."""
+
+
+    def __init__(self, windows):
+        self.windows = windows
+
+
+    def end_of(self, dt):
+        """The end (datetime) of the quiet window the given local time falls into, None if it isn't quiet then."""
+        minute = dt.hour * 60 + dt.minute
+        midnight = datetime.combine(dt.date(), datetime.min.time())
+        if dt.tzinfo is not None:
+            midnight = midnight.replace(tzinfo=dt.tzinfo)
+        for start, end in self.windows:
+            if start < end and start <= minute < end:
+                return midnight + timedelta(minutes=end)
+            if start > end and minute >= start:
+                return midnight + timedelta(days=1, minutes=end)
+            if start > end and minute < end:
+                return midnight + timedelta(minutes=end)
+        return None
+
+
+    def __bool__(self):
+        return bool(self.windows)
+
+    __nonzero__ = __bool__
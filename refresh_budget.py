@@ -0,0 +1,45 @@
+# https://github.com/pskowronek/epaper-clock-and-more, Apache 2 license
+
+from collections import deque
+
+import clock
+
+
+class RefreshBudget(object):
+    """How many refreshes of a kind the panel may do within a sliding hour - 0 means no limit."""
+
+
+    def __init__(self, kind, per_hour):
+        self.kind = kind
+        self.per_hour = per_hour
+        self._spent = deque()
+
+
+    def expire(self, now):
+        while self._spent and self._spent[0] <= now - 3600:
+            self._spent.popleft()
+
+
+    def used(self, now = None):
+        now = clock.time() if now is None else now
+        self.expire(now)
+        return len(self._spent)
+
+
+    def available(self, reserve = 0, now = None):
+        """Whether a refresh fits into the budget leaving the given number of refreshes for more important screens."""
+        if self.per_hour <= 0:
+            return True
+        return self.used(now) + reserve < self.per_hour
+
+
+    def spend(self, now = None):
+        self._spent.append(clock.time() if now is None else now)
+
+
+    def next_available(self, now = None):
+        """When a refresh fits into the budget again - now if it does already."""
+        now = clock.time() if now is None else now
+        if self.available(now=now):
+            return now
+        return self._spent[len(self._spent) - self.per_hour] + 3600
@@ -0,0 +1,123 @@
+# https://github.com/pskowronek/epaper-clock-and-more, Apache 2 license
+
+import logging
+import os
+import time
+
+from epaper import EPaper, Frame, ewma
+from render_server import FRAME_PATH, BLACK_LENGTH_HEADER, TIME_HEADER, Profile, profile_params
+from timing import timed
+import clock
+
+
+class RenderServerClient(object):
+    """Gets packed frames of a panel profile from the render server - watched by the health monitor like data providers."""
+
+
+    # description of the last failed request, None once a request succeeded
+    last_error = None
+
+
+    def __init__(self, url, profile, timeout):
+        self.url = url.rstrip('/') + FRAME_PATH
+        self.params = profile_params(profile)
+        self.timeout = timeout
+        self._session = None
+        self._answered_ts = None
+
+
+    def get_cache_ts(self):
+        # when the server last answered - the frames are as fresh as its data
+        return self._answered_ts
+
+
+    def data_hash(self):
+        # the data frames are drawn from stays on the render server
+        return None
+
+
+    def fetch(self, screen, at, displayed_hash):
+        """(black, red, time_str) of a screen, (None, None, time_str) if the panel shows it already, None on failure."""
+        if self._session is None:
+            import requests  # imported on the first fetch only - it takes a while on a Pi Zero
+            self._session = requests.Session()  # keeps the connection open between ticks
+
+        params = dict(self.params, screen=screen, at=str(int(at)))
+        headers = {'If-None-Match': '"{}"'.format(displayed_hash)} if displayed_hash else {}
+        try:
+            with timed('render_client.fetch'):
+                response = self._session.get(self.url, params=params, headers=headers, timeout=self.timeout)
+                content = response.content
+        except Exception as e:
+            logging.warn("Render server unreachable: {}".format(e))
+            self.last_error = "no response"
+            return None
+
+        if response.status_code not in (200, 304):
+            logging.warn("Render server returned unexpected status code: %d" % response.status_code)
+            self.last_error = "HTTP %d" % response.status_code
+            return None
+        self._answered_ts = clock.time()
+        self.last_error = None
+        time_str = response.headers.get(TIME_HEADER)
+        if response.status_code == 304:
+            return None, None, time_str
+        black_length = int(response.headers[BLACK_LENGTH_HEADER])
+        # bytearrays - the drivers send lists of ints, slices of py2 strings would be lists of chars
+        return bytearray(content[:black_length]), bytearray(content[black_length:]), time_str
+
+
+class RemoteEPaper(EPaper):
+    """Shows frames rendered by the render server - nothing is fetched nor drawn here, planes go straight to the panel."""
+
+
+    RENDER_SERVER = os.environ.get("EPAPER_RENDER_SERVER")
+    RENDER_TIMEOUT = int(os.environ.get("EPAPER_RENDER_TIMEOUT", "10"))
+
+
+    def __init__(self, debug_mode = False):
+        if debug_mode:
+            raise Exception("Debug mode saves drawn images - the render server sends packed planes only, use EPAPER_SIMULATOR instead")
+        super(RemoteEPaper, self).__init__(debug_mode)
+
+
+    def build_providers(self):
+        profile = Profile(self.DEVICE_TYPE, self.MONO_DISPLAY, self.CLOCK_HOURS_MINS_SEPARATOR, self.PREFER_AIRLY_LOCAL_TEMP)
+        self.remote = RenderServerClient(self.RENDER_SERVER, profile, self.RENDER_TIMEOUT)
+        self.airly = self.weather = self.system_info = self.history = self.events = None
+
+
+    def providers(self):
+        return [('render_server', self.remote)]
+
+
+    def fetch_frame(self, screen, name, at):
+        fetched = self.remote.fetch(screen, at, self._displayed_hash)
+        if fetched is None:
+            return None
+        black, red, time_str = fetched
+        if black is None:
+            # the panel shows that very frame already
+            if time_str is not None:
+                self._str_time = time_str
+            return None
+        return Frame(black=black, red=None if self.MONO_DISPLAY else red, name=name, time_str=time_str, images=())
+
+
+    def prepare_main_screen(self, dt, force = False):
+        if not force and not self.main_screen_due(dt):
+            return None
+
+        started = time.time()
+        frame = self.fetch_frame('main', dt, time.mktime(dt.timetuple()))
+
+        self.last_render_time = time.time() - started
+        self.render_latency = ewma(self.render_latency, self.last_render_time)
+        return frame
+
+
+    def display_screen(self, screen, cancelled = None):
+        frame = self.fetch_frame(screen, screen, clock.time())
+        if frame is None or (cancelled is not None and cancelled()):
+            return False
+        return self.display(frame, cancelled)
@@ -0,0 +1,221 @@
+# https://github.com/pskowronek/epaper-clock-and-more, Apache 2 license
+
+"""Renders frames for a fleet of thin clients (see EPAPER_RENDER_SERVER in run-EDIT-ME.sh). Data is fetched and screens are
+drawn once for all the clients of a panel profile, clients get packed planes in their driver's byte layout:
+    python render_server.py --bind 0.0.0.0 --port 8091
+
+GET /frame?type=waveshare-2.7&mono=false&separator=true&local_temp=false&screen=main&at=<epoch seconds> answers with
+the black plane followed by the red one (none for mono panels), the ETag is the hash of the planes - a client sending
+the hash of what its panel shows in If-None-Match gets 304 Not Modified.
+"""
+
+import argparse
+import json
+import logging
+import threading
+from collections import defaultdict, namedtuple, OrderedDict
+from datetime import datetime
+
+try:
+    from http.server import BaseHTTPRequestHandler
+    from urllib.parse import urlsplit, parse_qs
+except ImportError:  # python 2
+    from BaseHTTPServer import BaseHTTPRequestHandler
+    from urlparse import urlsplit, parse_qs
+
+from dateutil import tz
+
+from status_server import ThreadingHTTPServer
+from display_state import pack_plane, frame_hash
+from epaper import EPaper, PANEL_TYPES
+from panels import PanelConfig
+from timing import timings, timed
+import clock
+
+
+FRAME_PATH = '/frame'
+# the body holds the black plane of that many bytes, the red one follows
+BLACK_LENGTH_HEADER = 'X-Black-Length'
+# time (HHMM) the main screen shows
+TIME_HEADER = 'X-Frame-Time'
+# frames of different profiles, screens & minutes kept - the least recently requested ones are dropped first
+CACHED_FRAMES = 64
+
+# what makes frames of two panels differ - the rest of the settings (units, coordinates...) are the server's ones
+Profile = namedtuple('Profile', ['device_type', 'mono', 'clock_separator', 'prefer_airly_local_temp'])
+
+RenderedFrame = namedtuple('RenderedFrame', ['black', 'red', 'frame_hash', 'time_str'])
+
+
+def profile_params(profile):
+    return {
+        'type': profile.device_type,
+        'mono': 'true' if profile.mono else 'false',
+        'separator': 'true' if profile.clock_separator else 'false',
+        'local_temp': 'true' if profile.prefer_airly_local_temp else 'false',
+    }
+
+
+def parse_profile(query):
+    def flag(name):
+        value = query.get(name, [''])[0]
+        if value not in ('true', 'false'):
+            raise ValueError("Incorrect {} (expected true or false): {}".format(name, value))
+        return value == 'true'
+
+    return Profile(query.get('type', [''])[0], flag('mono'), flag('separator'), flag('local_temp'))
+
+
+class RenderServer(object):
+    """Renders & packs screens of any panel profile clients ask for - on their own threads, one render at a time."""
+
+
+    def __init__(self, bind, port):
+        self.bind = bind
+        self.port = port
+        # drawing reuses canvases, providers & caches are shared by the profiles - renders take turns
+        self._lock = threading.Lock()
+        self._profiles = {}  # Profile -> headless EPaper
+        self._frames = OrderedDict()  # (profile, screen, minute) -> RenderedFrame
+        self._counters = defaultdict(int)
+
+
+    def start(self):
+        handler = type('BoundRenderRequestHandler', (RenderRequestHandler, object), {'render_server': self})
+        httpd = ThreadingHTTPServer((self.bind, self.port), handler)
+        logging.info("Render server listening on http://{}:{}/".format(self.bind, self.port))
+        return httpd
+
+
+    def epaper(self, profile):
+        epaper = self._profiles.get(profile)
+        if epaper is None:
+            if profile.device_type not in PANEL_TYPES:
+                raise ValueError("Unknown panel type: " + profile.device_type)
+            name = "{}-{}".format(profile.device_type, len(self._profiles))
+            panel = PanelConfig(name, profile.device_type, None, None, None, None, None, None,
+                                profile.mono, None, profile.clock_separator, profile.prefer_airly_local_temp)
+            # the first profile's providers, fonts & icons are shared with the later ones
+            shared = next(iter(self._profiles.values()), None)
+            epaper = self._profiles[profile] = EPaper.for_panel(panel, HEADLESS=True)(shared=shared)
+            logging.info("Rendering for a new profile: {}".format(profile))
+        return epaper
+
+
+    def frame(self, profile, screen, at):
+        try:
+            dt = datetime.fromtimestamp(at, tz.tzlocal())
+        except (OverflowError, OSError):
+            raise ValueError("Time out of range: {}".format(at))
+        key = (profile, screen, dt.strftime("%Y%m%d%H%M"))
+        with self._lock:
+            frame = self._frames.pop(key, None)
+            if frame is None:
+                if screen not in EPaper.SCREENS:
+                    raise ValueError("Unknown screen: " + screen)
+                epaper = self.epaper(profile)
+                with timed('render_server.render'):
+                    if screen == 'main':
+                        packed = epaper.prepare_main_screen(dt, force=True)
+                    else:
+                        black_frame, red_frame = epaper.draw_screen(screen)
+                        packed = epaper.prepare_buffer(black_frame, red_frame, screen)
+                # packed into buffers the next render of the profile reuses - copied
+                planes = [pack_plane(packed.black), pack_plane(packed.red)]
+                frame = RenderedFrame(planes[0], planes[1], frame_hash(planes), packed.time_str)
+                while len(self._frames) >= CACHED_FRAMES:
+                    self._frames.popitem(last=False)
+            self._frames[key] = frame
+            return frame
+
+
+    def count(self, name):
+        with self._lock:
+            self._counters[name] += 1
+
+
+    def status(self):
+        with self._lock:
+            profiles = [p._asdict() for p in self._profiles]
+            cached = len(self._frames)
+            counters = dict(self._counters)
+        snapshot = timings.snapshot()
+        return {
+            'profiles': profiles,
+            'cached_frames': cached,
+            'answers': counters,
+            'renders': snapshot.get('render_server.render', {}).get('count', 0),
+            'timings': snapshot,
+        }
+
+
+class RenderRequestHandler(BaseHTTPRequestHandler):
+
+
+    render_server = None
+
+
+    def do_GET(self):
+        try:
+            url = urlsplit(self.path)
+            if url.path == '/status.json':
+                self.reply(200, 'application/json', json.dumps(self.render_server.status(), indent=2, sort_keys=True).encode('utf-8'))
+                return
+            if url.path != FRAME_PATH:
+                self.reply(404, 'text/plain', b'Not found\n')
+                return
+
+            query = parse_qs(url.query)
+            try:
+                profile = parse_profile(query)
+                at = float(query['at'][0]) if 'at' in query else clock.time()
+                frame = self.render_server.frame(profile, query.get('screen', ['main'])[0], at)
+            except (ValueError, KeyError) as e:
+                self.reply(400, 'text/plain', "{}\n".format(e).encode('utf-8'))
+                return
+
+            headers = {'ETag': '"{}"'.format(frame.frame_hash), BLACK_LENGTH_HEADER: str(len(frame.black))}
+            if frame.time_str is not None:
+                headers[TIME_HEADER] = frame.time_str
+            if self.headers.get('If-None-Match') == headers['ETag']:
+                self.render_server.count('not_modified')
+                self.reply(304, 'application/octet-stream', b'', headers)
+            else:
+                self.render_server.count('frames')
+                self.reply(200, 'application/octet-stream', frame.black + frame.red, headers)
+        except Exception as e:
+            logging.exception(e)
+            self.reply(500, 'text/plain', b'Internal error\n')
+
+
+    def reply(self, code, content_type, body, headers = None):
+        self.send_response(code)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+
+    def log_message(self, format, *args):
+        logging.debug("Render server: " + format % args)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Renders frames for thin clients (EPAPER_RENDER_SERVER)")
+    parser.add_argument('--bind', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8091)
+    args = parser.parse_args()
+
+    httpd = RenderServer(args.bind, args.port).start()
+    try:
+        httpd.serve_forever()
+    except KeyboardInterrupt:
+        httpd.server_close()
+    return 0
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO, format='%(message)s')
+    raise SystemExit(main())
@@ -21,6 +21,62 @@ exit 1
 # Enable this feature on your own responsibility!
 #export EPAPER_FAST_REFRESH=true
 
+# Every how many minutes the main screen is refreshed - the refresh is timed to complete right at the minute (for 1) or at :00, :05, :10... (for 5)
+#export EPAPER_REFRESH_MINUTES=1
+
+# Seconds after which the main loop busy with one thing is considered stuck - the systemd watchdog is no longer pinged then
+#export EPAPER_STALL_TIMEOUT=180
+
+# Timings of each refresh stage (data fetch, drawing, packing, SPI transfer, panel refresh) exported after every refresh
+# as JSON lines and/or as a Prometheus node_exporter textfile collector file
+#export EPAPER_METRICS_JSONL=~/.epaper-display/metrics.jsonl
+#export EPAPER_METRICS_PROM=/var/lib/node_exporter/textfile_collector/epaper.prom
+# Each JSON line holds what changed since the previous export (new observations of a stage, a gauge's new value).
+# Over this size (kB) the file is moved to <file>.1 - replacing the older one
+#export EPAPER_METRICS_JSONL_MAX_KB=1024
+
+# Local HTTP status page with the currently displayed frame (PNG), data age, timings & counters (disabled by default)
+# - bind to 0.0.0.0 to reach it from your network: http://raspberry-address:8080/
+# - with EPAPER_PANELS each panel's frame is at /frame/<panel name>/black.png & red.png (no red.png for mono panels)
+#export EPAPER_HTTP_PORT=8080
+#export EPAPER_HTTP_BIND=127.0.0.1
+
+# Refresh budgets per hour - over the full one 2.7" falls back to fast LUT, otherwise refreshes are deferred (0 - no limit)
+#export EPAPER_FULL_REFRESH_BUDGET=20
+#export EPAPER_FAST_REFRESH_BUDGET=60
+# How many refreshes of the budget are left for the main screen - details screens are dropped below that
+#export EPAPER_REFRESH_BUDGET_RESERVE=2
+
+# Simulated panel instead of the real one - PNG snapshots (with modelled fast LUT ghosting) & animation.gif go to EPAPER_SIMULATOR_OUT
+# EPAPER_SIMULATOR_SPEED=1 makes refreshes take as long as on the real panel (0 - no waiting)
+#export EPAPER_SIMULATOR=false
+#export EPAPER_SIMULATOR_OUT=sim
+#export EPAPER_SIMULATOR_SPEED=0
+
+# Provider HTTP traffic: live (default), record - save exchanges with their timing as fixtures, replay - serve fixtures back offline
+# EPAPER_HTTP_REPLAY_LATENCY scales the recorded response times (1 - as recorded, 0 - instant)
+#export EPAPER_HTTP_MODE=live
+#export EPAPER_HTTP_FIXTURES=fixtures
+#export EPAPER_HTTP_REPLAY_LATENCY=1.0
+# Base URLs of the upstream servers - i.e. to point the providers at the local stand-ins with injectable faults:
+# python standin_server.py --port 8090 (--benchmark reports frame latency & deadline misses under each fault profile)
+#export DARKSKY_URL=http://127.0.0.1:8090
+#export LUFTDATEN_URL=http://127.0.0.1:8090
+#export EVENTS_ICAL_URL=http://127.0.0.1:8090/calendar.ics
+
+# Soak test - runs the given number of days on a simulated clock (minutes of real time) and reports renders/s, cache behaviour,
+# memory growth & leaked PIL images. Best combined with EPAPER_SIMULATOR=true, EPAPER_SIMULATOR_OUT= and EPAPER_HTTP_MODE=replay
+# Cache, history & display state of a soak run are kept in a temporary directory - the real ones are left alone
+#export EPAPER_SOAK_DAYS=7
+
+# Trace Python heap use per refresh (peak & steady state logged and exported as metrics) - slows the app down
+#export EPAPER_TRACEMALLOC=false
+
+# What the panel shows is persisted on every refresh so a restarted app doesn't refresh an unchanged screen
+#export EPAPER_STATE_FILE=~/.epaper-display/display.state
+# Set to false to not display the shutdown icon when the app is stopped - a restart then resumes without a refresh
+#export EPAPER_SHUTDOWN_ICON=true
+
 # Lat & lon of your home (a base point)
 export LAT=50.0720519
 export LON=20.0373204
@@ -36,6 +92,25 @@ export AIRLY_KEY=GET_YOUR_OWN_KEY           # get the key from: https://develope
 export GOOGLE_MAPS_TTL=10
 export DARKSKY_TTL=15
 export AIRLY_TTL=20
+export EVENTS_TTL=30
+# All fetched data are cached in a single SQLite file (default: ~/.epaper-display/cache.db)
+#export EPAPER_CACHE_DB=~/.epaper-display/cache.db
+
+# Luftdaten.info sensors (comma separated ids) to average AQI data from - each one is fetched in parallel and cached separately
+export LUFTDATEN_SENSORS=5708,5709
+# Seconds to wait for the sensors - a slower sensor is served from its cache until it catches up
+#export LUFTDATEN_FETCH_TIMEOUT=10
+
+# URL of iCal calendar to display the upcoming events from
+#export EVENTS_ICAL_URL=https://calendar.google.com/calendar/ical/.../basic.ics
+# How many days ahead to look for events - only events within this window are kept while parsing the calendar
+#export EVENTS_WINDOW_DAYS=31
+
+# History of AQI & weather readings used to display trends - a ring buffer of that many readings per metric
+#export HISTORY_FILE=~/.epaper-display/history.bin
+#export HISTORY_CAPACITY=1008
+# Minutes between writes of the history file - readings since the last write are saved on shutdown too
+#export HISTORY_SAVE_MINUTES=60
 
 # Units
 export GOOGLE_MAPS_UNITS=metric             # refer to: https://developers.google.com/maps/documentation/distance-matrix/intro#unit_systems for allowed values (metric, imperial)
@@ -57,9 +132,9 @@ export SECOND_TIME_TO_DESTINATION_LON=20.4303646
 # The displayed gauge will become red (on supported displays) when driving time exceeds by % 
 export SECOND_TIME_WARN_ABOVE_PERCENT=50
 
-# Dead times - between stated hours data & display update is being done once in an hour and minutes won't be displayed. Default is [] - no dead times.
-# This env var will be evaluated by python - so becareful, first: don't expose this env to outside world (security), second: follow the syntax otherwise program will die
-#export DEAD_TIMES="[range(1,5),range(10,15)]"
+# Quiet hours - within these windows no data is fetched, the panel is put to deep sleep and it's refreshed once the window ends. Default is none.
+# Comma separated HH:MM-HH:MM windows, may span midnight. The legacy DEAD_TIMES="[range(1,5),range(10,15)]" is still understood (never evaluated).
+#export QUIET_HOURS="23:00-06:30,13:00-14:00"
 
 # Whether to draw two vertical dots to separate hours and minutes (to avoid confusion that a year is being displayed... yes, I know people who first thought that was a year displayed)
 export CLOCK_HRS_MINS_SEPARATOR=true
@@ -72,6 +147,25 @@ export CLOCK_HRS_MINS_SEPARATOR=true
 export EPAPER_TYPE=waveshare-2.7
 # You can override the setting as whether the display is mono or not - though, it will require update (replacement) of relevant epdXinX.py library to support mono or tri-color
 #export EPAPER_MONO=true
+# Several panels driven by one process (sharing fetched data, fonts & icons) instead of the one of EPAPER_TYPE - name:type[:options] separated by ;
+# Options: rst, dc, cs, busy - BCM pins, spi - bus.device (CE0 - 0.0, CE1 - 0.1), mono, fast, separator, local_temp - true/false (the settings above by default)
+# cs being the CE pin of the SPI device (8 for 0.0, 7 for 0.1) is left to the SPI controller, any other pin is selected by the app around each transfer
+# Details screens of buttons are shown on the first panel, EPAPER_STATE_FILE & EPAPER_SIMULATOR_OUT get the panel name appended
+#export EPAPER_PANELS="kitchen:waveshare-2.7;hallway:waveshare-4.2:rst=5,dc=6,cs=7,busy=12,spi=0.1"
+# Thin client - frames are fetched from a render server (python render_server.py --bind 0.0.0.0) instead of being drawn here,
+# no data is acquired by the client. The panel settings above (type, mono, separator, local temp) pick the frames to get
+#export EPAPER_RENDER_SERVER=http://192.168.1.10:8091
+# Seconds to wait for the render server
+#export EPAPER_RENDER_TIMEOUT=10
+# Every displayed frame also sent to other processes - packed planes as the driver gets them with a header (type, size, hash).
+# file:<path> - the latest frame, fifo:<path> - a named pipe, unix:<path> - a socket any number of readers may connect to.
+# With EPAPER_PANELS the path gets the panel name appended. Try: python frame_sink.py unix:/run/epaper/frames.sock
+#export EPAPER_FRAME_SINK=unix:/run/epaper/frames.sock
+# History of displayed frames - a file per day of compressed deltas (~150kB), with hashes of the data each frame was drawn from.
+# Set to empty to disable. To see what was displayed at 14:05: python frame_log.py ~/.epaper-display/frames/frames-2026-10-19.log --at 14:05 --png /tmp/frame
+#export EPAPER_FRAME_LOG=~/.epaper-display/frames
+# How many days of frame logs to keep
+#export EPAPER_FRAME_LOG_DAYS=14
 # You can override whether to listen for button press (enabled by default)
 #export EPAPER_BUTTONS_ENABLED=true
 # You can override GPIO pins assigned to buttons (these values are set by default and reflect 2.7" HUT version)
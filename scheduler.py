@@ -0,0 +1,97 @@
+# https://github.com/pskowronek/epaper-clock-and-more, Apache 2 license
+
+import logging
+import threading
+from collections import deque, namedtuple
+
+import clock
+
+
+Event = namedtuple('Event', ['kind', 'action', 'key', 'posted_at', 'seq'])
+
+TIMER = 'timer'
+ACTION = 'action'
+SHUTDOWN = 'shutdown'
+
+LatencyStats = namedtuple('LatencyStats', ['count', 'last', 'mean', 'max'])
+
+
+class Scheduler(object):
+    """Lets the main loop sleep until a deadline, a posted action (e.g. button press) or a shutdown request."""
+
+
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._actions = deque()
+        self._input = None
+        self._input_seq = 0
+        self._shutting_down = False
+        self._latencies = {}
+
+
+    def post(self, action):
+        with self._cond:
+            self._actions.append(Event(ACTION, action, None, clock.time(), None))
+            self._cond.notify()
+
+
+    def post_input(self, key, action):
+        """Posts user's intent (a button press) - a newer one replaces the one not handled yet."""
+        with self._cond:
+            if self._input is not None:
+                logging.info("Button #{} supersedes pending #{}".format(key, self._input.key))
+            self._input_seq += 1
+            self._input = Event(ACTION, action, key, clock.time(), self._input_seq)
+            self._cond.notify()
+
+
+    def superseded(self, seq):
+        """Whether a newer input has been posted since the one with the given seq - its render may be cancelled."""
+        return self._input_seq != seq
+
+
+    def input_pending(self):
+        return self._input is not None
+
+
+    def shutdown(self):
+        with self._cond:
+            self._shutting_down = True
+            self._cond.notify()
+
+
+    def shutting_down(self):
+        return self._shutting_down
+
+
+    def wait(self, deadline):
+        """Blocks until deadline (clock.time() based) or until something has been posted."""
+        with self._cond:
+            while not self._shutting_down and self._input is None and not self._actions:
+                remaining = deadline - clock.time()
+                if remaining <= 0:
+                    return Event(TIMER, None, None, None, None)
+                clock.wait(self._cond, remaining)
+            if self._shutting_down:
+                return Event(SHUTDOWN, None, None, None, None)
+            if self._input is not None:
+                event, self._input = self._input, None
+                return event
+            return self._actions.popleft()
+
+
+    def record_latency(self, event):
+        """Records the time from posting the input till its screen has been displayed."""
+        latency = clock.time() - event.posted_at
+        stats = self._latencies.get(event.key)
+        if stats is None:
+            stats = LatencyStats(count=1, last=latency, mean=latency, max=latency)
+        else:
+            count = stats.count + 1
+            stats = LatencyStats(count=count, last=latency, mean=stats.mean + (latency - stats.mean) / count, max=max(stats.max, latency))
+        self._latencies[event.key] = stats
+        logging.info("Button #{} press-to-pixels: {:.1f}s (mean {:.1f}s, max {:.1f}s)".format(event.key, latency, stats.mean, stats.max))
+
+
+    def latencies(self):
+        return dict(self._latencies)
@@ -0,0 +1,117 @@
+# https://github.com/pskowronek/epaper-clock-and-more, Apache 2 license
+
+import atexit
+import gc
+import logging
+import os
+import resource
+import shutil
+import tempfile
+import time
+
+from PIL import Image
+
+import clock
+from timing import timings
+
+
+# provider.* timing stage -> prefix of its fetch.<cache name> stages
+FETCH_STAGES = {
+    'weather': 'fetch.darksky',
+    'luftdaten': 'fetch.luftdaten-',
+    'events': 'fetch.ical',
+}
+
+
+def rss_kb():
+    # current resident set size - ru_maxrss would only tell the peak
+    try:
+        with open('/proc/self/statm') as fp:
+            return int(fp.read().split()[1]) * resource.getpagesize() // 1024
+    except Exception:
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def live_images():
+    return sum(1 for o in gc.get_objects() if isinstance(o, Image.Image))
+
+
+class SoakMonitor(object):
+    """Runs the main loop on a simulated clock for the given number of days and reports how the app holds up."""
+
+
+    def __init__(self, days, button_every_minutes = 60, sample_every_minutes = 60):
+        self.started_wall = time.time()
+        self.clock = clock.SimulatedClock(time.time())
+        self.start = self.clock.now
+        self.end = self.start + days * 24 * 3600
+        self.button_every = button_every_minutes * 60
+        self.sample_every = sample_every_minutes * 60
+        self._next_button = self.start + self.button_every
+        self._next_sample = self.start
+        self._button = 0
+        self.samples = []  # (simulated ts, rss in kB, live PIL images)
+
+
+    def install(self):
+        # caches, history & display state stamped days ahead would spoil the real ones - the soak gets its own, deleted at exit
+        work_dir = tempfile.mkdtemp(prefix='epaper-soak-')
+        os.environ.update({
+            'EPAPER_CACHE_DB': os.path.join(work_dir, 'cache.db'),
+            'HISTORY_FILE': os.path.join(work_dir, 'history.bin'),
+            'EPAPER_STATE_FILE': os.path.join(work_dir, 'display.state'),
+        })
+        atexit.register(shutil.rmtree, work_dir, True)
+        clock.install(self.clock)
+        logging.warn("Soak mode - simulating {:.1f} days".format((self.end - self.start) / 86400.0))
+
+
+    def finished(self):
+        return self.clock.now >= self.end
+
+
+    def button_due(self):
+        """Which button to press now (1-4) - details screens get exercised too, None if none is due."""
+        if self.button_every <= 0 or self.clock.now < self._next_button:
+            return None
+        self._next_button += self.button_every
+        self._button = self._button % 4 + 1
+        return self._button
+
+
+    def sample(self):
+        if self.clock.now < self._next_sample:
+            return
+        self._next_sample += self.sample_every
+        gc.collect()
+        self.samples.append((self.clock.now, rss_kb(), live_images()))
+
+
+    def report(self):
+        self.sample()
+        snapshot = timings.snapshot()
+
+        def count(stage):
+            return snapshot.get(stage, {}).get('count', 0)
+
+        wall = time.time() - self.started_wall
+        simulated = self.clock.now - self.start
+        renders = count('draw.frame')
+        lines = [
+            "Soak: {:.1f} simulated days in {:.0f}s ({:.0f}x)".format(simulated / 86400.0, wall, simulated / max(wall, 0.001)),
+            "Renders: {} main screens, {:.1f}/s, {} refreshes".format(renders, renders / max(wall, 0.001), count('epd.display_frame')),
+        ]
+        for name, prefix in sorted(FETCH_STAGES.items()):
+            stage = 'provider.' + name
+            fetches = sum(v['count'] for k, v in snapshot.items() if k.startswith(prefix))
+            # fetches only happen once a cached copy is older than its TTL - or when the previous fetch failed
+            lines.append("Provider {}: {} reads, {} fetches ({:.2f} per read)".format(
+                name, count(stage), fetches, float(fetches) / count(stage) if count(stage) else 0))
+        if self.samples:
+            first, last = self.samples[0], self.samples[-1]
+            lines.append("Memory: {} kB -> {} kB (max {} kB, {:+.1f} kB/day)".format(
+                first[1], last[1], max(s[1] for s in self.samples),
+                (last[1] - first[1]) / max((last[0] - first[0]) / 86400.0, 1 / 24.0)))
+            lines.append("Live PIL images: {} -> {}{}".format(
+                first[2], last[2], " - leaking!" if last[2] > first[2] + 4 else ""))
+        return "\n".join(lines)
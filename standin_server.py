@@ -0,0 +1,368 @@
+# https://github.com/pskowronek/epaper-clock-and-more, Apache 2 license
+
+"""Local stand-ins for the upstream servers the providers talk to - DarkSky, Luftdaten, Airly, Google Distance Matrix
+and an ICS calendar - with injectable faults: latency, throttling, 4xx/5xx, truncated bodies and hangs.
+
+Point the providers at it with DARKSKY_URL, LUFTDATEN_URL & EVENTS_ICAL_URL (see run-EDIT-ME.sh), switch the fault
+profile on the fly with GET /_profile/<name>:
+    python standin_server.py --port 8090 --profile slow
+or measure how the frame latency holds up under each of the profiles:
+    python standin_server.py --benchmark --frames 3
+"""
+
+import argparse
+import hashlib
+import json
+import logging
+import os
+import shutil
+import tempfile
+import threading
+import time
+from collections import namedtuple
+from datetime import datetime, timedelta
+
+try:
+    from http.server import BaseHTTPRequestHandler
+    from urllib.parse import urlsplit
+except ImportError:  # python 2
+    from BaseHTTPServer import BaseHTTPRequestHandler
+    from urlparse import urlsplit
+
+from status_server import ThreadingHTTPServer
+
+
+# latency - seconds before answering, status - error status returned instead of data, truncated - only half of the body
+# is sent, hang - seconds the request is held without any answer, every - only every n-th request is affected
+Fault = namedtuple('Fault', ['latency', 'status', 'truncated', 'hang', 'every'])
+
+PROFILES = {
+    'ok': Fault(latency=0, status=None, truncated=False, hang=0, every=1),
+    'slow': Fault(latency=3, status=None, truncated=False, hang=0, every=1),
+    'throttled': Fault(latency=0, status=429, truncated=False, hang=0, every=1),
+    'errors': Fault(latency=0, status=503, truncated=False, hang=0, every=1),
+    'unauthorized': Fault(latency=0, status=401, truncated=False, hang=0, every=1),
+    'truncated': Fault(latency=0, status=None, truncated=True, hang=0, every=1),
+    'flaky': Fault(latency=0, status=503, truncated=False, hang=0, every=2),
+    'hang': Fault(latency=0, status=None, truncated=False, hang=45, every=1),  # longer than any provider's timeout
+}
+PROFILE_ORDER = ('ok', 'slow', 'throttled', 'errors', 'unauthorized', 'truncated', 'flaky', 'hang')
+
+
+def darksky(now):
+    icons = ('partly-cloudy-day', 'rain', 'clear-day', 'cloudy', 'snow', 'wind', 'fog', 'clear-day')
+    days = [{
+        'time': int(now) + i * 86400,
+        'summary': "Stand-in forecast for day {}.".format(i),
+        'icon': icon,
+        'temperatureMin': 4.0 + i,
+        'temperatureMax': 12.5 + i,
+        'windSpeed': 3.1 + i,
+        'windGust': 7.4 + i,
+    } for i, icon in enumerate(icons)]
+    return {
+        'currently': {
+            'time': int(now),
+            'summary': "Partly Cloudy",
+            'icon': 'partly-cloudy-day',
+            'temperature': 9.8,
+            'apparentTemperature': 7.9,
+            'windSpeed': 3.1,
+            'windGust': 7.4,
+            'nearestStormDistance': 42,
+        },
+        'daily': {'summary': "Light rain on Thursday, temperatures rising to 19C.", 'icon': 'rain', 'data': days},
+    }
+
+
+def luftdaten(sensor):
+    # a few of the latest readings of a sensor - SDS011 (P1, P2) and BME280 (temperature, humidity, pressure)
+    return [{
+        'id': int(sensor) * 10 + i,
+        'sensor': {'id': int(sensor)},
+        'sensordatavalues': [
+            {'value_type': 'P1', 'value': str(21.3 + i)},
+            {'value_type': 'P2', 'value': str(12.7 + i)},
+            {'value_type': 'temperature', 'value': str(9.1 + i * 0.1)},
+            {'value_type': 'humidity', 'value': str(71.0 - i)},
+            {'value_type': 'pressure', 'value': str(101320.0 + i * 10)},
+        ],
+    } for i in range(2)]
+
+
+def airly():
+    return {
+        'current': {
+            'values': [
+                {'name': 'PM1', 'value': 8.1},
+                {'name': 'PM25', 'value': 12.7},
+                {'name': 'PM10', 'value': 21.3},
+                {'name': 'PRESSURE', 'value': 1013.2},
+                {'name': 'HUMIDITY', 'value': 71.0},
+                {'name': 'TEMPERATURE', 'value': 9.1},
+            ],
+            'indexes': [{'name': 'AIRLY_CAQI', 'value': 31.5, 'level': 'LOW', 'advice': "Breathe deeply!"}],
+        },
+    }
+
+
+def gmaps():
+    return {
+        'status': 'OK',
+        'origin_addresses': ["Stand-in Street 1, Home"],
+        'destination_addresses': ["Stand-in Avenue 2, Work"],
+        'rows': [{'elements': [{
+            'status': 'OK',
+            'distance': {'text': "12.3 km", 'value': 12300},
+            'duration': {'text': "18 mins", 'value': 1080},
+            'duration_in_traffic': {'text': "24 mins", 'value': 1440},
+        }]}],
+    }
+
+
+def calendar(now):
+    today = datetime.fromtimestamp(now).replace(hour=0, minute=0, second=0, microsecond=0)
+    events = [
+        (today + timedelta(days=1, hours=10), "Dentist", None),
+        (today + timedelta(days=2, hours=18, minutes=30), "Football", "FREQ=WEEKLY;COUNT=8"),
+        (today + timedelta(days=5, hours=9), "Car service", None),
+    ]
+    lines = ["BEGIN:VCALENDAR", "VERSION:2.0", "PRODID:-//epaper-clock-and-more//stand-in//EN"]
+    for i, (start, summary, rrule) in enumerate(events):
+        lines += ["BEGIN:VEVENT", "UID:standin-{}@localhost".format(i), "DTSTART:" + start.strftime("%Y%m%dT%H%M%S"),
+                  "DTEND:" + (start + timedelta(hours=1)).strftime("%Y%m%dT%H%M%S"), "SUMMARY:" + summary]
+        if rrule:
+            lines.append("RRULE:" + rrule)
+        lines.append("END:VEVENT")
+    # an all-day event in the morning of tomorrow
+    lines += ["BEGIN:VEVENT", "UID:standin-allday@localhost", "DTSTART;VALUE=DATE:" + (today + timedelta(days=1)).strftime("%Y%m%d"),
+              "SUMMARY:Birthday", "END:VEVENT", "END:VCALENDAR"]
+    return "\r\n".join(lines) + "\r\n"
+
+
+def payload(path, now):
+    """Content type & body of an endpoint, None if the path isn't one of the stand-ins."""
+    parts = [p for p in path.split('/') if p]
+    if len(parts) == 3 and parts[0] == 'forecast':
+        return 'application/json', json.dumps(darksky(now))
+    if len(parts) == 3 and parts[:2] == ['v1', 'sensor'] and parts[2].isdigit():
+        return 'application/json', json.dumps(luftdaten(parts[2]))
+    if parts == ['v2', 'measurements', 'point']:
+        return 'application/json', json.dumps(airly())
+    if parts == ['maps', 'api', 'distancematrix', 'json']:
+        return 'application/json', json.dumps(gmaps())
+    if path.endswith('.ics'):
+        return 'text/calendar; charset=utf-8', calendar(now)
+    return None
+
+
+class StandinServer(object):
+    """Serves the stand-in endpoints on its own threads, faults of the current profile get injected into every answer."""
+
+
+    def __init__(self, bind, port, profile = 'ok', latency = 0):
+        self.bind = bind
+        self.port = port
+        self.latency = latency  # added to every answer - the network round trip
+        self.profile = profile
+        self.requests = 0
+        self._lock = threading.Lock()
+        self._httpd = None
+
+
+    def start(self):
+        handler = type('BoundStandinRequestHandler', (StandinRequestHandler, object), {'standin': self})
+        self._httpd = ThreadingHTTPServer((self.bind, self.port), handler)
+        self.port = self._httpd.server_address[1]  # port 0 - any free one
+        thread = threading.Thread(target=self._httpd.serve_forever, name="standin-server")
+        thread.daemon = True
+        thread.start()
+        logging.info("Stand-in server listening on {} with '{}' profile".format(self.url, self.profile))
+        return self
+
+
+    def stop(self):
+        if self._httpd is not None:
+            self._httpd.shutdown()
+            self._httpd.server_close()
+
+
+    @property
+    def url(self):
+        return "http://{}:{}".format(self.bind, self.port)
+
+
+    def set_profile(self, profile):
+        if profile not in PROFILES:
+            raise ValueError("Unknown fault profile: " + profile)
+        with self._lock:
+            self.profile = profile
+            self.requests = 0
+        logging.info("Stand-in server profile: " + profile)
+
+
+    def fault(self):
+        """The fault to inject into the next answer, None if it should be answered normally."""
+        with self._lock:
+            self.requests += 1
+            fault = PROFILES[self.profile]
+            return fault if self.requests % fault.every == 0 else None
+
+
+class StandinRequestHandler(BaseHTTPRequestHandler):
+
+
+    standin = None
+
+
+    def do_GET(self):
+        try:
+            path = urlsplit(self.path).path
+            if path.startswith('/_profile'):
+                profile = path[len('/_profile/'):]
+                if profile:
+                    self.standin.set_profile(profile)
+                self.reply(200, 'text/plain', (self.standin.profile + "\n").encode('utf-8'))
+                return
+
+            found = payload(path, time.time())
+            if found is None:
+                self.reply(404, 'text/plain', b'Not found\n')
+                return
+            content_type, body = found
+            body = body.encode('utf-8')
+
+            if self.standin.latency > 0:
+                time.sleep(self.standin.latency)
+            fault = self.standin.fault()
+            if fault is not None:
+                if fault.latency > 0:
+                    time.sleep(fault.latency)
+                if fault.hang > 0:
+                    # no answer at all - the client is supposed to give up on its timeout first
+                    time.sleep(fault.hang)
+                    self.close_connection = True
+                    return
+                if fault.status is not None:
+                    self.reply(fault.status, 'text/plain', "Stand-in fault {}\n".format(fault.status).encode('utf-8'),
+                               {'Retry-After': '60'} if fault.status in (429, 503) else {})
+                    return
+                if fault.truncated:
+                    # Content-Length of the whole body but only a half of it sent before the connection is dropped
+                    self.reply(200, content_type, body, send=len(body) // 2)
+                    self.close_connection = True
+                    return
+
+            etag = '"{}"'.format(hashlib.sha1(body).hexdigest()[:16])
+            if self.headers.get('If-None-Match') == etag:
+                self.reply(304, content_type, b'', {'ETag': etag})
+            else:
+                self.reply(200, content_type, body, {'ETag': etag})
+        except Exception as e:
+            logging.exception(e)
+            self.reply(500, 'text/plain', b'Internal error\n')
+
+
+    def reply(self, code, content_type, body, headers = None, send = None):
+        self.send_response(code)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body if send is None else body[:send])
+
+
+    def log_message(self, format, *args):
+        logging.debug("Stand-in server: " + format % args)
+
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(p / 100.0 * (len(values) - 1))))] if values else 0
+
+
+def benchmark(server, profiles, frames, deadline):
+    """Renders main screens against the stand-ins under each fault profile - reports frame latency & deadline misses."""
+    work_dir = tempfile.mkdtemp(prefix='epaper-standin-')
+    try:
+        # every frame fetches everything again (TTL 0) from the stand-ins, the frames go to the simulated panel
+        os.environ.update({
+            'DARKSKY_URL': server.url,
+            'LUFTDATEN_URL': server.url,
+            'EVENTS_ICAL_URL': server.url + '/calendar.ics',
+            'DARKSKY_TTL': '0',
+            'AIRLY_TTL': '0',
+            'EVENTS_TTL': '0',
+            'EPAPER_HTTP_MODE': 'live',
+            'EPAPER_CACHE_DB': os.path.join(work_dir, 'cache.db'),
+            'HISTORY_FILE': os.path.join(work_dir, 'history.bin'),
+            'EPAPER_STATE_FILE': os.path.join(work_dir, 'display.state'),
+            'EPAPER_SIMULATOR': 'true',
+            'EPAPER_SIMULATOR_OUT': '',
+        })
+        os.environ.setdefault('DARKSKY_KEY', 'standin')
+        os.environ.setdefault('LAT', '50.0')
+        os.environ.setdefault('LON', '19.9')
+        from epaper import EPaper
+        from main import RENDER_MARGIN
+        import clock
+
+        epaper = EPaper()
+        providers = epaper.providers()
+
+        def frame():
+            started = time.time()
+            prepared = epaper.prepare_main_screen(clock.now(), force=True)
+            epaper.display(prepared)
+            return time.time() - started
+
+        # the main loop starts rendering as late as the latency learned on healthy upstreams (+ margin) allows
+        server.set_profile('ok')
+        warm = [frame() for _ in range(3)]
+        if deadline is None:
+            deadline = max(warm) + RENDER_MARGIN
+        lines = ["Deadline: {:.2f}s from starting a render till the panel has refreshed".format(deadline),
+                 "{:<13} {:>7} {:>7} {:>7} {:>7}  {}".format('profile', 'p50', 'p95', 'max', 'missed', 'provider errors')]
+        for profile in profiles:
+            server.set_profile(profile)
+            latencies = [frame() for _ in range(frames)]
+            errors = ", ".join("{}: {}".format(name, p.last_error) for name, p in providers if p.last_error)
+            lines.append("{:<13} {:>6.2f}s {:>6.2f}s {:>6.2f}s {:>4}/{:<2}  {}".format(
+                profile, percentile(latencies, 50), percentile(latencies, 95), max(latencies),
+                sum(1 for latency in latencies if latency > deadline), frames, errors or '-'))
+        epaper.close()
+        return "\n".join(lines)
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Stand-in upstream servers with fault injection")
+    parser.add_argument('--bind', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8090, help="0 - any free port")
+    parser.add_argument('--profile', default='ok', choices=sorted(PROFILES))
+    parser.add_argument('--latency', type=float, default=0, help="seconds added to every answer")
+    parser.add_argument('--benchmark', action='store_true', help="measure frame latency under the fault profiles & exit")
+    parser.add_argument('--profiles', default=",".join(PROFILE_ORDER), help="profiles to benchmark")
+    parser.add_argument('--frames', type=int, default=3, help="frames rendered per benchmarked profile")
+    parser.add_argument('--deadline', type=float, default=None, help="seconds a frame may take, by default the warmed up latency + margin")
+    args = parser.parse_args()
+
+    server = StandinServer(args.bind, 0 if args.benchmark else args.port, args.profile, args.latency).start()
+    if args.benchmark:
+        print(benchmark(server, args.profiles.split(','), args.frames, args.deadline))
+        server.stop()
+        return 0
+
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.stop()
+    return 0
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO, format='%(message)s')
+    raise SystemExit(main())
@@ -0,0 +1,201 @@
+# https://github.com/pskowronek/epaper-clock-and-more, Apache 2 license
+
+import functools
+import io
+import json
+import logging
+import threading
+import time
+from collections import defaultdict
+
+try:
+    from http.server import HTTPServer, BaseHTTPRequestHandler
+    from socketserver import ThreadingMixIn
+except ImportError:  # python 2
+    from BaseHTTPServer import HTTPServer, BaseHTTPRequestHandler
+    from SocketServer import ThreadingMixIn
+
+from timing import timings
+
+
+INDEX = """<html><head><title>epaper-clock-and-more</title><meta http-equiv="refresh" content="60"></head>
+<body style="background:#ddd">
+{}
+<p><a href="/status.json">status.json</a> | <a href="/metrics">metrics</a></p>
+</body></html>
+"""
+
+FRAME = """<p>{}<img src="/frame/{}black.png" style="background:#fff"> {}</p>"""
+RED_PLANE = """<img src="/frame/{}red.png" style="background:#fff">"""
+
+
+class ThreadingHTTPServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+
+class StatusServer(object):
+    """Serves the last displayed frame and pipeline health over HTTP - on its own threads, never blocking the render loop."""
+
+
+    def __init__(self, epaper, providers, scheduler, bind, port):
+        self.epaper = epaper
+        self.providers = providers
+        self.scheduler = scheduler
+        self.bind = bind
+        self.port = port
+
+        self._lock = threading.Lock()
+        # all keyed by the panel name - None for the only panel of the process (no EPAPER_PANELS)
+        self._frames = {}   # panel -> the last displayed frame & when
+        self._encoded = {}  # panel -> {plane: PNG of its current frame}, encoded once on first request
+        self._counters = defaultdict(lambda: defaultdict(int))
+        self._mono = {}
+
+        # with several panels each one has its own frame - a listener per panel tells them apart
+        for name, panel in self.panels():
+            self._mono[name] = panel.MONO_DISPLAY
+            panel.add_listener(functools.partial(self.frame_displayed, name))
+
+
+    def panels(self):
+        if hasattr(self.epaper, 'panels'):
+            return [(panel.PANEL.name, panel) for panel in self.epaper.panels]
+        return [(None, self.epaper)]
+
+
+    def start(self):
+        handler = type('BoundStatusRequestHandler', (StatusRequestHandler, object), {'status_server': self})
+        httpd = ThreadingHTTPServer((self.bind, self.port), handler)
+        thread = threading.Thread(target=httpd.serve_forever, name="status-server")
+        thread.daemon = True
+        thread.start()
+        logging.info("Status server listening on http://{}:{}/".format(self.bind, self.port))
+
+
+    def index(self):
+        frames = []
+        for name, _ in self.panels():
+            prefix = name + '/' if name is not None else ''
+            frames.append(FRAME.format(name + ': ' if name is not None else '', prefix, RED_PLANE.format(prefix) if not self._mono[name] else ''))
+        return INDEX.format("\n".join(frames))
+
+
+    def frame_displayed(self, panel, frame):
+        # called from the render loop - canvases get reused by the next draw so the images are copied,
+        # PNGs are encoded lazily by the server threads
+        frame = frame._replace(black=None, red=None, images=tuple(image.copy() for image in frame.images))
+        with self._lock:
+            self._frames[panel] = (frame, time.time())
+            self._encoded[panel] = {}
+            self._counters[panel]['main' if not isinstance(frame.name, str) else frame.name] += 1
+
+
+    def frame_png(self, panel, plane):
+        """PNG of a plane of the panel's current frame, None if there is none (yet) - KeyError for an unknown panel or plane."""
+        if panel not in self._mono or plane not in ('black', 'red') or (plane == 'red' and self._mono[panel]):
+            raise KeyError(plane)
+        with self._lock:
+            frame, _ = self._frames.get(panel, (None, None))
+            encoded = self._encoded.get(panel)
+            if frame is None or not frame.images:
+                # nothing drawn here - i.e. a frame of the render server
+                return None
+            if plane in encoded:
+                return encoded[plane]
+        image = frame.images[0 if plane == 'black' else 1]
+        output = io.BytesIO()
+        image.convert('1').save(output, format='PNG')
+        png = output.getvalue()
+        with self._lock:
+            if self._frames[panel][0] is frame:
+                self._encoded[panel][plane] = png
+        return png
+
+
+    def per_panel(self, values):
+        # the only panel's values as they are, several panels' ones by the panel name
+        return values.get(None) if None in self._mono else values
+
+
+    def status(self):
+        now = time.time()
+        with self._lock:
+            frames = {}
+            for panel, (frame, displayed_at) in self._frames.items():
+                frames[panel] = {
+                    'name': str(frame.name),
+                    'displayed_at': displayed_at,
+                    'age_seconds': now - displayed_at,
+                }
+            counters = dict((panel, dict(values)) for panel, values in self._counters.items())
+
+        providers = {}
+        for name, provider in self.providers:
+            ts = provider.get_cache_ts()
+            providers[name] = {
+                'cache_age_seconds': now - ts if ts is not None else None,
+                'last_error': provider.last_error,
+            }
+
+        return {
+            'frame': self.per_panel(frames),
+            'refreshes': self.per_panel(counters),
+            'providers': providers,
+            'latency': {
+                'render_seconds': self.epaper.render_latency,
+                'display_seconds': self.epaper.display_latency,
+            },
+            'buttons': dict((str(k), v._asdict()) for k, v in self.scheduler.latencies().items()),
+            'timings': timings.snapshot(),
+            'gauges': timings.gauges(),
+        }
+
+
+class StatusRequestHandler(BaseHTTPRequestHandler):
+
+
+    status_server = None
+
+
+    def do_GET(self):
+        try:
+            if self.path in ('/', '/index.html'):
+                self.reply(200, 'text/html', self.status_server.index().encode('utf-8'))
+            elif self.path.startswith('/frame/') and self.path.endswith('.png'):
+                self.frame_png(self.path[len('/frame/'):-len('.png')])
+            elif self.path == '/status.json':
+                self.reply(200, 'application/json', json.dumps(self.status_server.status(), indent=2, sort_keys=True).encode('utf-8'))
+            elif self.path == '/metrics':
+                self.reply(200, 'text/plain; version=0.0.4', timings.prometheus_text().encode('utf-8'))
+            else:
+                self.reply(404, 'text/plain', b'Not found\n')
+        except Exception as e:
+            logging.exception(e)
+            self.reply(500, 'text/plain', b'Internal error\n')
+
+
+    def frame_png(self, path):
+        # /frame/<plane>.png of the only panel, /frame/<panel>/<plane>.png of one of several panels
+        panel, _, plane = path.rpartition('/')
+        try:
+            png = self.status_server.frame_png(panel or None, plane)
+        except KeyError:
+            self.reply(404, 'text/plain', b'Not found\n')
+            return
+        if png is None:
+            self.reply(404, 'text/plain', b'No frame displayed yet\n')
+        else:
+            self.reply(200, 'image/png', png)
+
+
+    def reply(self, code, content_type, body):
+        self.send_response(code)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.send_header('Cache-Control', 'no-cache')
+        self.end_headers()
+        self.wfile.write(body)
+
+
+    def log_message(self, format, *args):
+        logging.debug("Status server: " + format % args)
@@ -0,0 +1,230 @@
+# https://github.com/pskowronek/epaper-clock-and-more, Apache 2 license
+
+import json
+import logging
+import os
+import socket
+import threading
+import time
+from contextlib import contextmanager
+from functools import wraps
+
+
+# upper bounds (in seconds) of histogram buckets - from drawing a text up to a full tri-color panel refresh
+BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60)
+
+
+class Histogram(object):
+
+
+    def __init__(self):
+        self.count = 0
+        self.sum = 0.0
+        self.min = None
+        self.max = None
+        self.buckets = [0] * len(BUCKETS)
+
+
+    def observe(self, seconds):
+        self.count += 1
+        self.sum += seconds
+        self.min = seconds if self.min is None else min(self.min, seconds)
+        self.max = seconds if self.max is None else max(self.max, seconds)
+        for i, bound in enumerate(BUCKETS):
+            if seconds <= bound:
+                self.buckets[i] += 1
+                break
+
+
+    def to_dict(self):
+        return {
+            'count': self.count,
+            'sum': self.sum,
+            'min': self.min,
+            'max': self.max,
+            'buckets': dict(zip([str(b) for b in BUCKETS], self.buckets)),
+        }
+
+
+class TimingStore(object):
+    """In-memory histograms of how long each stage of the refresh pipeline takes."""
+
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._histograms = {}
+        self._gauges = {}
+        self.labels = {'host': socket.gethostname(), 'model': self.device_model()}
+        # what the previous JSON lines export covered - the next one writes only what happened since
+        self._exported = {}
+        self._exported_gauges = {}
+
+
+    def device_model(self):
+        try:
+            with open('/proc/device-tree/model') as fp:
+                return fp.read().strip('\0\n ')
+        except Exception:
+            return 'unknown'
+
+
+    def observe(self, stage, seconds):
+        with self._lock:
+            histogram = self._histograms.get(stage)
+            if histogram is None:
+                histogram = self._histograms[stage] = Histogram()
+            histogram.observe(seconds)
+
+
+    def gauge(self, name, value):
+        """Sets a current value of something that isn't a duration, i.e. the used refresh budget."""
+        with self._lock:
+            self._gauges[name] = value
+
+
+    def gauges(self):
+        with self._lock:
+            return dict(self._gauges)
+
+
+    def total(self, stage):
+        with self._lock:
+            histogram = self._histograms.get(stage)
+            return histogram.sum if histogram is not None else 0.0
+
+
+    @contextmanager
+    def timed(self, stage):
+        started = time.time()
+        try:
+            yield
+        finally:
+            self.observe(stage, time.time() - started)
+
+
+    def wrap(self, stage, fn):
+        @wraps(fn)
+        def timed_fn(*args, **kwargs):
+            with self.timed(stage):
+                return fn(*args, **kwargs)
+        return timed_fn
+
+
+    def snapshot(self):
+        with self._lock:
+            return dict((stage, histogram.to_dict()) for stage, histogram in self._histograms.items())
+
+
+    def export_jsonl(self, path, max_bytes = 1024 * 1024):
+        """Appends what changed since the previous export - per stage: count, sum & buckets of the new observations,
+        gauges with a new value. Over max_bytes the file is moved to <path>.1 (replacing the older one) first."""
+        now = time.time()
+        snapshot = self.snapshot()
+        gauges = self.gauges()
+        lines = []
+        for stage, values in sorted(snapshot.items()):
+            previous = self._exported.get(stage, {'count': 0, 'sum': 0.0, 'buckets': {}})
+            count = values['count'] - previous['count']
+            if count <= 0:
+                continue
+            buckets = dict((bound, n - previous['buckets'].get(bound, 0)) for bound, n in values['buckets'].items())
+            record = dict(ts=now, stage=stage, count=count, sum=values['sum'] - previous['sum'],
+                          buckets=dict((bound, n) for bound, n in buckets.items() if n), **self.labels)
+            lines.append(json.dumps(record, sort_keys=True))
+        for name, value in sorted(gauges.items()):
+            if self._exported_gauges.get(name) != value:
+                lines.append(json.dumps(dict(ts=now, gauge=name, value=value, **self.labels), sort_keys=True))
+
+        if os.path.exists(path) and os.path.getsize(path) > max_bytes:
+            os.rename(path, path + ".1")
+        if lines:
+            with open(path, 'a') as fp:
+                fp.write("\n".join(lines) + "\n")
+        self._exported = snapshot
+        self._exported_gauges = gauges
+
+
+    def prometheus_text(self):
+        labels = ",".join('{}="{}"'.format(k, str(v).replace('"', '\\"')) for k, v in sorted(self.labels.items()))
+        lines = [
+            "# HELP epaper_stage_seconds Time spent in each stage of the e-paper refresh pipeline.",
+            "# TYPE epaper_stage_seconds histogram",
+        ]
+        for stage, values in sorted(self.snapshot().items()):
+            stage_labels = '{},stage="{}"'.format(labels, stage)
+            cumulative = 0
+            for bound, count in zip(BUCKETS, [values['buckets'][str(b)] for b in BUCKETS]):
+                cumulative += count
+                lines.append('epaper_stage_seconds_bucket{{{},le="{}"}} {}'.format(stage_labels, bound, cumulative))
+            lines.append('epaper_stage_seconds_bucket{{{},le="+Inf"}} {}'.format(stage_labels, values['count']))
+            lines.append('epaper_stage_seconds_sum{{{}}} {}'.format(stage_labels, values['sum']))
+            lines.append('epaper_stage_seconds_count{{{}}} {}'.format(stage_labels, values['count']))
+        for name, value in sorted(self.gauges().items()):
+            lines.append("# TYPE epaper_{} gauge".format(name))
+            lines.append('epaper_{}{{{}}} {}'.format(name, labels, value))
+        return "\n".join(lines) + "\n"
+
+
+    def export_prometheus(self, path):
+        # textfile collector may read the file any time - write it atomically
+        tmp_path = path + ".tmp"
+        with open(tmp_path, 'w') as fp:
+            fp.write(self.prometheus_text())
+        os.rename(tmp_path, path)
+
+
+    def export(self):
+        """Writes the metrics to files configured with EPAPER_METRICS_JSONL / EPAPER_METRICS_PROM (if any)."""
+        try:
+            jsonl_path = os.environ.get("EPAPER_METRICS_JSONL")
+            if jsonl_path:
+                self.export_jsonl(os.path.expanduser(jsonl_path), int(os.environ.get("EPAPER_METRICS_JSONL_MAX_KB", "1024")) * 1024)
+            prom_path = os.environ.get("EPAPER_METRICS_PROM")
+            if prom_path:
+                self.export_prometheus(os.path.expanduser(prom_path))
+        except Exception as e:
+            logging.exception(e)
+
+
+class MemoryTracker(object):
+    """Python heap use per refresh traced by tracemalloc - peak while rendering & the steady state left after it."""
+
+
+    def __init__(self, store):
+        import tracemalloc  # python 3.4+ only
+        self.tracemalloc = tracemalloc
+        self.store = store
+        self.steady = None
+        self.refreshes = 0
+
+
+    def start(self):
+        self.tracemalloc.start()
+
+
+    def frame_displayed(self, frame):
+        current, peak = self.tracemalloc.get_traced_memory()
+        if hasattr(self.tracemalloc, 'reset_peak'):  # python 3.9+
+            self.tracemalloc.reset_peak()
+        self.refreshes += 1
+        # the first refreshes fill caches (fonts, icons, canvases) - the steady state is a slow average after that
+        self.steady = current if self.steady is None else 0.9 * self.steady + 0.1 * current
+        self.store.gauge('memory_current_kb', current // 1024)
+        self.store.gauge('memory_peak_kb', peak // 1024)
+        self.store.gauge('memory_steady_kb', int(self.steady) // 1024)
+        logging.info("Memory after refresh #{} '{}': {} kB, peak {} kB, steady {} kB".format(
+            self.refreshes, frame.name if isinstance(frame.name, str) else 'main', current // 1024, peak // 1024, int(self.steady) // 1024))
+
+
+timings = TimingStore()
+
+
+def timed(stage):
+    return timings.timed(stage)
+
+
+def timed_method(stage):
+    """Decorator timing every call of the decorated function."""
+    def decorator(fn):
+        return timings.wrap(stage, fn)
+    return decorator